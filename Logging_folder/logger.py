@@ -1,16 +1,157 @@
 import logging
+import logging.handlers
+from contextlib import contextmanager
+import contextvars
+import datetime
+import atexit
+import random
+import queue
+import zlib
+import json
+from config.settings import get_settings
+from metrics.prometheus import REGISTRY, Counter
+
+# Logging settings
+settings = get_settings()
+LOG_FILE = settings.log_file
+LOG_LEVEL = settings.log_level
+LOG_MAX_BYTES = settings.log_max_bytes  # Rotate after 50 MB by default
+LOG_BACKUP_COUNT = settings.log_backup_count
+LOG_QUEUE_SIZE = settings.log_queue_size
+LOG_PER_FILE_SAMPLE_RATE = settings.log_per_file_sample_rate  # Share of per-file INFO/DEBUG lines kept
+
+# Correlation ids attached to every record logged in the current context
+request_id_var = contextvars.ContextVar("request_id", default=None)
+job_id_var = contextvars.ContextVar("job_id", default=None)
+file_name_var = contextvars.ContextVar("file_name", default=None)
+
+# Pass as `extra=PER_FILE` on high-volume messages logged once per file and stage; they are sampled
+PER_FILE = {"per_file": True}
+
+
+@contextmanager
+def log_context(request_id=None, job_id=None, file_name=None):
+    """
+    Attach correlation ids to every record logged inside the block, including from tasks it starts.
+
+    Args:
+        request_id (str, optional): Id of the HTTP request.
+        job_id (str, optional): Id of the background job.
+        file_name (str, optional): Name of the resume being processed.
+    """
+    tokens = []
+    for var, value in ((request_id_var, request_id), (job_id_var, job_id), (file_name_var, file_name)):
+        if value is not None:
+            tokens.append((var, var.set(value)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """
+    Copy the correlation ids onto the record and sample per-file INFO/DEBUG messages.
+
+    Runs in the thread that logs, so the context variables of the caller are visible. Sampling
+    is keyed on the file name, so a sampled file keeps all of its lines; warnings and errors are
+    never dropped.
+    """
+
+    def __init__(self, sample_rate=LOG_PER_FILE_SAMPLE_RATE):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        record.job_id = job_id_var.get()
+        record.file_name = file_name_var.get()
+
+        if self.sample_rate < 1.0 and record.levelno < logging.WARNING and getattr(record, "per_file", False):
+            if record.file_name is not None:
+                bucket = zlib.crc32(record.file_name.encode("utf-8")) % 10000 / 10000
+            else:
+                bucket = random.random()
+            return bucket < self.sample_rate
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "line": record.lineno,
+            "thread": record.threadName,
+        }
+        for key in ("request_id", "job_id", "file_name"):
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+LOG_RECORDS_DROPPED = REGISTRY.register(Counter(
+    "log_records_dropped_total", "Log records dropped because the log queue was full."))
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that never blocks the caller: records are dropped (and counted) if the
+    bounded queue is full, e.g. while the disk is stalled.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            LOG_RECORDS_DROPPED.inc()
+
+    def prepare(self, record):
+        # Resolve the message and exception text here; keep them as separate fields for the JSON output
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
 
 # Initialize a logger
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
+logger.setLevel(LOG_LEVEL)
 
-# Create a file handler for logging
-file_handler = logging.FileHandler('logger.log')
-file_handler.setLevel(logging.INFO)
+# Records are put on a bounded queue by the caller; a listener thread does the file I/O
+log_queue = queue.Queue(LOG_QUEUE_SIZE)
+queue_handler = NonBlockingQueueHandler(log_queue)
+queue_handler.addFilter(ContextFilter())
 
-# Create a logging format
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-file_handler.setFormatter(formatter)
+# Create a size-rotated file handler writing JSON lines
+file_handler = logging.handlers.RotatingFileHandler(
+    LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+)
+file_handler.setLevel(LOG_LEVEL)
+file_handler.setFormatter(JsonFormatter())
 
 # Add the handlers to the logger
-logger.addHandler(file_handler)
\ No newline at end of file
+logger.addHandler(queue_handler)
+listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+listener.start()
+# Flush queued records when the process exits
+atexit.register(listener.stop)
@@ -1,21 +1,23 @@
-import psycopg2
-from Logging_folder.logger import logger
-from dotenv import load_dotenv
-import os
-# Load environment variables from the .env file
-load_dotenv()
-
-# Retrieve database credentials from the environment variables
-hostname = os.getenv('DB_HOST')  # Database host
-username = os.getenv('DB_USER')  # Database user
-password = os.getenv('DB_PASSWORD')  # Database password
-database = os.getenv('DB_NAME')  # Database name
-port_id = os.getenv('DB_PORT')  # Database port
+from Logging_folder.logger import logger, PER_FILE
+from metrics.prometheus import stage_timer
+from config.settings import get_settings
+
+# Retrieve database credentials from the settings
+settings = get_settings()
+hostname = settings.db_host  # Database host
+username = settings.db_user  # Database user
+password = settings.db_password  # Database password
+database = settings.db_name  # Database name
+port_id = settings.db_port  # Database port
+
+# Set once the table and its migrations have been applied by this process
+_schema_ready = False
 
 def pgadmin_connect():
     """
     Connects to a PostgreSQL database using credentials from environment variables.
-    If the connection is successful, it creates a table 'resume_table' if it doesn't already exist.
+    On the first successful connection of the process, it creates a table 'resume_table' if it
+    doesn't already exist and adds any missing columns.
 
     The table schema includes:
     - unique_id: Numeric, primary key
@@ -23,6 +25,8 @@ def pgadmin_connect():
     - resume_content: Content of the resume (text)
     - resume_key_aspect: Key aspects of the resume (text)
     - score: Score related to the resume (integer)
+    - created_at: When the resume was stored (timestamp with time zone)
+    - batch_id: Id of the upload request or job that stored the resume (varchar)
 
     Returns:
         conn: Connection object for the PostgreSQL database.
@@ -31,33 +35,26 @@ def pgadmin_connect():
     If an error occurs, logs the exception and returns None, None.
     """
     try:
+        # psycopg2 is imported on first connection so importing this module stays cheap
+        import psycopg2
+
         # Attempt to connect to the PostgreSQL database
-        conn = psycopg2.connect(
-            host=hostname,
-            user=username,
-            password=password,
-            dbname=database,
-            port=port_id
-        )
+        with stage_timer("db_connect"):
+            conn = psycopg2.connect(
+                host=hostname,
+                user=username,
+                password=password,
+                dbname=database,
+                port=port_id
+            )
         
         # Create a cursor object to interact with the database
         cur = conn.cursor()
 
-        # SQL query to create the 'resume_table' if it doesn't exist
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS resume_table (
-                unique_id UUID PRIMARY KEY,
-                resume_name VARCHAR(100),
-                resume_content TEXT,
-                resume_key_aspect TEXT,
-                score INTEGER
-            )
-        """)
-
-        # Commit the transaction (important to save changes to the database)
-        conn.commit()
+        if not _schema_ready:
+            create_schema(conn, cur)
 
-    except (Exception, psycopg2.Error) as error:
+    except Exception as error:
         # Log the error if an exception occurs while connecting or executing the SQL
         logger.exception("Error while connecting to PostgreSQL: %s", error)
         return None, None  # Return None for both conn and cur in case of error
@@ -65,6 +62,38 @@ def pgadmin_connect():
     # Return the connection and cursor objects if successful
     return conn, cur
 
+def create_schema(conn, cur):
+    """
+    Create 'resume_table' if it doesn't exist and add the columns introduced since.
+
+    Args:
+        conn: Connection object for the PostgreSQL database.
+        cur: Cursor object for executing queries.
+    """
+    global _schema_ready
+
+    # SQL query to create the 'resume_table' if it doesn't exist
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS resume_table (
+            unique_id UUID PRIMARY KEY,
+            resume_name VARCHAR(100),
+            resume_content TEXT,
+            resume_key_aspect TEXT,
+            score INTEGER
+        )
+    """)
+
+    # Columns used to select stored resumes for re-scoring; rows stored before they existed
+    # get the time of the migration as created_at
+    cur.execute("ALTER TABLE resume_table ADD COLUMN IF NOT EXISTS created_at TIMESTAMPTZ DEFAULT now()")
+    cur.execute("ALTER TABLE resume_table ADD COLUMN IF NOT EXISTS batch_id VARCHAR(64)")
+    cur.execute("CREATE INDEX IF NOT EXISTS resume_table_created_at ON resume_table (created_at)")
+    cur.execute("CREATE INDEX IF NOT EXISTS resume_table_batch_id ON resume_table (batch_id)")
+
+    # Commit the transaction (important to save changes to the database)
+    conn.commit()
+    _schema_ready = True
+
 def pgadmin_disconnect(conn, cur):
     """
     Closes the cursor and connection to the PostgreSQL database.
@@ -80,13 +109,13 @@ def pgadmin_disconnect(conn, cur):
         # Close the cursor
         if cur is not None:
             cur.close()
-            logger.info("Database cursor closed.")
+            logger.info("Database cursor closed.", extra=PER_FILE)
 
         # Close the connection
         if conn is not None:
             conn.close()
-            logger.info("Database connection closed.")
+            logger.info("Database connection closed.", extra=PER_FILE)
 
-    except (Exception, psycopg2.Error) as error:
+    except Exception as error:
         # Log the error if an exception occurs while closing the connection
         logger.exception("Error while disconnecting from PostgreSQL: %s", error)
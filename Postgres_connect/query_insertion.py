@@ -1,7 +1,8 @@
 from Postgres_connect.pgadmin_connect import pgadmin_connect, pgadmin_disconnect
-from Logging_folder.logger import logger
+from Logging_folder.logger import logger, PER_FILE
+from metrics.prometheus import stage_timer
 
-def insert_resume_data(unique_id, resume_name, resume_content):
+def insert_resume_data(unique_id, resume_name, resume_content, batch_id=None):
     """
     Insert resume data into the PostgreSQL database.
 
@@ -9,6 +10,7 @@ def insert_resume_data(unique_id, resume_name, resume_content):
         unique_id (str): The unique identifier for the resume.
         resume_name (str): The name of the resume file.
         resume_content (str): The text content of the resume.
+        batch_id (str, optional): Id of the upload request or job that stored the resume.
 
     Returns:
         None
@@ -17,12 +19,13 @@ def insert_resume_data(unique_id, resume_name, resume_content):
     conn, cur = pgadmin_connect()
     try:
         # Insert the data into the database
-        cur.execute("""
-                    INSERT INTO resume_table (unique_id, resume_name, resume_content, resume_key_aspect, score)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, (unique_id, resume_name, resume_content, None, None))
-        conn.commit()
-        logger.info(f"Successfully stored {resume_name} in database")
+        with stage_timer("db_insert"):
+            cur.execute("""
+                    INSERT INTO resume_table (unique_id, resume_name, resume_content, resume_key_aspect, score, batch_id)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                """, (unique_id, resume_name, resume_content, None, None, batch_id))
+            conn.commit()
+        logger.info(f"Successfully stored {resume_name} in database", extra=PER_FILE)
     except Exception as e:
         logger.exception(f"Error storing {resume_name} in database: {str(e)}")
         conn.rollback()
@@ -46,7 +49,8 @@ def update_resume_data(unique_id, resume_key_aspect, score, resume_name):
     conn, cur = pgadmin_connect()
     try:
         # Insert the data into the database
-        cur.execute(
+        with stage_timer("db_update"):
+            cur.execute(
                 """
                 UPDATE resume_table 
                 SET resume_key_aspect = %s, 
@@ -55,11 +59,112 @@ def update_resume_data(unique_id, resume_key_aspect, score, resume_name):
                 """, 
                 (resume_key_aspect, score, unique_id)
             )
-        # Commit the changes
-        conn.commit()
-        logger.info(f"Successfully stored {resume_name} in database")
+            # Commit the changes
+            conn.commit()
+        logger.info(f"Successfully stored {resume_name} in database", extra=PER_FILE)
     except Exception as e:
         logger.exception(f"Error storing {resume_name} in database: {str(e)}")
         conn.rollback()
 
-    pgadmin_disconnect(conn, cur)
\ No newline at end of file
+    pgadmin_disconnect(conn, cur)
+
+
+def insert_resume_data_batch(rows):
+    """
+    Insert several resumes into the PostgreSQL database in one transaction.
+
+    Unlike `insert_resume_data` this raises on failure so callers can retry, and rows that
+    already exist are left untouched, which makes replaying a batch safe.
+
+    Args:
+        rows (list[tuple]): Tuples of (unique_id, resume_name, resume_content, batch_id).
+
+    Returns:
+        None
+    """
+    from psycopg2.extras import execute_batch
+
+    conn, cur = pgadmin_connect()
+    if conn is None:
+        raise ConnectionError("Could not connect to PostgreSQL")
+    try:
+        with stage_timer("db_insert"):
+            execute_batch(cur, """
+                    INSERT INTO resume_table (unique_id, resume_name, resume_content, resume_key_aspect, score, batch_id)
+                    VALUES (%s, %s, %s, NULL, NULL, %s)
+                    ON CONFLICT (unique_id) DO NOTHING
+                """, rows)
+            conn.commit()
+        logger.info(f"Successfully stored {len(rows)} resumes in database")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pgadmin_disconnect(conn, cur)
+
+
+def update_resume_data_batch(rows):
+    """
+    Update key aspects and scores of several resumes in one transaction.
+
+    Raises on failure so callers can retry.
+
+    Args:
+        rows (list[tuple]): Tuples of (resume_key_aspect, score, unique_id).
+
+    Returns:
+        None
+    """
+    from psycopg2.extras import execute_batch
+
+    conn, cur = pgadmin_connect()
+    if conn is None:
+        raise ConnectionError("Could not connect to PostgreSQL")
+    try:
+        with stage_timer("db_update"):
+            execute_batch(cur, """
+                UPDATE resume_table 
+                SET resume_key_aspect = %s, 
+                    score = %s 
+                    WHERE unique_id = %s
+                """, rows)
+            conn.commit()
+        logger.info(f"Successfully updated {len(rows)} resumes in database")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pgadmin_disconnect(conn, cur)
+
+
+def update_resume_scores_batch(rows):
+    """
+    Update only the scores of several resumes in one transaction, e.g. after re-scoring.
+
+    Raises on failure so callers can retry.
+
+    Args:
+        rows (list[tuple]): Tuples of (score, unique_id).
+
+    Returns:
+        None
+    """
+    from psycopg2.extras import execute_batch
+
+    conn, cur = pgadmin_connect()
+    if conn is None:
+        raise ConnectionError("Could not connect to PostgreSQL")
+    try:
+        with stage_timer("db_update"):
+            execute_batch(cur, """
+                UPDATE resume_table
+                SET score = %s
+                    WHERE unique_id = %s
+                """, rows)
+            conn.commit()
+        logger.info(f"Successfully updated scores of {len(rows)} resumes in database")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pgadmin_disconnect(conn, cur)
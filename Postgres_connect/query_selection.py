@@ -0,0 +1,88 @@
+from Postgres_connect.pgadmin_connect import pgadmin_connect, pgadmin_disconnect
+from Logging_folder.logger import logger
+from metrics.prometheus import stage_timer
+
+
+def select_key_aspects(created_from=None, created_to=None, batch_id=None, limit=None):
+    """
+    Select stored resumes that already have key aspects, for re-scoring.
+
+    Raises on failure so callers can report it.
+
+    Args:
+        created_from (datetime, optional): Only resumes stored at or after this time.
+        created_to (datetime, optional): Only resumes stored before this time.
+        batch_id (str, optional): Only resumes stored by this upload request or job.
+        limit (int, optional): Maximum number of resumes, most recent first.
+
+    Returns:
+        list[tuple]: Tuples of (unique_id, resume_name, resume_key_aspect).
+    """
+    # Build the filter from the given criteria only
+    conditions = ["resume_key_aspect IS NOT NULL", "resume_key_aspect <> ''"]
+    params = []
+    if created_from is not None:
+        conditions.append("created_at >= %s")
+        params.append(created_from)
+    if created_to is not None:
+        conditions.append("created_at < %s")
+        params.append(created_to)
+    if batch_id is not None:
+        conditions.append("batch_id = %s")
+        params.append(batch_id)
+
+    query = f"""
+        SELECT unique_id, resume_name, resume_key_aspect
+        FROM resume_table
+        WHERE {' AND '.join(conditions)}
+        ORDER BY created_at DESC
+    """
+    if limit is not None:
+        query += " LIMIT %s"
+        params.append(limit)
+
+    conn, cur = pgadmin_connect()
+    if conn is None:
+        raise ConnectionError("Could not connect to PostgreSQL")
+    try:
+        with stage_timer("db_select"):
+            cur.execute(query, tuple(params))
+            rows = cur.fetchall()
+        logger.info(f"Selected {len(rows)} stored resumes for re-scoring")
+        return [(str(unique_id), resume_name, key_aspect) for unique_id, resume_name, key_aspect in rows]
+    finally:
+        pgadmin_disconnect(conn, cur)
+
+
+def iter_key_aspects(batch_size=1000):
+    """
+    Stream every stored resume that has key aspects, in batches, without loading the table at once.
+
+    Raises on failure so callers can report it.
+
+    Args:
+        batch_size (int): Rows fetched from the server per batch.
+
+    Yields:
+        list[tuple]: Batches of (unique_id, resume_name, resume_key_aspect).
+    """
+    conn, cur = pgadmin_connect()
+    if conn is None:
+        raise ConnectionError("Could not connect to PostgreSQL")
+    # A named cursor keeps the result set on the server and fetches it batch by batch
+    stream = conn.cursor(name="iter_key_aspects")
+    try:
+        stream.itersize = batch_size
+        stream.execute("""
+            SELECT unique_id, resume_name, resume_key_aspect
+            FROM resume_table
+            WHERE resume_key_aspect IS NOT NULL AND resume_key_aspect <> ''
+        """)
+        while True:
+            rows = stream.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [(str(unique_id), resume_name, key_aspect) for unique_id, resume_name, key_aspect in rows]
+    finally:
+        stream.close()
+        pgadmin_disconnect(conn, cur)
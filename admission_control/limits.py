@@ -0,0 +1,168 @@
+from config.settings import get_settings
+from contextlib import asynccontextmanager
+from Logging_folder.logger import logger
+import asyncio
+import math
+import time
+
+# Admission limits
+settings = get_settings()
+MAX_CONCURRENT_UPLOADS = settings.max_concurrent_uploads  # Uploads processed at the same time
+MAX_QUEUED_UPLOADS = settings.max_queued_uploads  # Uploads allowed to wait for a slot
+UPLOAD_QUEUE_TIMEOUT = settings.upload_queue_timeout  # Seconds an upload may wait for a slot
+MAX_FILES_PER_REQUEST = settings.max_files_per_request
+MAX_REQUEST_BYTES = settings.max_request_bytes
+MAX_ZIP_ENTRIES = settings.max_zip_entries
+MAX_ZIP_UNCOMPRESSED_BYTES = settings.max_zip_uncompressed_bytes
+MAX_ZIP_COMPRESSION_RATIO = settings.max_zip_compression_ratio
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a request exceeds an admission limit.
+
+    Args:
+        status_code (int): 429 when the service is busy, 413 when the request itself is too large.
+        detail (str): Explanation returned to the client.
+        retry_after (int, optional): Seconds the client should wait before retrying.
+    """
+
+    def __init__(self, status_code, detail, retry_after=None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class UploadAdmissionController:
+    """
+    Bounds how many uploads are processed concurrently and how many may wait for a slot.
+
+    Requests beyond `max_concurrent` wait in line; once `max_queued` are already waiting, or a
+    request waited longer than `queue_timeout`, it is rejected with 429 and a Retry-After estimate
+    based on recent processing times. Latency therefore grows with load up to a bound instead of
+    memory and the executor being exhausted.
+    """
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT_UPLOADS, max_queued=MAX_QUEUED_UPLOADS,
+                 queue_timeout=UPLOAD_QUEUE_TIMEOUT):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        # Exponentially weighted average of how long an admitted upload takes
+        self._average_duration = 10.0
+
+    def retry_after(self):
+        """Estimate in seconds when a slot is likely to be free."""
+        backlog = self.waiting + self.active
+        return max(1, math.ceil(self._average_duration * backlog / self.max_concurrent))
+
+    def check_capacity(self):
+        """Reject immediately if the waiting line is already full."""
+        if self.waiting >= self.max_queued:
+            self.rejected += 1
+            logger.warning(f"Upload rejected: {self.active} active and {self.waiting} waiting uploads")
+            raise AdmissionRejected(429, "Too many uploads in progress, please retry later",
+                                    retry_after=self.retry_after())
+
+    @asynccontextmanager
+    async def admit(self, bounded_wait=True):
+        """
+        Hold a processing slot for the duration of the `async with` block.
+
+        Args:
+            bounded_wait (bool): Apply the waiting-line limit and `queue_timeout`. Background jobs
+                that already passed `check_capacity` wait for a slot without a limit.
+        """
+        timeout = self.queue_timeout if bounded_wait else None
+        if bounded_wait and self._semaphore.locked():
+            self.check_capacity()
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            logger.warning(f"Upload rejected after waiting {timeout}s for a processing slot")
+            raise AdmissionRejected(429, "Service is busy, please retry later", retry_after=self.retry_after())
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._semaphore.release()
+            self._average_duration = 0.8 * self._average_duration + 0.2 * (time.monotonic() - started)
+
+    def stats(self):
+        return {
+            "active": self.active,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+        }
+
+
+def check_request_size(content_length):
+    """
+    Reject a request whose declared body size is over the limit, before the body is read.
+
+    Args:
+        content_length (str or None): The Content-Length header of the request.
+    """
+    if content_length is not None and content_length.isdigit() and int(content_length) > MAX_REQUEST_BYTES:
+        raise AdmissionRejected(413, f"Request body exceeds {MAX_REQUEST_BYTES} bytes")
+
+
+def check_upload_limits(files):
+    """
+    Check the number and total size of the uploaded files.
+
+    Args:
+        files (list[UploadFile]): The uploaded files.
+    """
+    if len(files) > MAX_FILES_PER_REQUEST:
+        raise AdmissionRejected(413, f"At most {MAX_FILES_PER_REQUEST} files can be uploaded per request")
+
+    total_bytes = sum(file.size or 0 for file in files)
+    if total_bytes > MAX_REQUEST_BYTES:
+        raise AdmissionRejected(413, f"Uploaded files exceed {MAX_REQUEST_BYTES} bytes")
+
+
+def check_zip_archive(zip_file, archive_name):
+    """
+    Detect ZIP bombs before anything is extracted.
+
+    The sizes in the ZIP directory can be trusted for this purpose: `zipfile` never produces
+    more than the declared uncompressed size of an entry.
+
+    Args:
+        zip_file (zipfile.ZipFile): The opened archive.
+        archive_name (str): Name of the uploaded archive, for error messages.
+    """
+    entries = [info for info in zip_file.infolist() if not info.is_dir()]
+    if len(entries) > MAX_ZIP_ENTRIES:
+        raise AdmissionRejected(413, f"{archive_name} contains more than {MAX_ZIP_ENTRIES} files")
+
+    total_uncompressed = sum(info.file_size for info in entries)
+    if total_uncompressed > MAX_ZIP_UNCOMPRESSED_BYTES:
+        raise AdmissionRejected(413, f"{archive_name} expands to more than {MAX_ZIP_UNCOMPRESSED_BYTES} bytes")
+
+    for info in entries:
+        ratio = info.file_size / max(info.compress_size, 1)
+        # Small entries are ignored: a short text file can legitimately compress very well
+        if info.file_size > 1024 * 1024 and ratio > MAX_ZIP_COMPRESSION_RATIO:
+            logger.warning(f"Rejected {archive_name}: {info.filename} has compression ratio {ratio:.0f}")
+            raise AdmissionRejected(413, f"{archive_name} looks like a ZIP bomb ({info.filename} is compressed {ratio:.0f}x)")
+
+
+# Shared controller for the upload endpoints
+upload_admission = UploadAdmissionController()
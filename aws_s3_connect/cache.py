@@ -0,0 +1,253 @@
+from config.settings import get_settings
+from collections import OrderedDict
+from botocore.exceptions import ClientError
+from aws_s3_connect.connect import create_s3_client
+from Logging_folder.logger import logger, PER_FILE
+from metrics.prometheus import REGISTRY, Counter, stage_timer, file_type_of, BYTES_PROCESSED, register_queue_depth
+import threading
+import time
+import os
+
+# Cache settings
+settings = get_settings()
+RESUME_CACHE_DIR = settings.resume_cache_dir
+RESUME_CACHE_MAX_BYTES = settings.resume_cache_max_bytes  # 512 MB by default
+RESUME_CACHE_REVALIDATE_SECONDS = settings.resume_cache_revalidate_seconds
+# Seconds a file handed out by `get` is kept from eviction, so the caller can open it before it goes
+RESUME_CACHE_PIN_SECONDS = 30
+
+CACHE_EVENTS = REGISTRY.register(Counter(
+    "resume_cache_events_total", "Download cache hits, misses, revalidations, evictions and coalesced fetches.",
+    ["event"]))
+
+
+class ResumeDiskCache:
+    """
+    Bounded on-disk LRU cache for resume files stored in S3.
+
+    - Files are kept in a local directory up to `max_bytes`; the least recently used ones are evicted first.
+    - Cached entries are revalidated against the S3 ETag once they are older than `revalidate_seconds`.
+    - Concurrent requests for the same key are coalesced into a single S3 fetch.
+    - A file handed out is pinned for `pin_seconds`, so it is not evicted before the caller opened it;
+      once open, eviction no longer affects the reader.
+    - Hit, miss and eviction counters are kept so the hit ratio can be exposed.
+    """
+
+    def __init__(self, cache_dir=RESUME_CACHE_DIR, max_bytes=RESUME_CACHE_MAX_BYTES,
+                 revalidate_seconds=RESUME_CACHE_REVALIDATE_SECONDS, pin_seconds=RESUME_CACHE_PIN_SECONDS,
+                 bucket_name='yash-soni-db', s3_folder='resume_files/'):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.revalidate_seconds = revalidate_seconds
+        self.pin_seconds = pin_seconds
+        self.bucket_name = bucket_name
+        self.s3_folder = s3_folder
+
+        # filename -> {"path", "size", "etag", "validated_at", "pinned_until"}, ordered from least to
+        # most recently used
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        # filename -> Event set when the in-flight fetch for that key finishes
+        self._in_flight = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load_existing_files()
+
+    def _load_existing_files(self):
+        """Index files left in the cache directory by a previous run, oldest access first."""
+        existing = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            # Skip partial downloads from an interrupted fetch
+            if name.endswith(".part") or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            existing.append((stat.st_atime, name, path, stat.st_size))
+
+        for _, name, path, size in sorted(existing):
+            # Unknown ETag forces a revalidation on first use
+            self._entries[name] = {"path": path, "size": size, "etag": None, "validated_at": 0.0,
+                                   "pinned_until": 0.0}
+            self._total_bytes += size
+        self._evict()
+
+    def _count(self, event):
+        """Count a cache event, e.g. "hits", both in `stats()` and on /metrics."""
+        setattr(self, event, getattr(self, event) + 1)
+        CACHE_EVENTS.inc(event=event)
+
+    def _s3_key(self, filename):
+        return os.path.join(self.s3_folder, filename)
+
+    def get(self, filename):
+        """
+        Return the local path of a cached copy of `filename`, fetching it from S3 if needed.
+
+        :param filename: Name of the file in the S3 resume folder
+        :return: Local file path or None if the file could not be downloaded; it is pinned, so open it
+            within `pin_seconds`
+        """
+        while True:
+            with self._lock:
+                entry = self._entries.get(filename)
+                if entry is not None and os.path.exists(entry["path"]):
+                    self._entries.move_to_end(filename)
+                    if time.monotonic() - entry["validated_at"] < self.revalidate_seconds:
+                        self._count("hits")
+                        return self._pin(entry)
+
+                # Another thread is already fetching this key: wait for it and retry
+                event = self._in_flight.get(filename)
+                if event is None:
+                    event = threading.Event()
+                    self._in_flight[filename] = event
+                    break
+                self._count("coalesced")
+
+            event.wait()
+
+        # A file removed from disk behind our back has to be downloaded again
+        if entry is not None and not os.path.exists(entry["path"]):
+            entry = None
+
+        try:
+            return self._fetch(filename, entry)
+        finally:
+            with self._lock:
+                self._in_flight.pop(filename, None)
+            event.set()
+
+    def _pin(self, entry):
+        """Keep an entry from eviction while the caller opens it and return its path. Caller holds the lock."""
+        entry["pinned_until"] = time.monotonic() + self.pin_seconds
+        return entry["path"]
+
+    def _fetch(self, filename, entry):
+        """Revalidate a stale entry or download the file from S3 into the cache."""
+        s3 = create_s3_client()
+        request_args = {"Bucket": self.bucket_name, "Key": self._s3_key(filename)}
+        if entry is not None and entry["etag"]:
+            request_args["IfNoneMatch"] = entry["etag"]
+
+        try:
+            with stage_timer("s3_download", file_type=file_type_of(filename)):
+                s3_object = s3.get_object(**request_args)
+        except ClientError as e:
+            error_code = e.response.get("Error", {}).get("Code")
+            # 304 Not Modified: the cached copy is still current
+            if error_code in ("304", "NotModified") and entry is not None:
+                with self._lock:
+                    if self._entries.get(filename) is entry:
+                        entry["validated_at"] = time.monotonic()
+                        self._count("revalidations")
+                        self._count("hits")
+                        return self._pin(entry)
+                # Evicted while revalidating: download it again
+                return self._fetch(filename, None)
+            logger.exception(f"Error downloading {filename} into cache: {e}")
+            return None
+
+        with self._lock:
+            self._count("misses")
+
+        local_path = os.path.join(self.cache_dir, filename)
+        partial_path = f"{local_path}.part"
+        size = 0
+        try:
+            # Write to a temporary file first so readers never see a half-written resume
+            with open(partial_path, "wb") as f:
+                for chunk in s3_object["Body"].iter_chunks(chunk_size=64 * 1024):
+                    f.write(chunk)
+                    size += len(chunk)
+            os.replace(partial_path, local_path)
+        except Exception as e:
+            logger.exception(f"Error writing {filename} to cache: {e}")
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            return None
+        finally:
+            s3_object["Body"].close()
+
+        with self._lock:
+            old_entry = self._entries.pop(filename, None)
+            if old_entry is not None:
+                self._total_bytes -= old_entry["size"]
+            entry = self._entries[filename] = {
+                "path": local_path,
+                "size": size,
+                "etag": s3_object.get("ETag"),
+                "validated_at": time.monotonic(),
+            }
+            self._pin(entry)
+            self._total_bytes += size
+            self._evict()
+
+        BYTES_PROCESSED.inc(size, stage="s3_download", file_type=file_type_of(filename))
+        logger.info(f"Cached {filename} ({size} bytes) from S3", extra=PER_FILE)
+        return local_path
+
+    def _evict(self):
+        """
+        Remove least recently used files until the cache fits in `max_bytes`. Caller holds the lock.
+        Pinned files are skipped, so the cache may stay above `max_bytes` until their pins expire.
+        """
+        now = time.monotonic()
+        for name, entry in list(self._entries.items()):
+            if self._total_bytes <= self.max_bytes:
+                break
+            # Never evict a file that is about to be served
+            if entry["pinned_until"] > now:
+                continue
+            self._entries.pop(name)
+            self._total_bytes -= entry["size"]
+            self._count("evictions")
+            try:
+                os.remove(entry["path"])
+            except OSError as e:
+                logger.warning(f"Could not remove evicted cache file {entry['path']}: {e}")
+
+    def invalidate(self, filename):
+        """Drop a file from the cache, e.g. after it was replaced in S3."""
+        with self._lock:
+            entry = self._entries.pop(filename, None)
+            if entry is None:
+                return
+            self._total_bytes -= entry["size"]
+        try:
+            os.remove(entry["path"])
+        except OSError:
+            pass
+
+    def stats(self):
+        """Return cache counters and the current hit ratio."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "revalidations": self.revalidations,
+                "coalesced_requests": self.coalesced,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+# Shared cache instance used by the API
+resume_cache = ResumeDiskCache()
+
+register_queue_depth(
+    "resume_cache_bytes", "Bytes of resume files held in the download cache.",
+    lambda: {(): resume_cache.stats()["bytes"]})
+register_queue_depth(
+    "resume_cache_entries", "Resume files held in the download cache.",
+    lambda: {(): resume_cache.stats()["entries"]})
@@ -1,27 +1,39 @@
-from dotenv import load_dotenv
-import boto3
+from config.settings import get_settings
+from functools import lru_cache
+from urllib.parse import quote
 import os
 from botocore.exceptions import NoCredentialsError, ClientError
-from Logging_folder.logger import logger
+from Logging_folder.logger import logger, PER_FILE
+from metrics.prometheus import stage_timer, file_type_of, BYTES_PROCESSED
 
-load_dotenv()
-# AWS Credentials from environment variables
-AWS_ACCESS_KEY_ID = os.getenv('AWS_ACCESS_KEY_ID')
-AWS_SECRET_ACCESS_KEY = os.getenv('AWS_SECRET_ACCESS_KEY')
-AWS_REGION = os.getenv('AWS_REGION', 'ap-south-1')  # Default region if not specified
+# AWS Credentials
+settings = get_settings()
+AWS_ACCESS_KEY_ID = settings.aws_access_key_id
+AWS_SECRET_ACCESS_KEY = settings.aws_secret_access_key
+AWS_REGION = settings.aws_region  # Default region if not specified
+S3_ENDPOINT_URL = settings.s3_endpoint_url  # Optional S3-compatible endpoint, e.g. MinIO or a local stand-in
 
 
+@lru_cache(maxsize=None)
 def create_s3_client():
     """
-    Create and return an S3 client with configured credentials
+    Create the S3 client with configured credentials on first use and return it.
+    boto3 is imported here rather than at module load, and the client is shared since it is thread-safe.
     
     :return: Boto3 S3 client
     """
+    import boto3
+    from botocore.config import Config
+
+    # Custom endpoints are addressed path-style since they rarely resolve bucket subdomains
+    config = Config(s3={"addressing_style": "path"}) if S3_ENDPOINT_URL else None
     return boto3.client(
         's3',
         aws_access_key_id=AWS_ACCESS_KEY_ID,
         aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-        region_name=AWS_REGION
+        region_name=AWS_REGION,
+        endpoint_url=S3_ENDPOINT_URL,
+        config=config
     )
 
 def upload_to_s3(local_file_path, bucket_name='yash-soni-db', s3_folder='resume_files/'):
@@ -44,8 +56,10 @@ def upload_to_s3(local_file_path, bucket_name='yash-soni-db', s3_folder='resume_
         s3_key = os.path.join(s3_folder, filename)
         
         # Upload the file
-        s3.upload_file(local_file_path, bucket_name, s3_key)
-        logger.info(f"Successfully uploaded {filename} to {bucket_name}/{s3_key}")
+        with stage_timer("s3_upload", file_type=file_type_of(filename)):
+            s3.upload_file(local_file_path, bucket_name, s3_key)
+        BYTES_PROCESSED.inc(os.path.getsize(local_file_path), stage="s3_upload", file_type=file_type_of(filename))
+        logger.info(f"Successfully uploaded {filename} to {bucket_name}/{s3_key}", extra=PER_FILE)
         return True
     
     except FileNotFoundError as e:
@@ -85,9 +99,11 @@ def download_from_s3(filename, bucket_name='yash-soni-db', s3_folder='resume_fil
         local_file_path = os.path.join(local_dir, filename)
         
         # Download the file
-        s3.download_file(bucket_name, s3_key, local_file_path)
+        with stage_timer("s3_download", file_type=file_type_of(filename)):
+            s3.download_file(bucket_name, s3_key, local_file_path)
+        BYTES_PROCESSED.inc(os.path.getsize(local_file_path), stage="s3_download", file_type=file_type_of(filename))
         
-        logger.info(f"Successfully downloaded {filename} to {local_file_path}")
+        logger.info(f"Successfully downloaded {filename} to {local_file_path}", extra=PER_FILE)
         return local_file_path
     
     except ClientError as e:
@@ -124,3 +140,78 @@ def upload_resume_file(filename, directory_path='extracted_files'):
         # Catch any exception and log the error
         logger.exception(f"An error occurred while uploading {filename}: {e}")
         return False
+
+
+def get_s3_object(filename, bucket_name='yash-soni-db', s3_folder='resume_files/', byte_range=None):
+    """
+    Open a file in the S3 bucket for streaming without saving it locally
+    
+    :param filename: Name of the file to open
+    :param bucket_name: Name of the S3 bucket
+    :param s3_folder: Folder path within the bucket (include trailing '/')
+    :param byte_range: Optional HTTP Range header value (e.g. 'bytes=0-1023')
+    :return: The S3 get_object response; its 'Body' is a streaming body
+    """
+    # Create an S3 client
+    s3 = create_s3_client()
+    
+    # Construct the full S3 key (path)
+    s3_key = os.path.join(s3_folder, filename)
+    
+    # Only ask S3 for the requested slice when a range is given
+    request_args = {"Bucket": bucket_name, "Key": s3_key}
+    if byte_range:
+        request_args["Range"] = byte_range
+    
+    # Only the time to first byte is measured here; the body is streamed by the caller
+    with stage_timer("s3_open", file_type=file_type_of(filename)):
+        return s3.get_object(**request_args)
+
+
+def content_disposition(filename, disposition_type="inline"):
+    """
+    Build a Content-Disposition header value for a file name.
+
+    Headers are sent as latin-1, so names that are not plain ASCII are percent-encoded in the
+    RFC 5987 `filename*` form, the same way Starlette's FileResponse does it.
+
+    :param filename: Name of the file; only its base name is used
+    :param disposition_type: "inline" or "attachment"
+    :return: Content-Disposition header value
+    """
+    filename = os.path.basename(filename)
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"{disposition_type}; filename*=utf-8''{quoted}"
+    return f'{disposition_type}; filename="{filename}"'
+
+
+def generate_presigned_download_url(filename, bucket_name='yash-soni-db', s3_folder='resume_files/',
+                                    expires_in=300, content_type=None):
+    """
+    Generate a temporary URL the client can use to download a file directly from S3
+    
+    :param filename: Name of the file to download
+    :param bucket_name: Name of the S3 bucket
+    :param s3_folder: Folder path within the bucket (include trailing '/')
+    :param expires_in: Number of seconds the URL stays valid
+    :param content_type: Optional Content-Type S3 should send with the file
+    :return: Presigned URL or None if it could not be generated
+    """
+    # Create an S3 client
+    s3 = create_s3_client()
+    
+    try:
+        # Construct the full S3 key (path)
+        s3_key = os.path.join(s3_folder, filename)
+        
+        params = {"Bucket": bucket_name, "Key": s3_key}
+        if content_type:
+            params["ResponseContentType"] = content_type
+            params["ResponseContentDisposition"] = content_disposition(filename)
+        
+        return s3.generate_presigned_url("get_object", Params=params, ExpiresIn=expires_in)
+    
+    except ClientError as e:
+        logger.exception(f"Error generating presigned URL for {filename}: {e}")
+        return None
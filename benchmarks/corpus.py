@@ -0,0 +1,145 @@
+import argparse
+import zipfile
+import random
+import os
+
+FIRST_NAMES = ["Aarav", "Diya", "Kabir", "Meera", "Rohan", "Sara", "Vikram", "Anaya", "Ishaan", "Zoya"]
+LAST_NAMES = ["Sharma", "Patel", "Iyer", "Khan", "Reddy", "Gupta", "Nair", "Singh", "Das", "Mehta"]
+SKILLS = ["Python", "SQL", "AWS", "Docker", "Kubernetes", "FastAPI", "Pandas", "Spark", "React", "Java",
+          "Machine Learning", "PostgreSQL", "Terraform", "Airflow", "NLP", "TensorFlow", "Go", "Linux"]
+ROLES = ["Data Analyst", "Backend Engineer", "Data Scientist", "DevOps Engineer", "ML Engineer", "Project Manager"]
+COMPANIES = ["Acme Corp", "Globex", "Initech", "Umbrella Labs", "Hooli", "Stark Industries", "Wayne Tech"]
+
+
+def resume_lines(rng, paragraphs=6):
+    """
+    Generate the text of one synthetic resume.
+
+    Args:
+        rng (random.Random): Random generator, seeded for reproducible corpora.
+        paragraphs (int): Number of experience entries; controls the resume length.
+
+    Returns:
+        list[str]: The lines of the resume.
+    """
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    lines = [
+        name,
+        f"{name.lower().replace(' ', '.')}@example.com | +91 98{rng.randint(10000000, 99999999)}",
+        "",
+        "Summary",
+        f"{rng.choice(ROLES)} with {rng.randint(1, 15)} years of experience in {', '.join(rng.sample(SKILLS, 3))}.",
+        "",
+        "Experience",
+    ]
+    for _ in range(paragraphs):
+        lines.append(f"{rng.choice(ROLES)} at {rng.choice(COMPANIES)} ({rng.randint(2008, 2023)} - present)")
+        lines.append(f"Built and maintained systems using {', '.join(rng.sample(SKILLS, 4))}.")
+        lines.append(f"Improved throughput by {rng.randint(5, 80)}% and led a team of {rng.randint(2, 12)} engineers.")
+    lines += ["", "Skills", ", ".join(rng.sample(SKILLS, 8)), "", "Education", "B.Tech in Computer Science"]
+    return lines
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path, lines):
+    """
+    Write a minimal single-page PDF containing `lines` as extractable text (Helvetica).
+    No PDF library is needed, so the corpus can be generated anywhere.
+    """
+    text_ops = ["BT", "/F1 10 Tf", "12 TL", "50 780 Td"]
+    for line in lines[:60]:
+        text_ops.append(f"({_pdf_escape(line)}) Tj T*")
+    text_ops.append("ET")
+    stream = "\n".join(text_ops).encode("latin-1", "replace")
+
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref_offset = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        output += f"{offset:010d} 00000 n \n".encode()
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+
+    with open(path, "wb") as f:
+        f.write(output)
+
+
+def write_docx(path, lines):
+    """Write `lines` as paragraphs of a DOCX document."""
+    from docx import Document
+    document = Document()
+    for line in lines:
+        document.add_paragraph(line)
+    document.save(path)
+
+
+def write_txt(path, lines):
+    """Write `lines` to a UTF-8 text file."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines))
+
+
+WRITERS = {"pdf": write_pdf, "docx": write_docx, "txt": write_txt}
+
+
+def generate_corpus(out_dir, count, file_types=("pdf", "docx", "txt"), seed=42, paragraphs=6):
+    """
+    Generate `count` resumes, cycling through `file_types`.
+
+    Args:
+        out_dir (str): Directory to write the resumes to.
+        count (int): Number of resumes.
+        file_types (tuple): Extensions to generate.
+        seed (int): Seed for reproducible content.
+        paragraphs (int): Experience entries per resume.
+
+    Returns:
+        list[str]: Paths of the generated files.
+    """
+    rng = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for index in range(count):
+        file_type = file_types[index % len(file_types)]
+        path = os.path.join(out_dir, f"resume_{index:05d}.{file_type}")
+        WRITERS[file_type](path, resume_lines(rng, paragraphs))
+        paths.append(path)
+    return paths
+
+
+def build_zip(zip_path, paths):
+    """Pack resumes into a ZIP archive; entries are numbered so the same file can appear twice."""
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as z:
+        for index, path in enumerate(paths):
+            z.write(path, f"{index:05d}_{os.path.basename(path)}")
+    return zip_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic resume corpus (PDF, DOCX, TXT and ZIPs).")
+    parser.add_argument("--out", default="bench_corpus", help="Output directory.")
+    parser.add_argument("--count", type=int, default=100, help="Number of resumes.")
+    parser.add_argument("--types", default="pdf,docx,txt", help="Comma separated file types.")
+    parser.add_argument("--zip-sizes", default="10,100", help="Comma separated ZIP sizes to build.")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    files = generate_corpus(args.out, args.count, tuple(args.types.split(",")), seed=args.seed)
+    for size in (int(size) for size in args.zip_sizes.split(",") if size):
+        build_zip(os.path.join(args.out, f"resumes_{size}.zip"), (files * (size // len(files) + 1))[:size])
+    print(f"Wrote {len(files)} resumes to {args.out}")
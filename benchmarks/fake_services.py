@@ -0,0 +1,354 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, unquote
+from urllib.request import Request, urlopen
+import multiprocessing
+import threading
+import hashlib
+import sqlite3
+import random
+import json
+import time
+import re
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        # Keep benchmark output clean
+        pass
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+
+class _BackgroundServer:
+    """Run an HTTP server on a free local port in a daemon thread."""
+
+    handler_class = None
+
+    def __init__(self):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self.handler_class)
+        self.httpd.daemon_threads = True
+        self.httpd.service = self
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _FakeLLMHandler(_QuietHandler):
+
+    def do_GET(self):
+        # Counters, read by a benchmark driver running in another process
+        if urlparse(self.path).path != "/_stats":
+            self._send(404)
+            return
+        service = self.server.service
+        body = json.dumps({"requests": service.requests, "rate_limited": service.rate_limited})
+        self._send(200, body.encode(), {"Content-Type": "application/json"})
+
+    def do_POST(self):
+        service = self.server.service
+        request = json.loads(self._read_body() or b"{}")
+        if urlparse(self.path).path == "/_config":
+            # Change latency, jitter or rate_limit_ratio while running
+            for name in ("latency", "jitter", "rate_limit_ratio"):
+                if name in request:
+                    setattr(service, name, request[name])
+            self._send(204)
+            return
+        service.requests += 1
+
+        # Simulated latency around the configured mean
+        time.sleep(max(0.0, random.gauss(service.latency, service.jitter)))
+
+        if random.random() < service.rate_limit_ratio:
+            service.rate_limited += 1
+            body = json.dumps({"error": {"message": "Rate limit reached", "type": "requests", "code": None}})
+            self._send(429, body.encode(), {"Content-Type": "application/json", "Retry-After": "1"})
+            return
+
+        prompt = " ".join(message.get("content", "") for message in request.get("messages", []))
+        content = (f"Score: {random.randint(10, 99)}\n"
+                   "Key aspects: Python, SQL, cloud infrastructure, team leadership, data pipelines.")
+        body = json.dumps({
+            "id": f"chatcmpl-{service.requests}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": len(prompt) // 4,
+                "completion_tokens": len(content) // 4,
+                "total_tokens": (len(prompt) + len(content)) // 4,
+            },
+        })
+        self._send(200, body.encode(), {"Content-Type": "application/json"})
+
+
+class FakeLLMServer(_BackgroundServer):
+    """
+    OpenAI-compatible chat completions endpoint with configurable latency and 429 rate.
+
+    Point the app at it with OPENAI_API_BASE=<url>/v1. Settings can be changed while it runs,
+    also over HTTP with POST /_config; GET /_stats returns the counters.
+
+    Args:
+        latency (float): Mean response time in seconds.
+        jitter (float): Standard deviation of the response time.
+        rate_limit_ratio (float): Share of requests answered with 429.
+    """
+
+    handler_class = _FakeLLMHandler
+
+    def __init__(self, latency=0.5, jitter=0.1, rate_limit_ratio=0.0):
+        super().__init__()
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_ratio = rate_limit_ratio
+        self.requests = 0
+        self.rate_limited = 0
+
+
+class _FakeS3Handler(_QuietHandler):
+
+    def _object_key(self):
+        path = unquote(urlparse(self.path).path).lstrip("/")
+        bucket, _, key = path.partition("/")
+        return bucket, key
+
+    def _not_found(self):
+        body = b"<?xml version=\"1.0\"?><Error><Code>NoSuchKey</Code><Message>Not found</Message></Error>"
+        self._send(404, body, {"Content-Type": "application/xml"})
+
+    def do_POST(self):
+        # Drop every stored object; bucket names cannot start with an underscore
+        if urlparse(self.path).path != "/_reset":
+            self._send(405)
+            return
+        with self.server.service.lock:
+            self.server.service.objects.clear()
+        self._send(204)
+
+    def do_PUT(self):
+        body = self._read_body()
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        with self.server.service.lock:
+            self.server.service.objects[self._object_key()] = (body, etag)
+        self._send(200, headers={"ETag": etag})
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        service = self.server.service
+        if service.latency:
+            time.sleep(service.latency)
+        with service.lock:
+            stored = service.objects.get(self._object_key())
+        if stored is None:
+            self._not_found()
+            return
+        body, etag = stored
+
+        if self.headers.get("If-None-Match") == etag:
+            self._send(304, headers={"ETag": etag})
+            return
+
+        headers = {"ETag": etag, "Content-Type": "binary/octet-stream", "Accept-Ranges": "bytes"}
+        match = re.match(r"bytes=(\d*)-(\d*)", self.headers.get("Range") or "")
+        if match:
+            start = int(match.group(1) or 0)
+            end = int(match.group(2)) if match.group(2) else len(body) - 1
+            end = min(end, len(body) - 1)
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+            self._send(206, body[start:end + 1], headers)
+            return
+        self._send(200, body, headers)
+
+
+class FakeS3Server(_BackgroundServer):
+    """
+    In-memory stand-in for the S3 object API used by the app: PUT, GET (with Range and
+    If-None-Match) and HEAD on path-style URLs. Multipart uploads are not supported, so keep
+    benchmark files below the boto3 multipart threshold (8 MB).
+
+    Point the app at it with S3_ENDPOINT_URL=<url>. POST /_reset drops every stored object.
+
+    Args:
+        latency (float): Extra seconds added to every GET.
+    """
+
+    handler_class = _FakeS3Handler
+
+    def __init__(self, latency=0.0):
+        super().__init__()
+        self.latency = latency
+        self.objects = {}
+        self.lock = threading.Lock()
+
+
+def _serve_fake_services(llm_options, s3_options, connection):
+    llm_server = FakeLLMServer(**llm_options).start()
+    s3_server = FakeS3Server(**s3_options).start()
+    connection.send((llm_server.url, s3_server.url))
+    try:
+        # Serve until the parent asks to stop or goes away
+        connection.recv()
+    except EOFError:
+        pass
+    llm_server.stop()
+    s3_server.stop()
+
+
+class FakeServicesProcess:
+    """
+    Run the fake LLM and S3 in a child process.
+
+    In-process stand-ins would count towards the memory of the measured process, with every
+    uploaded object kept by the fake S3, and would compete with the app for the GIL.
+
+    Args:
+        llm_latency (float): Mean fake LLM response time in seconds.
+        llm_jitter (float): Standard deviation of the fake LLM response time.
+        s3_latency (float): Extra seconds added to every fake S3 GET.
+    """
+
+    def __init__(self, llm_latency=0.5, llm_jitter=0.1, s3_latency=0.0):
+        self.llm_options = {"latency": llm_latency, "jitter": llm_jitter}
+        self.s3_options = {"latency": s3_latency}
+        self.llm_url = None
+        self.s3_url = None
+        self._process = None
+        self._connection = None
+
+    def start(self):
+        # Spawn rather than fork, so the child holds none of the parent's memory
+        context = multiprocessing.get_context("spawn")
+        self._connection, child_connection = context.Pipe()
+        self._process = context.Process(target=_serve_fake_services, daemon=True,
+                                        args=(self.llm_options, self.s3_options, child_connection))
+        self._process.start()
+        self.llm_url, self.s3_url = self._connection.recv()
+        return self
+
+    def _call(self, url, body=None):
+        request = Request(url, data=json.dumps(body).encode() if body is not None else None,
+                          method="GET" if body is None else "POST")
+        with urlopen(request, timeout=10) as response:
+            content = response.read()
+        return json.loads(content) if content else None
+
+    def configure_llm(self, **settings):
+        """Change `latency`, `jitter` or `rate_limit_ratio` of the fake LLM."""
+        self._call(f"{self.llm_url}/_config", settings)
+
+    def llm_stats(self):
+        """Return the fake LLM's `requests` and `rate_limited` counters."""
+        return self._call(f"{self.llm_url}/_stats")
+
+    def reset_s3(self):
+        """Drop every object stored in the fake S3."""
+        self._call(f"{self.s3_url}/_reset", {})
+
+    def stop(self):
+        self._connection.send("stop")
+        self._process.join(10)
+        if self._process.is_alive():
+            self._process.terminate()
+
+
+class _SQLiteCursor:
+    """Cursor translating the psycopg2 parameter style (%s) to SQLite's (?)."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query, params=()):
+        if query.lstrip().upper().startswith("ALTER TABLE"):
+            self._alter_table(query)
+            return
+        # Values SQLite cannot bind natively (UUIDs, dates) are stored as text
+        params = tuple(p if p is None or isinstance(p, (int, float, str, bytes)) else str(p) for p in params)
+        self._cursor.execute(query.replace("%s", "?"), params)
+
+    def _alter_table(self, query):
+        # SQLite has no ADD COLUMN IF NOT EXISTS and no non-constant defaults on added columns
+        query = query.replace("IF NOT EXISTS", "").replace("DEFAULT now()", "")
+        try:
+            self._cursor.execute(query)
+        except sqlite3.OperationalError as e:
+            if "duplicate column" not in str(e):
+                raise
+
+    def executemany(self, query, rows):
+        self._cursor.executemany(query.replace("%s", "?"), rows)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+
+class _SQLiteConnection:
+    """Minimal psycopg2-like connection over SQLite."""
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, timeout=30)
+        self.closed = False
+
+    def cursor(self):
+        return _SQLiteCursor(self._conn.cursor())
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+        self.closed = True
+
+
+def use_sqlite_for_postgres(path):
+    """
+    Route the app's Postgres access to a SQLite file, for benchmarks without a database server.
+
+    Only the statements used by `Postgres_connect` are supported. For numbers that include real
+    database costs, point DB_HOST/DB_PORT/DB_USER/DB_PASSWORD/DB_NAME at a local PostgreSQL instead.
+
+    Args:
+        path (str): Path of the SQLite database file.
+    """
+    import psycopg2
+    import psycopg2.extras
+
+    # The app imports these on first use, so patching the psycopg2 modules covers every caller
+    psycopg2.connect = lambda **kwargs: _SQLiteConnection(path)
+    psycopg2.extras.execute_batch = lambda cur, query, rows: cur.executemany(query, rows)
@@ -0,0 +1,96 @@
+import subprocess
+import argparse
+import json
+import sys
+import os
+
+# Modules that must only be imported on first use; loading any of them at startup fails the check
+LAZY_MODULES = ("boto3", "psycopg2", "openai", "langchain_core", "win32com", "PyPDF2", "docx",
+                "sentence_transformers", "torch", "numpy")
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter so nothing is already imported
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{"seconds": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def parse_importtime(stderr):
+    """
+    Parse the output of `python -X importtime`.
+
+    Returns:
+        list[tuple]: (cumulative_microseconds, self_microseconds, module) for every imported module.
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            # Header line
+            continue
+        entries.append((int(cumulative_us), int(self_us), name.strip()))
+    return entries
+
+
+def measure(module):
+    """
+    Import `module` in a fresh interpreter and report its import time.
+
+    Args:
+        module (str): Module to import, e.g. "main" or "task_queue.worker".
+
+    Returns:
+        dict: Wall-clock import seconds, eagerly loaded lazy modules and the slowest imports.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(module=module)],
+        cwd=REPO_ROOT, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+    loaded = set(probe["modules"])
+    entries = sorted(parse_importtime(result.stderr), reverse=True)
+    return {
+        "module": module,
+        "seconds": probe["seconds"],
+        "eager_lazy_modules": [name for name in LAZY_MODULES if name in loaded],
+        "slowest": [{"module": name, "cumulative_ms": cumulative / 1000, "self_ms": self_us / 1000}
+                    for cumulative, self_us, name in entries[:15]],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check that the app and workers import within a startup-time budget, without heavy clients.")
+    parser.add_argument("--modules", default="main,task_queue.worker", help="Comma separated modules to import.")
+    parser.add_argument("--budget", type=float, default=float(os.getenv("IMPORT_TIME_BUDGET", 1.5)),
+                        help="Maximum import time in seconds for each module.")
+    parser.add_argument("--repeat", type=int, default=3, help="Imports per module; the fastest one is compared.")
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules.split(","):
+        runs = [measure(module) for _ in range(args.repeat)]
+        report = min(runs, key=lambda run: run["seconds"])
+
+        print(f"{module}: {report['seconds']:.3f}s (budget {args.budget:.3f}s)")
+        for entry in report["slowest"]:
+            print(f"  {entry['cumulative_ms']:9.1f} ms  {entry['module']}")
+
+        if report["seconds"] > args.budget:
+            print(f"FAIL: importing {module} exceeds the budget")
+            failed = True
+        if report["eager_lazy_modules"]:
+            print(f"FAIL: {module} imports {', '.join(report['eager_lazy_modules'])} at startup; import them on first use")
+            failed = True
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,260 @@
+from benchmarks.corpus import generate_corpus, build_zip
+from benchmarks.fake_services import FakeServicesProcess, use_sqlite_for_postgres
+import subprocess
+import threading
+import resource
+import tempfile
+import argparse
+import platform
+import asyncio
+import json
+import time
+import os
+
+JOB_DESCRIPTION = ("We are hiring a Backend Engineer with 3+ years of experience in Python, FastAPI, "
+                   "PostgreSQL and AWS. Experience with Docker and data pipelines is a plus.")
+
+# Each scenario uploads `requests` requests (`concurrency` at a time) of `files` resumes each.
+# With `zip`, the resumes of a request are sent as one ZIP archive.
+SCENARIOS = {
+    "small_batch": {"files": 5, "types": ("pdf", "docx", "txt"), "requests": 10, "concurrency": 1},
+    "mixed_batch": {"files": 50, "types": ("pdf", "docx", "txt"), "requests": 3, "concurrency": 1},
+    "zip_200": {"files": 200, "types": ("pdf", "docx", "txt"), "requests": 2, "concurrency": 1, "zip": True},
+    "concurrent_uploads": {"files": 10, "types": ("pdf", "txt"), "requests": 16, "concurrency": 8},
+    "llm_rate_limited": {"files": 50, "types": ("txt",), "requests": 2, "concurrency": 1, "llm_429_ratio": 0.1},
+}
+
+
+def percentile(values, fraction):
+    """Return the `fraction` percentile of `values` using linear interpolation."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class RssSampler:
+    """
+    Sample the resident set size of this process in the background and keep the peak, along with
+    the size at the start so the growth of one scenario can be told apart from earlier ones.
+    """
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.baseline_bytes = 0
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def current_rss():
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError):
+            # Outside Linux fall back to the lifetime peak (kilobytes on Linux, bytes on macOS)
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak if platform.system() == "Darwin" else peak * 1024
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak_bytes = max(self.peak_bytes, self.current_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.baseline_bytes = self.peak_bytes = self.current_rss()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def configure_environment(work_dir, llm_url, s3_url):
+    """
+    Point the app at the local stand-ins and keep all of its state inside `work_dir`.
+    Must run before the app modules are imported, since they read settings at import time.
+    """
+    os.environ.update({
+        "OPENAI_API_KEY": "benchmark",
+        "OPENAI_API_BASE": f"{llm_url}/v1",
+        "S3_ENDPOINT_URL": s3_url,
+        "AWS_ACCESS_KEY_ID": "benchmark",
+        "AWS_SECRET_ACCESS_KEY": "benchmark",
+        # The stand-in does not implement streaming checksums
+        "AWS_REQUEST_CHECKSUM_CALCULATION": "when_required",
+        "AWS_RESPONSE_CHECKSUM_VALIDATION": "when_required",
+        "LOG_FILE": os.path.join(work_dir, "logger.log"),
+        "OUTBOX_DB_PATH": os.path.join(work_dir, "outbox.sqlite3"),
+        "OUTBOX_SPOOL_DIR": os.path.join(work_dir, "outbox_spool"),
+        "RESUME_CACHE_DIR": os.path.join(work_dir, "resume_cache"),
+        "TASK_BROKER_SQLITE_PATH": os.path.join(work_dir, "task_queue.sqlite3"),
+        "VECTOR_INDEX_DIR": os.path.join(work_dir, "vector_index"),
+    })
+    # Embedding needs the model weights; set VECTOR_INDEX_ENABLED=true to include it in a run
+    os.environ.setdefault("VECTOR_INDEX_ENABLED", "false")
+
+
+def build_request_files(scenario, corpus_dir, request_index):
+    """Return the multipart `files` for one request of a scenario."""
+    paths = generate_corpus(os.path.join(corpus_dir, f"request_{request_index}"), scenario["files"],
+                            scenario["types"], seed=request_index)
+    if scenario.get("zip"):
+        zip_path = build_zip(os.path.join(corpus_dir, f"request_{request_index}.zip"), paths)
+        paths = [zip_path]
+
+    files = []
+    for path in paths:
+        with open(path, "rb") as f:
+            content_type = "application/zip" if path.endswith(".zip") else "application/octet-stream"
+            files.append(("files", (os.path.basename(path), f.read(), content_type)))
+    return files
+
+
+async def run_scenario(client, name, scenario, corpus_dir, services):
+    """
+    Run one scenario against the app and return its measurements.
+
+    Args:
+        client (httpx.AsyncClient): Client bound to the app.
+        name (str): Scenario name.
+        scenario (dict): Scenario settings from SCENARIOS.
+        corpus_dir (str): Directory for the generated resumes.
+        services (FakeServicesProcess): The stand-ins, reconfigured for this scenario.
+
+    Returns:
+        dict: Throughput, latency percentiles, peak RSS and error counts.
+    """
+    services.configure_llm(rate_limit_ratio=scenario.get("llm_429_ratio", 0.0))
+    services.reset_s3()
+    llm_stats_before = services.llm_stats()
+
+    requests = [build_request_files(scenario, os.path.join(corpus_dir, name), index)
+                for index in range(scenario["requests"])]
+    semaphore = asyncio.Semaphore(scenario["concurrency"])
+    latencies, statuses = [], {}
+    resumes_scored, resumes_failed = 0, 0
+
+    async def send(files):
+        nonlocal resumes_scored, resumes_failed
+        async with semaphore:
+            started = time.perf_counter()
+            response = await client.post("/upload-files/", params={"job_description": JOB_DESCRIPTION},
+                                         files=files, timeout=None)
+            latencies.append(time.perf_counter() - started)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        if response.status_code == 200:
+            for result in response.json().values():
+                # Failed LLM calls leave the key features empty
+                if result.get("key_feature"):
+                    resumes_scored += 1
+                else:
+                    resumes_failed += 1
+
+    with RssSampler() as rss:
+        started = time.perf_counter()
+        await asyncio.gather(*[send(files) for files in requests])
+        elapsed = time.perf_counter() - started
+    llm_stats = services.llm_stats()
+
+    return {
+        "scenario": name,
+        "settings": {key: list(value) if isinstance(value, tuple) else value for key, value in scenario.items()},
+        "wall_seconds": round(elapsed, 3),
+        "files_per_second": round((resumes_scored + resumes_failed) / elapsed, 3) if elapsed else None,
+        "latency_seconds": {
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "max": max(latencies) if latencies else None,
+        },
+        "peak_rss_mb": round(rss.peak_bytes / (1024 * 1024), 1),
+        # Growth over the RSS at the start of the scenario, i.e. without what earlier scenarios left behind
+        "rss_growth_mb": round((rss.peak_bytes - rss.baseline_bytes) / (1024 * 1024), 1),
+        "status_codes": {str(code): count for code, count in statuses.items()},
+        "resumes_scored": resumes_scored,
+        "resumes_failed": resumes_failed,
+        "llm_requests": llm_stats["requests"] - llm_stats_before["requests"],
+        "llm_rate_limited": llm_stats["rate_limited"] - llm_stats_before["rate_limited"],
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_benchmarks(scenario_names, llm_latency, s3_latency, postgres, output_path):
+    """
+    Start the local stand-ins in a child process, import the app against them and run the selected
+    scenarios. Only the app runs in this process, so its peak RSS is the app's own.
+
+    Returns:
+        dict: The full report, also written to `output_path` as JSON.
+    """
+    work_dir = tempfile.mkdtemp(prefix="resume_bench_")
+    services = FakeServicesProcess(llm_latency=llm_latency, llm_jitter=llm_latency / 5, s3_latency=s3_latency).start()
+    configure_environment(work_dir, services.llm_url, services.s3_url)
+
+    # Import the app only now that the environment points at the stand-ins
+    import httpx
+    from main import app
+    if postgres == "sqlite":
+        use_sqlite_for_postgres(os.path.join(work_dir, "resumes.sqlite3"))
+
+    await app.router.startup()
+    results = []
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+            for name in scenario_names:
+                print(f"Running {name}...", flush=True)
+                result = await run_scenario(client, name, SCENARIOS[name], os.path.join(work_dir, "corpus"),
+                                            services)
+                print(json.dumps(result, indent=2), flush=True)
+                results.append(result)
+    finally:
+        await app.router.shutdown()
+        services.stop()
+
+    report = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "llm_latency_seconds": llm_latency,
+        "s3_latency_seconds": s3_latency,
+        "postgres": postgres,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output_path}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="End-to-end benchmark of the upload pipeline against local OpenAI, S3 and Postgres stand-ins.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help=f"Comma separated scenarios to run. Available: {', '.join(SCENARIOS)}")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Mean fake LLM latency in seconds.")
+    parser.add_argument("--s3-latency", type=float, default=0.0, help="Extra fake S3 GET latency in seconds.")
+    parser.add_argument("--postgres", choices=["sqlite", "real"], default="sqlite",
+                        help="'sqlite' uses a local SQLite stand-in; 'real' uses the DB_* environment variables.")
+    parser.add_argument("--output", default=None,
+                        help="Result file; defaults to benchmarks/results/<timestamp>_<revision>.json")
+    args = parser.parse_args()
+
+    output = args.output or os.path.join(
+        "benchmarks", "results", f"{time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())}_{git_revision() or 'unknown'}.json")
+    asyncio.run(run_benchmarks(args.scenarios.split(","), args.llm_latency, args.s3_latency, args.postgres, output))
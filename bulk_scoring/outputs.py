@@ -0,0 +1,188 @@
+from Logging_folder.logger import logger
+import sqlite3
+import time
+import csv
+import os
+
+# Columns of every result row, in output order
+RESULT_COLUMNS = ["source", "resume_name", "file_type", "status", "score", "key_feature", "error", "processed_at"]
+
+# Row statuses
+OK = "ok"
+UNSUPPORTED = "unsupported"
+ERROR = "error"
+
+
+class Checkpoint:
+    """
+    Record of the files a bulk run has already written to its output, kept in SQLite.
+
+    Files are marked only after their rows are durably written, so an interrupted run can be
+    resumed without redoing work; at worst the last rows are written twice.
+
+    Args:
+        path (str): Path of the SQLite checkpoint file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS processed (
+                source TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                processed_at REAL NOT NULL
+            )
+        """)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS run_meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+
+    def get_meta(self, key):
+        row = self.conn.execute("SELECT value FROM run_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO run_meta (key, value) VALUES (?, ?)", (key, value))
+
+    def done_sources(self, retry_failed=False):
+        """
+        Return the sources that a resumed run should skip.
+
+        Args:
+            retry_failed (bool): Leave out files that failed, so they are processed again.
+
+        Returns:
+            set[str]: The finished sources.
+        """
+        query = "SELECT source FROM processed"
+        if retry_failed:
+            query += f" WHERE status != '{ERROR}'"
+        return {source for (source,) in self.conn.execute(query)}
+
+    def mark_done(self, rows):
+        """Mark the sources of written result rows as processed, in one transaction."""
+        if not rows:
+            return
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO processed (source, status, processed_at) VALUES (?, ?, ?)",
+                [(row["source"], row["status"], now) for row in rows]
+            )
+
+    def close(self):
+        self.conn.close()
+
+
+class CsvResultWriter:
+    """
+    Append result rows to a CSV file, flushing each row to disk before it is reported as written.
+
+    Args:
+        path (str): Path of the CSV file; appended to if it exists.
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        is_new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "a", newline="", encoding="utf-8")
+        self.writer = csv.DictWriter(self.file, fieldnames=RESULT_COLUMNS)
+        if is_new:
+            self.writer.writeheader()
+
+    def add(self, row):
+        """
+        Write one row.
+
+        Returns:
+            list[dict]: The rows now durably written.
+        """
+        self.writer.writerow(row)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return [row]
+
+    def close(self):
+        """Close the file; returns the rows written on close (none for CSV)."""
+        self.file.close()
+        return []
+
+
+class ParquetResultWriter:
+    """
+    Write result rows as numbered Parquet part files in a directory.
+
+    Rows are buffered and written `rows_per_part` at a time; a resumed run continues with the
+    next part number. Requires pyarrow.
+
+    Args:
+        directory (str): Output directory for the part files.
+        rows_per_part (int): Rows per part file.
+    """
+
+    def __init__(self, directory, rows_per_part=1000):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise RuntimeError("Parquet output requires pyarrow; install it or use --format csv") from e
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.directory = directory
+        self.rows_per_part = rows_per_part
+        self.buffer = []
+        os.makedirs(directory, exist_ok=True)
+        self.next_part = len([name for name in os.listdir(directory) if name.endswith(".parquet")])
+
+    def _write_part(self):
+        rows, self.buffer = self.buffer, []
+        schema = self.pa.schema([
+            (column, self.pa.int32() if column == "score" else self.pa.string()) for column in RESULT_COLUMNS
+        ])
+        table = self.pa.Table.from_pylist(rows, schema=schema)
+
+        # Write under a temporary name and rename, so readers never see a partial part file
+        path = os.path.join(self.directory, f"part-{self.next_part:05d}.parquet")
+        self.pq.write_table(table, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        self.next_part += 1
+        logger.info(f"Wrote {len(rows)} rows to {path}")
+        return rows
+
+    def add(self, row):
+        """
+        Buffer one row, writing a part file once the buffer is full.
+
+        Returns:
+            list[dict]: The rows now durably written.
+        """
+        self.buffer.append(row)
+        if len(self.buffer) >= self.rows_per_part:
+            return self._write_part()
+        return []
+
+    def close(self):
+        """Write the remaining buffered rows; returns them."""
+        return self._write_part() if self.buffer else []
+
+
+def open_result_writer(output, output_format, rows_per_part=1000):
+    """
+    Create the writer for an output format.
+
+    Args:
+        output (str): CSV file path, or directory of Parquet part files.
+        output_format (str): "csv" or "parquet".
+        rows_per_part (int): Rows per Parquet part file.
+
+    Returns:
+        CsvResultWriter or ParquetResultWriter: The writer.
+    """
+    if output_format == "csv":
+        return CsvResultWriter(output)
+    if output_format == "parquet":
+        return ParquetResultWriter(output, rows_per_part)
+    raise ValueError(f"Unknown output format: {output_format}")
@@ -0,0 +1,312 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from templates.templates import TEMPLATES
+from model_calling.openai_call import get_conversation_openai
+from model_calling.async_api_call import conversation_resume, conversation_score
+from files_reading.utils import READERS, read_resume_file, clean_text, extract_first_two_digit_number
+from aws_s3_connect.connect import create_s3_client
+from bulk_scoring.outputs import Checkpoint, open_result_writer, OK, UNSUPPORTED, ERROR
+from Logging_folder.logger import logger, log_context
+from metrics.prometheus import file_extension_of
+import datetime
+import argparse
+import tempfile
+import hashlib
+import time
+import sys
+import os
+
+
+class DirectorySource:
+    """
+    Resumes in a local directory, including subdirectories.
+
+    Args:
+        directory (str): Root directory to scan.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def __iter__(self):
+        # Walk in sorted order so runs over the same tree see files in the same order
+        for root, dirs, files in os.walk(self.directory):
+            dirs.sort()
+            for name in sorted(files):
+                if file_extension_of(name) in READERS:
+                    yield os.path.relpath(os.path.join(root, name), self.directory)
+
+    @contextmanager
+    def local_path(self, key):
+        yield os.path.join(self.directory, key)
+
+
+class S3PrefixSource:
+    """
+    Resumes under an S3 prefix, listed page by page and downloaded one at a time while processed.
+
+    Args:
+        bucket (str): Bucket name.
+        prefix (str): Key prefix, e.g. "resume_files/2023/".
+    """
+
+    def __init__(self, bucket, prefix):
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def __iter__(self):
+        paginator = create_s3_client().get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for item in page.get("Contents", []):
+                if file_extension_of(item["Key"]) in READERS:
+                    yield item["Key"]
+
+    @contextmanager
+    def local_path(self, key):
+        # Keep the extension so the reader can be chosen from it
+        fd, path = tempfile.mkstemp(suffix=os.path.splitext(key)[1], prefix="bulk_")
+        os.close(fd)
+        try:
+            create_s3_client().download_file(self.bucket, key, path)
+            yield path
+        finally:
+            os.remove(path)
+
+
+def open_source(source):
+    """
+    Create the source for a local directory or an "s3://bucket/prefix" URL.
+
+    Args:
+        source (str): Directory path or S3 URL.
+
+    Returns:
+        DirectorySource or S3PrefixSource: The source.
+    """
+    if source.startswith("s3://"):
+        bucket, _, prefix = source[len("s3://"):].partition("/")
+        return S3PrefixSource(bucket, prefix)
+    if not os.path.isdir(source):
+        raise ValueError(f"Source directory does not exist: {source}")
+    return DirectorySource(source)
+
+
+def call_with_retries(conversation, inputs, attempts):
+    """
+    Call a model with exponential backoff, so rate limits during long runs do not fail files.
+
+    Args:
+        conversation (callable): Model callable, e.g. `conversation_resume`.
+        inputs (dict): Inputs for the prompt.
+        attempts (int): Maximum number of calls.
+
+    Returns:
+        str: The model response.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            return conversation(inputs)
+        except Exception as e:
+            if attempt == attempts:
+                raise
+            delay = min(2 ** attempt, 60)
+            logger.warning(f"Model call failed ({e}); retrying in {delay}s (attempt {attempt}/{attempts})")
+            time.sleep(delay)
+
+
+def score_file(source, key, job_description, attempts=3):
+    """
+    Read one resume, extract its key aspects and score it against the job description.
+
+    Args:
+        source (DirectorySource or S3PrefixSource): Source the file comes from.
+        key (str): Path or S3 key of the file within the source.
+        job_description (str): The processed job description.
+        attempts (int): Maximum calls per model request.
+
+    Returns:
+        dict: The result row; failures are reported in the row instead of raised.
+    """
+    row = {
+        "source": key,
+        "resume_name": os.path.basename(key),
+        "file_type": file_extension_of(key),
+        "status": OK,
+        "score": None,
+        "key_feature": None,
+        "error": None,
+    }
+    with log_context(file_name=key):
+        try:
+            with source.local_path(key) as path:
+                resume_content = read_resume_file(path)
+
+            if resume_content is None:
+                row["status"] = UNSUPPORTED
+            elif isinstance(resume_content, tuple) or resume_content.startswith("Error "):
+                # The readers report failures as an error message
+                row["status"] = ERROR
+                row["error"] = str(resume_content[0] if isinstance(resume_content, tuple) else resume_content)
+            else:
+                key_aspect = call_with_retries(conversation_resume, {"resume_text": resume_content}, attempts)
+                score = call_with_retries(conversation_score, {
+                    "resume_text": key_aspect,
+                    "job_description": job_description
+                }, attempts)
+                row["key_feature"] = clean_text(key_aspect or "")
+                row["score"] = int(extract_first_two_digit_number(score or ""))
+        except Exception as e:
+            logger.exception(f"Error scoring {key}: {e}")
+            row["status"] = ERROR
+            row["error"] = str(e)
+
+    row["processed_at"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    return row
+
+
+def prepare_job_description(checkpoint, job_description):
+    """
+    Extract the key features of the job description, or reuse the ones stored in the checkpoint.
+
+    Reusing them keeps the scores of a resumed run comparable with the ones already written.
+    """
+    digest = hashlib.sha256(job_description.encode("utf-8")).hexdigest()
+    stored_digest = checkpoint.get_meta("job_description_sha256")
+    if stored_digest is not None and stored_digest != digest:
+        raise ValueError(f"Checkpoint {checkpoint.path} belongs to a run with a different job description; "
+                         "use a new output or checkpoint path")
+
+    processed_jd = checkpoint.get_meta("processed_job_description")
+    if processed_jd is None:
+        conversation_jd = get_conversation_openai(TEMPLATES["job_description"], prompt_name="job_description")
+        processed_jd = conversation_jd({"job_description_text": job_description})
+        checkpoint.set_meta("job_description_sha256", digest)
+        checkpoint.set_meta("processed_job_description", processed_jd)
+    return processed_jd
+
+
+class ProgressReporter:
+    """Count results and report throughput every `interval` seconds."""
+
+    def __init__(self, interval=10.0):
+        self.interval = interval
+        self.skipped = 0
+        self.counts = {OK: 0, UNSUPPORTED: 0, ERROR: 0}
+        self.started = time.monotonic()
+        self.last_report = self.started
+
+    def add(self, row):
+        self.counts[row["status"]] += 1
+        if time.monotonic() - self.last_report >= self.interval:
+            self.report()
+
+    def report(self, final=False):
+        self.last_report = time.monotonic()
+        elapsed = self.last_report - self.started
+        processed = sum(self.counts.values())
+        rate = processed / elapsed if elapsed else 0.0
+        message = (f"{'Finished' if final else 'Progress'}: {processed} files in {elapsed:.0f}s "
+                   f"({rate:.2f} files/s) - ok {self.counts[OK]}, failed {self.counts[ERROR]}, "
+                   f"unsupported {self.counts[UNSUPPORTED]}, skipped from checkpoint {self.skipped}")
+        logger.info(message)
+        print(message, file=sys.stderr, flush=True)
+
+
+def run_bulk_scoring(source, job_description, output, output_format="csv", checkpoint_path=None,
+                     concurrency=8, attempts=3, retry_failed=False, rows_per_part=1000, report_interval=10.0):
+    """
+    Score every resume of a source against a job description, writing results as they complete.
+
+    At most `concurrency` files are processed at once, and the source is consumed lazily, so
+    the run holds only the files in flight in memory however large the source is.
+
+    Args:
+        source (str): Directory path or "s3://bucket/prefix" URL.
+        job_description (str): The job description text.
+        output (str): CSV file, or directory of Parquet part files.
+        output_format (str): "csv" or "parquet".
+        checkpoint_path (str, optional): SQLite checkpoint; defaults to "<output>.checkpoint.sqlite3".
+        concurrency (int): Files processed in parallel.
+        attempts (int): Maximum calls per model request.
+        retry_failed (bool): Process files that failed in an earlier run again.
+        rows_per_part (int): Rows per Parquet part file.
+        report_interval (float): Seconds between progress reports.
+
+    Returns:
+        dict: Number of files per status.
+    """
+    resume_source = open_source(source)
+    checkpoint = Checkpoint(checkpoint_path or f"{output.rstrip('/')}.checkpoint.sqlite3")
+    done = checkpoint.done_sources(retry_failed=retry_failed)
+    if done:
+        logger.info(f"Resuming from {checkpoint.path}: {len(done)} files already processed")
+
+    processed_jd = prepare_job_description(checkpoint, job_description)
+    writer = open_result_writer(output, output_format, rows_per_part)
+    progress = ProgressReporter(report_interval)
+
+    def handle(future):
+        row = future.result()
+        checkpoint.mark_done(writer.add(row))
+        progress.add(row)
+
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    in_flight = set()
+    try:
+        for key in resume_source:
+            if key in done:
+                progress.skipped += 1
+                continue
+            # Keep the pool busy without reading ahead more of the source than needed
+            if len(in_flight) >= concurrency * 2:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    handle(future)
+            in_flight.add(executor.submit(score_file, resume_source, key, processed_jd, attempts))
+
+        for future in in_flight:
+            handle(future)
+    except KeyboardInterrupt:
+        logger.warning("Interrupted; saving finished results. Run the same command again to resume.")
+        for future in in_flight:
+            future.cancel()
+        for future in in_flight:
+            if future.done() and not future.cancelled():
+                handle(future)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        checkpoint.mark_done(writer.close())
+        checkpoint.close()
+        progress.report(final=True)
+
+    return dict(progress.counts)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Score a directory or S3 prefix of resumes against a job description, with checkpointing.")
+    parser.add_argument("source", help="Local directory or s3://bucket/prefix of resumes.")
+    job_description_group = parser.add_mutually_exclusive_group(required=True)
+    job_description_group.add_argument("--job-description", help="Job description text.")
+    job_description_group.add_argument("--job-description-file", help="File containing the job description.")
+    parser.add_argument("--output", required=True, help="CSV file, or directory of Parquet part files.")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv", help="Output format.")
+    parser.add_argument("--checkpoint", default=None,
+                        help="Checkpoint file; defaults to <output>.checkpoint.sqlite3.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Files processed in parallel.")
+    parser.add_argument("--attempts", type=int, default=3, help="Maximum calls per model request.")
+    parser.add_argument("--retry-failed", action="store_true", help="Process files that failed earlier again.")
+    parser.add_argument("--rows-per-part", type=int, default=1000, help="Rows per Parquet part file.")
+    parser.add_argument("--report-interval", type=float, default=10.0, help="Seconds between progress reports.")
+    args = parser.parse_args()
+
+    if args.job_description_file:
+        with open(args.job_description_file, encoding="utf-8") as f:
+            job_description_text = f.read()
+    else:
+        job_description_text = args.job_description
+
+    counts = run_bulk_scoring(args.source, job_description_text, args.output, args.format, args.checkpoint,
+                              args.concurrency, args.attempts, args.retry_failed, args.rows_per_part,
+                              args.report_interval)
+    sys.exit(1 if counts[ERROR] else 0)
@@ -0,0 +1,128 @@
+from functools import lru_cache
+import os
+
+
+def _int(environ, name, default):
+    return int(environ.get(name, default))
+
+
+def _float(environ, name, default):
+    return float(environ.get(name, default))
+
+
+def _bool(environ, name, default):
+    return str(environ.get(name, default)).lower() == 'true'
+
+
+class Settings:
+    """
+    Application settings, read once from the environment (and the .env file).
+
+    Modules read their settings from `get_settings()` instead of calling `load_dotenv()` and
+    `os.getenv` themselves, so the .env file is parsed a single time per process.
+
+    Args:
+        environ (Mapping): Source of the settings, normally `os.environ`.
+    """
+
+    def __init__(self, environ):
+        # API
+        self.frontend_url = environ.get('FRONTEND_URL')
+        self.backend_url = environ.get('BACKEND_URL')
+        self.download_chunk_size = _int(environ, 'DOWNLOAD_CHUNK_SIZE', 64 * 1024)
+        self.presigned_url_expiry = _int(environ, 'PRESIGNED_URL_EXPIRY', 300)
+        self.upload_spool_max_memory = _int(environ, 'UPLOAD_SPOOL_MAX_MEMORY', 1024 * 1024)
+        self.job_ttl_seconds = _int(environ, 'JOB_TTL_SECONDS', 3600)
+        self.gzip_minimum_size = _int(environ, 'GZIP_MINIMUM_SIZE', 1024)
+        self.gzip_compress_level = _int(environ, 'GZIP_COMPRESS_LEVEL', 5)
+        self.request_deadline_seconds = _float(environ, 'REQUEST_DEADLINE_SECONDS', 600)
+
+        # Logging
+        self.log_file = environ.get('LOG_FILE', 'logger.log')
+        self.log_level = environ.get('LOG_LEVEL', 'INFO')
+        self.log_max_bytes = _int(environ, 'LOG_MAX_BYTES', 50 * 1024 * 1024)
+        self.log_backup_count = _int(environ, 'LOG_BACKUP_COUNT', 5)
+        self.log_queue_size = _int(environ, 'LOG_QUEUE_SIZE', 10000)
+        self.log_per_file_sample_rate = _float(environ, 'LOG_PER_FILE_SAMPLE_RATE', 1.0)
+
+        # OpenAI
+        self.openai_api_key = environ.get('OPENAI_API_KEY')
+
+        # AWS S3
+        self.aws_access_key_id = environ.get('AWS_ACCESS_KEY_ID')
+        self.aws_secret_access_key = environ.get('AWS_SECRET_ACCESS_KEY')
+        self.aws_region = environ.get('AWS_REGION', 'ap-south-1')
+        self.s3_endpoint_url = environ.get('S3_ENDPOINT_URL')
+        self.resume_cache_dir = environ.get('RESUME_CACHE_DIR', 'resume_cache')
+        self.resume_cache_max_bytes = _int(environ, 'RESUME_CACHE_MAX_BYTES', 512 * 1024 * 1024)
+        self.resume_cache_revalidate_seconds = _int(environ, 'RESUME_CACHE_REVALIDATE_SECONDS', 60)
+
+        # PostgreSQL
+        self.db_host = environ.get('DB_HOST')
+        self.db_user = environ.get('DB_USER')
+        self.db_password = environ.get('DB_PASSWORD')
+        self.db_name = environ.get('DB_NAME')
+        self.db_port = environ.get('DB_PORT')
+
+        # Write-behind outbox
+        self.write_behind_enabled = _bool(environ, 'WRITE_BEHIND_ENABLED', 'true')
+        self.outbox_db_path = environ.get('OUTBOX_DB_PATH', 'write_behind_outbox.sqlite3')
+        self.outbox_spool_dir = environ.get('OUTBOX_SPOOL_DIR', 'write_behind_spool')
+        self.outbox_batch_size = _int(environ, 'OUTBOX_BATCH_SIZE', 100)
+        self.outbox_max_attempts = _int(environ, 'OUTBOX_MAX_ATTEMPTS', 10)
+        self.outbox_poll_interval = _float(environ, 'OUTBOX_POLL_INTERVAL', 1.0)
+        self.outbox_claim_timeout = _float(environ, 'OUTBOX_CLAIM_TIMEOUT', 600)
+
+        # Admission control
+        self.max_concurrent_uploads = _int(environ, 'MAX_CONCURRENT_UPLOADS', 4)
+        self.max_queued_uploads = _int(environ, 'MAX_QUEUED_UPLOADS', 16)
+        self.upload_queue_timeout = _float(environ, 'UPLOAD_QUEUE_TIMEOUT', 30)
+        self.max_files_per_request = _int(environ, 'MAX_FILES_PER_REQUEST', 500)
+        self.max_request_bytes = _int(environ, 'MAX_REQUEST_BYTES', 200 * 1024 * 1024)
+        self.max_zip_entries = _int(environ, 'MAX_ZIP_ENTRIES', 2000)
+        self.max_zip_uncompressed_bytes = _int(environ, 'MAX_ZIP_UNCOMPRESSED_BYTES', 500 * 1024 * 1024)
+        self.max_zip_compression_ratio = _float(environ, 'MAX_ZIP_COMPRESSION_RATIO', 100)
+
+        # Task queue and workers
+        self.task_broker = environ.get('TASK_BROKER', 'sqlite')
+        self.task_broker_sqlite_path = environ.get('TASK_BROKER_SQLITE_PATH', 'task_queue.sqlite3')
+        self.task_max_attempts = _int(environ, 'TASK_MAX_ATTEMPTS', 5)
+        self.worker_tmp_dir = environ.get('WORKER_TMP_DIR', 'worker_files/')
+        self.worker_concurrency = _int(environ, 'WORKER_CONCURRENCY', 4)
+        self.worker_visibility_timeout = _int(environ, 'WORKER_VISIBILITY_TIMEOUT', 300)
+        self.worker_poll_interval = _float(environ, 'WORKER_POLL_INTERVAL', 1.0)
+        self.worker_done_retention = _int(environ, 'WORKER_DONE_RETENTION', 24 * 3600)
+
+        # Re-scoring stored resumes
+        self.rescore_concurrency = _int(environ, 'RESCORE_CONCURRENCY', 8)
+        self.rescore_rate_limit = _float(environ, 'RESCORE_RATE_LIMIT', 5.0)
+        self.rescore_write_batch_size = _int(environ, 'RESCORE_WRITE_BATCH_SIZE', 100)
+
+        # Fair-share scheduling of model calls
+        self.llm_max_concurrency = _int(environ, 'LLM_MAX_CONCURRENCY', 16)
+        self.llm_small_batch_size = _int(environ, 'LLM_SMALL_BATCH_SIZE', 20)
+        self.llm_interactive_weight = _int(environ, 'LLM_INTERACTIVE_WEIGHT', 4)
+        self.llm_metric_tenants = frozenset(
+            tenant.strip() for tenant in environ.get('LLM_METRIC_TENANTS', '').split(',') if tenant.strip()
+        )
+
+        # Vector index of stored resumes
+        self.vector_index_enabled = _bool(environ, 'VECTOR_INDEX_ENABLED', 'true')
+        self.vector_index_dir = environ.get('VECTOR_INDEX_DIR', 'vector_index_data')
+        self.vector_index_compact_ratio = _float(environ, 'VECTOR_INDEX_COMPACT_RATIO', 0.25)
+        self.vector_index_nprobe = _int(environ, 'VECTOR_INDEX_NPROBE', 32)
+        self.embedding_model = environ.get('EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
+        self.embedding_batch_size = _int(environ, 'EMBEDDING_BATCH_SIZE', 64)
+
+
+@lru_cache(maxsize=None)
+def get_settings():
+    """
+    Load the .env file on first use and return the shared settings.
+
+    Returns:
+        Settings: The settings of this process.
+    """
+    from dotenv import load_dotenv
+    load_dotenv()
+    return Settings(os.environ)
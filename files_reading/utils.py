@@ -1,14 +1,12 @@
-from PyPDF2 import PdfReader
-from docx import Document
-import win32com.client
-from Logging_folder.logger import logger
+from Logging_folder.logger import logger, PER_FILE, log_context
 import os
-import io
 import re
+import shutil
 import zipfile
-from aws_s3_connect.connect import upload_resume_file
-from Postgres_connect.pgadmin_connect import pgadmin_connect, pgadmin_disconnect
-from Postgres_connect.query_insertion import insert_resume_data
+from write_behind.outbox import store_resume
+from admission_control.limits import AdmissionRejected, check_zip_archive
+from request_deadlines.cancellation import RequestCancelled, check_cancelled
+from metrics.prometheus import stage_timer, file_extension_of, BYTES_PROCESSED
 import uuid
 
 
@@ -61,6 +59,7 @@ def read_pdf(file_path):
     """
     # Create a PDF reader object from the input file
     try:
+        from PyPDF2 import PdfReader
         with open(file_path, "rb") as pdf_file:
             pdf_reader = PdfReader(pdf_file)
             
@@ -81,6 +80,7 @@ def read_pdf(file_path):
 def read_docx(file_path):
     """Extract text from a DOCX file."""
     try:
+        from docx import Document
         with open(file_path, "rb") as docx_file:
             document = Document(docx_file)
             extracted_text = ""
@@ -96,9 +96,11 @@ def read_docx(file_path):
 def read_doc(file_path: str):
     """
     Extract text from a DOC file using COM automation (Windows only).
+    pywin32 is imported here so the module can be imported on other platforms.
     """
     word = None
     try:
+        import win32com.client
         # Now extract text using Word automation
         word = win32com.client.Dispatch("Word.Application")
         word.Visible = False
@@ -126,30 +128,62 @@ def read_txt(file_path):
     except Exception as e:
         logger.exception(f"Error processing TXT file: {str(e)}")
         return f"Error processing TXT file: {str(e)}"
-    
 
-async def process_zip_file(file, extract_path):
+
+# Reader for each supported file extension
+READERS = {
+    "pdf": read_pdf,
+    "txt": read_txt,
+    "docx": read_docx,
+    "doc": read_doc,
+}
+
+
+def read_resume_file(file_path):
     """
-    Process a ZIP file containing resumes.
+    Extract text from a resume file, choosing the reader from the file extension.
 
-    This function extracts the contents of the ZIP file, reads the text from each resume file,
-    stores the extracted text in the database, and uploads the processed resumes to an S3 bucket.
+    Args:
+        file_path (str): Path to a PDF, TXT, DOCX or DOC file.
+
+    Returns:
+        str or None: The extracted text, or None if the file type is not supported.
+    """
+    file_extension = file_extension_of(file_path)
+    reader = READERS.get(file_extension)
+    if reader is None:
+        logger.warning(f"Unsupported file type: {file_extension}")
+        return None
+
+    with stage_timer("parse", file_type=file_extension) as timer:
+        resume_content = reader(file_path)
+        # The readers report failures as an error message instead of raising
+        if isinstance(resume_content, tuple) or str(resume_content).startswith("Error "):
+            timer["outcome"] = "error"
+    BYTES_PROCESSED.inc(os.path.getsize(file_path), stage="parse", file_type=file_extension)
+    return resume_content
+    
+
+def extract_zip_file(file, extract_path):
+    """
+    Extract every file of an uploaded ZIP archive under a unique name. Blocking; run it in the executor.
 
     Args:
-        file (bytes): The ZIP file data as bytes.
+        file (UploadFile): The uploaded ZIP file.
         extract_path (str): The path to extract the contents of the ZIP file.
 
     Returns:
-        dict: A dictionary containing the extracted text and file paths of each resume file.
+        tuple: The list of original file names in the archive and the matching list of unique file names on disk.
     """
-    zip_response_data = {}
-    conn, cur = pgadmin_connect()
-    zip_data = await file.read()
-    zip_file = io.BytesIO(zip_data)
+    # Open the archive straight from the uploaded (spooled) file instead of copying it into memory
+    file.file.seek(0)
     extracted_files = []
-    with zipfile.ZipFile(zip_file, 'r') as z:
+    with zipfile.ZipFile(file.file, 'r') as z:
+        # Refuse ZIP bombs before extracting anything
+        check_zip_archive(z, file.filename)
+
         # Extract files from the ZIP archive
-        file_name_list = z.namelist()
+        file_name_list = [info.filename for info in z.infolist() if not info.is_dir()]
         for original_file_name in file_name_list:
             # Generate a unique file name for each file in the ZIP archive
             id = str(uuid.uuid4())
@@ -160,50 +194,51 @@ async def process_zip_file(file, extract_path):
                         os.path.join(extract_path, unique_file_name))
             extracted_files.append(unique_file_name)
 
+    return file_name_list, extracted_files
+
+def process_zip_file(file, extract_path):
+    """
+    Process a ZIP file containing resumes. Blocking; run it in the executor.
+
+    This function extracts the contents of the ZIP file, reads the text from each resume file,
+    stores the extracted text in the database, and uploads the processed resumes to an S3 bucket.
+
+    Args:
+        file (bytes): The ZIP file data as bytes.
+        extract_path (str): The path to extract the contents of the ZIP file.
+
+    Returns:
+        dict: A dictionary containing the extracted text and file paths of each resume file; only
+        the files parsed before the request was cancelled, if it was.
+    """
+    zip_response_data = {}
+    file_name_list, extracted_files = extract_zip_file(file, extract_path)
+
     # Process each extracted file
     for index, file_name in enumerate(extracted_files):
+        # Stop parsing and storing once the request is cancelled; the caller notices it too
+        try:
+            check_cancelled()
+        except RequestCancelled:
+            break
         original_name = file_name_list[index]
-        logger.info(f"Reading file: {original_name}")
         file_path = os.path.join(extract_path, file_name)
         unique_id = re.match(r'^[a-f0-9\-]+', file_name).group()
 
-        # Process PDF files
-        if file_name.endswith(".pdf"):
-            resume_content = read_pdf(file_path)
-            zip_response_data[original_name] = {"content": resume_content}
-                    
-        # Process TXT files
-        elif file_name.endswith(".txt"):
-            resume_content = read_txt(file_path)
-            zip_response_data[original_name] = {"content": resume_content}
-
-        # Process DOCX files
-        elif file_name.endswith(".docx"):
-            resume_content = read_docx(file_path)
-            zip_response_data[original_name] = {"content": resume_content}
-
-        # Process DOC files
-        elif file_name.endswith(".doc"):
-            resume_content = read_doc(file_path)
-            zip_response_data[original_name] = {"content": resume_content}
-                    
-        zip_response_data[original_name]["file_path"] = file_name
-                
-        # If resume content is extracted, store it in the database
-        if resume_content is not None:
-            insert_resume_data(unique_id, original_name, resume_content)
-        else:
-            logger.warning(f"Skipping {original_name} - No content or blob data available")
-
-        # Upload the processed resume file to S3
-        upload_resume_file(filename=file_name, directory_path=extract_path)
-        logger.info(f"Uploaded {file_name} to S3 Bucket")
+        with log_context(file_name=original_name):
+            logger.info(f"Reading file: {original_name}", extra=PER_FILE)
+            # Process based on file type
+            resume_content = read_resume_file(file_path)
+
+            # If resume content is extracted, store it in the database and upload the file to S3
+            if resume_content is not None:
+                zip_response_data[original_name] = {"content": resume_content, "file_path": file_name}
+                store_resume(unique_id, original_name, resume_content, file_name, extract_path)
+            else:
+                logger.warning(f"Skipping {original_name} - No content or blob data available")
 
         # Clean up the extracted file
         cleanup_file(file_path)
-
-    # Close the database cursor and connection
-    pgadmin_disconnect(conn, cur)
     
     return zip_response_data
 
@@ -214,4 +249,85 @@ def cleanup_file(file_path):
         try:
             os.remove(file_path)
         except Exception as e:
-            logger.exception(f"Error removing temporary file {file_path}: {str(e)}")
\ No newline at end of file
+            logger.exception(f"Error removing temporary file {file_path}: {str(e)}")
+
+def process_single_file(file, extract_path):
+    """
+    Process a single (non-ZIP) resume file. Blocking; run it in the executor.
+
+    The file is saved under a unique name, its text is extracted based on the file extension,
+    and the resume is handed over to be stored in the database and uploaded to S3.
+
+    Args:
+        file (UploadFile): The uploaded resume file.
+        extract_path (str): The directory to save the file in while it is being processed.
+
+    Returns:
+        dict: A dictionary mapping the original file name to its extracted content and file path.
+    """
+    # Generate a unique file name using UUID
+    id = str(uuid.uuid4())
+    file_name = file.filename
+    unique_filename = f"{id}_{file_name}"
+    file_path = os.path.join(extract_path, unique_filename)
+
+    # Save individual file to the extract directory, copying from the spooled upload in chunks
+    file.file.seek(0)
+    with open(file_path, "wb") as f:
+        shutil.copyfileobj(file.file, f)
+
+    logger.info(f"Reading file: {file_name}", extra=PER_FILE)
+    # Process based on file type
+    resume_content = read_resume_file(file_path)
+    if resume_content is None:
+        cleanup_file(file_path)
+        return {}
+
+    # Upload the processed resume file to S3 and insert its data into the database
+    store_resume(id, file_name, resume_content, unique_filename, extract_path)
+
+    # Clean up the extracted file
+    cleanup_file(file_path)
+
+    return {file_name: {"content": resume_content, "file_path": unique_filename}}
+
+
+def process_uploaded_files(files, extract_path):
+    """
+    Process a list of uploaded files, expanding ZIP archives into the resumes they contain.
+
+    Parsing, file writes and ZIP extraction block, so this runs in the executor rather than on the
+    event loop. It checks for cancellation of the request before every file and stops there,
+    returning the resumes parsed so far so they can be reported as skipped.
+
+    Args:
+        files (list[UploadFile]): The uploaded files, which may include ZIP archives.
+        extract_path (str): The directory to extract and save files in while they are being processed.
+
+    Returns:
+        dict: A dictionary mapping each resume name to its extracted content and file path.
+    """
+    response_data = {}
+
+    # Iterate over each file uploaded
+    for file in files:
+        try:
+            check_cancelled()
+            file_extension = file.filename.split(".")[-1].lower()
+
+            # Check if the file is a ZIP archive
+            if file.content_type == "application/zip" or file_extension == "zip":
+                response_data.update(process_zip_file(file, extract_path))
+            else:
+                with log_context(file_name=file.filename):
+                    response_data.update(process_single_file(file, extract_path))
+
+        except RequestCancelled:
+            break
+        except AdmissionRejected:
+            # Limit violations end the whole request
+            raise
+        except Exception as e:
+            logger.exception(f"Error processing file: {str(e)}")
+
+    return response_data
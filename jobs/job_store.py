@@ -0,0 +1,124 @@
+from config.settings import get_settings
+import asyncio
+import uuid
+import time
+
+# Number of seconds a finished job is kept before it is forgotten
+JOB_TTL_SECONDS = get_settings().job_ttl_seconds
+
+# Job statuses
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+class Job:
+    """
+    State of one background resume-processing job.
+
+    Every change is appended to `events`, an append-only log of (event, data) pairs. Subscribers
+    replay the log from the start and then wait for new entries, so a client that connects late
+    still receives every result exactly once.
+    """
+
+    def __init__(self, job_id, job_description):
+        self.job_id = job_id
+        self.job_description = job_description
+        self.status = QUEUED
+        self.total = None
+        self.results = {}
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.events = []
+        self._changed = asyncio.Event()
+
+    def _publish(self, event, data):
+        self.events.append((event, data))
+        # Wake every waiting subscriber and arm a fresh event for the next change
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def set_running(self):
+        self.status = RUNNING
+        self._publish("status", self.summary())
+
+    def set_total(self, total):
+        self.total = total
+        self._publish("status", self.summary())
+
+    def add_result(self, filename, data):
+        self.results[filename] = data
+        self._publish("result", {"filename": filename, **data})
+
+    def set_completed(self):
+        self.status = COMPLETED
+        self.finished_at = time.time()
+        self._publish("done", self.summary())
+
+    def set_failed(self, error):
+        self.status = FAILED
+        self.error = error
+        self.finished_at = time.time()
+        self._publish("done", self.summary())
+
+    @property
+    def finished(self):
+        return self.status in (COMPLETED, FAILED)
+
+    def summary(self):
+        """Return the job status without the per-resume results."""
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "total": self.total,
+            "completed": len(self.results),
+            "error": self.error,
+        }
+
+    async def subscribe(self):
+        """
+        Yield (event, data) pairs from the start of the job until it finishes.
+        """
+        index = 0
+        while True:
+            changed = self._changed
+            while index < len(self.events):
+                yield self.events[index]
+                index += 1
+            if self.finished:
+                return
+            await changed.wait()
+
+
+class JobStore:
+    """In-memory registry of background jobs for this API process."""
+
+    def __init__(self, ttl_seconds=JOB_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._jobs = {}
+
+    def create(self, job_description):
+        """Create and register a new job."""
+        self._purge_expired()
+        job = Job(str(uuid.uuid4()), job_description)
+        self._jobs[job.job_id] = job
+        return job
+
+    def get(self, job_id):
+        """Return the job with the given id, or None if it is unknown or expired."""
+        return self._jobs.get(job_id)
+
+    def _purge_expired(self):
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished and now - job.finished_at > self.ttl_seconds
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+# Shared job store used by the API
+job_store = JobStore()
@@ -1,30 +1,64 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, File, UploadFile, HTTPException, Header, Request, Query
+from fastapi.responses import JSONResponse, StreamingResponse, RedirectResponse, FileResponse, PlainTextResponse
+from starlette.background import BackgroundTask
+from botocore.exceptions import ClientError
+from datetime import datetime
+import mimetypes
+import time
+import tempfile
+import asyncio
+import json
 import re
 import uuid
 import shutil
-from files_reading import utils
 from fastapi.middleware.cors import CORSMiddleware
 import base64
 import os
 from templates.templates import TEMPLATES
 from model_calling.openai_call import get_conversation_openai
-from model_calling.async_api_call import run_in_executor, process_resumes_async
-from aws_s3_connect.connect import upload_resume_file, download_from_s3
-from Logging_folder.logger import logger
-from Postgres_connect.query_insertion import insert_resume_data, update_resume_data
-from dotenv import load_dotenv
-from files_reading.utils import process_zip_file, cleanup_file
+from model_calling.async_api_call import run_in_executor, call_model, process_resumes_async, SKIPPED
+from model_calling.scheduler import llm_scheduler, llm_flow
+from aws_s3_connect.connect import (get_s3_object,
+                                    generate_presigned_download_url, content_disposition)
+from aws_s3_connect.cache import resume_cache
+from Logging_folder.logger import logger, PER_FILE, log_context, request_id_var, job_id_var
+from write_behind.outbox import outbox, store_resume_scores
+from config.settings import get_settings
+from files_reading.utils import process_uploaded_files, extract_zip_file
+from aws_s3_connect.connect import upload_resume_file
+from task_queue.broker import shared_broker
+from task_queue.tasks import PREPARE_JOB
+from admission_control.limits import (AdmissionRejected, upload_admission, check_request_size,
+                                      check_upload_limits)
+from metrics.prometheus import REGISTRY, HTTP_REQUESTS, HTTP_LATENCY, register_queue_depth
+from jobs.job_store import job_store
+from rescoring.rescore import run_rescore_job
+from response_shaping.results import (FastJSONResponse, SelectiveGZipMiddleware, parse_fields,
+                                      project_result, shape_results, fields_to_keep)
+from request_deadlines.cancellation import (RequestCancelled, DEADLINE_EXCEEDED, request_deadline,
+                                            run_cancellable, check_cancelled)
+from vector_index.search import (VECTOR_INDEX_ENABLED, shared_vector_index, similar_to_resume, similar_to_text,
+                                 remove_resumes)
 
-# Load environment variables from .env file
-load_dotenv()
+# Load settings from the environment and .env file
+settings = get_settings()
 
 # Initialize FastAPI application
 app = FastAPI()
 
 # Access the environment variables
-frontend_url = os.getenv("FRONTEND_URL")
-backend_url = os.getenv("BACKEND_URL")
+frontend_url = settings.frontend_url
+backend_url = settings.backend_url
+
+# Chunk size used when streaming resumes from S3 to the client
+DOWNLOAD_CHUNK_SIZE = settings.download_chunk_size
+# Number of seconds a presigned download URL stays valid
+PRESIGNED_URL_EXPIRY = settings.presigned_url_expiry
+# Uploads copied for background jobs are kept in memory up to this size, then spill to disk
+UPLOAD_SPOOL_MAX_MEMORY = settings.upload_spool_max_memory
+
+# Background job tasks that are still running, keyed by job id
+background_jobs = {}
 
 # Define origins list using the environment variables
 origins = [
@@ -42,9 +76,135 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+# Compress responses for clients that accept gzip. Event streams would be held back by the
+# compressor and downloads are served with byte ranges, so both are left uncompressed
+app.add_middleware(
+    SelectiveGZipMiddleware,
+    excluded_paths=r"^/download-resume/|/events$",
+    minimum_size=settings.gzip_minimum_size,
+    compresslevel=settings.gzip_compress_level,
+)
+
+# Endpoints that accept resume uploads and are subject to admission control
+UPLOAD_PATHS = ("/upload-files/", "/jobs/upload-files/", "/queue/upload-files/")
+
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    """Turn admission limit violations into 413/429 responses with a Retry-After hint."""
+    headers = {"Retry-After": str(exc.retry_after)} if exc.retry_after else None
+    return JSONResponse(status_code=exc.status_code, content={"detail": exc.detail}, headers=headers)
+
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """Reject uploads whose declared size is over the limit before the body is read."""
+    if request.url.path in UPLOAD_PATHS:
+        try:
+            check_request_size(request.headers.get("content-length"))
+        except AdmissionRejected as exc:
+            return await admission_rejected_handler(request, exc)
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def attach_request_id(request: Request, call_next):
+    """Tag every log line of a request with its id, taken from X-Request-ID when the client sends one."""
+    # Bounded so client-chosen ids fit the batch_id column resumes are tagged with
+    request_id = request.headers.get("x-request-id", "")[:64] or str(uuid.uuid4())
+    with log_context(request_id=request_id):
+        response = await call_next(request)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Count requests and measure their latency per route template."""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Use the route template rather than the raw path to keep label cardinality bounded
+        route = request.scope.get("route")
+        route_path = route.path if route is not None else "unmatched"
+        HTTP_REQUESTS.inc(method=request.method, route=route_path, status=status)
+        HTTP_LATENCY.observe(time.perf_counter() - started, method=request.method, route=route_path)
+
+
+def collect_queue_depths():
+    """Return the depth of every queue in this process for the /metrics endpoint."""
+    depths = {
+        ("uploads_active",): upload_admission.active,
+        ("uploads_waiting",): upload_admission.waiting,
+        ("background_jobs",): len(background_jobs),
+    }
+    if outbox is not None:
+        depths[("write_behind_pending",)] = outbox.pending_count()
+    # Only report the task queue when this process has used it
+    if shared_broker.cache_info().currsize:
+        for queue, depth in shared_broker().queue_depths().items():
+            depths[(f"task_queue_{queue}",)] = depth
+    return depths
+
+
+register_queue_depth("resume_queue_depth", "Items waiting or in progress per queue.", collect_queue_depths, ("queue",))
+
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Expose latency histograms, throughput counters and queue depths in Prometheus text format.
+
+    :return: Plain text response in the Prometheus exposition format
+    """
+    body = await run_in_executor(REGISTRY.render)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+
+@app.get("/admission/stats")
+async def admission_stats():
+    """
+    Report how many uploads are being processed, waiting, or were rejected.
+
+    :return: JSON response with the admission counters
+    """
+    return JSONResponse(content=upload_admission.stats())
+
+
+@app.get("/llm-scheduler/stats")
+async def llm_scheduler_stats():
+    """
+    Report how many model calls are running and waiting for a fair-share slot.
+
+    :return: JSON response with the scheduler counters
+    """
+    return JSONResponse(content=llm_scheduler.stats())
+
+
+@app.on_event("startup")
+async def start_write_behind():
+    """Start draining pending S3 uploads and database writes, including ones left by a previous run."""
+    if outbox is not None:
+        outbox.start()
+
+
+@app.on_event("shutdown")
+async def stop_write_behind():
+    """Flush what can be flushed before the process exits; the rest stays in the journal."""
+    if outbox is not None:
+        await run_in_executor(outbox.stop)
+
+
 # Define the endpoint for uploading files and processing resumes
 @app.post("/upload-files/")
-async def upload_files(job_description: str, files: list[UploadFile] = File(...)):
+async def upload_files(request: Request, job_description: str, files: list[UploadFile] = File(...),
+                       fields: str = None, top_n: int = Query(None, ge=1),
+                       x_tenant_id: str | None = Header(default=None),
+                       x_request_timeout: float | None = Header(default=None, gt=0)):
     """
     Upload and process multiple files along with a job description. This endpoint:
     - Accepts a job description and a list of files.
@@ -52,23 +212,74 @@ async def upload_files(job_description: str, files: list[UploadFile] = File(...)
     - Handles ZIP files by extracting and processing each file within the archive.
     - Uploads processed files to an S3 bucket and inserts resume data into a database.
     - Applies job description context to resumes and updates key features and scores in the database.
+    - With write-behind enabled, S3 and database writes are journaled and applied in the background.
+    - Stops working for the request when the client disconnects or the deadline passes; resumes that
+      were not scored by then are returned with the status 'skipped'.
     
     Args:
         job_description (str): A job description to extract context for resume matching.
         files (list[UploadFile]): A list of files to be processed, which may include resumes in various formats.
+        fields (str, optional): Comma separated fields to return per resume, e.g. "score,file_path".
+            Defaults to every field (file_path, score, key_feature, content and status).
+        top_n (int, optional): Return only the N highest scored resumes, best first.
+        x_tenant_id (str, optional): Tenant (e.g. recruiter or team) the model calls are fair-shared by.
+            Without it, each request gets a share of its own.
+        x_request_timeout (float, optional): Seconds the client will wait, e.g. its proxy timeout.
+            Capped at REQUEST_DEADLINE_SECONDS.
 
     Returns:
         dict: A dictionary containing extracted content, file paths, and processing details for each file.
     """
+    try:
+        requested_fields = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    check_upload_limits(files)
+
+    try:
+        # Cancel the remaining work when the client goes away or the deadline passes
+        async with request_deadline(request, x_request_timeout):
+            # Wait for a processing slot, or get rejected with 429 when the service is saturated
+            async with upload_admission.admit():
+                response_data = await run_upload_pipeline(job_description, files,
+                                                          fields=fields_to_keep(requested_fields, top_n),
+                                                          tenant=x_tenant_id)
+    except RequestCancelled as e:
+        # Cancelled before any resume was parsed; resumes parsed in time are returned as skipped instead.
+        # 499 is only seen in the logs of a gone client
+        raise HTTPException(status_code=504 if e.reason == DEADLINE_EXCEEDED else 499, detail=str(e))
+
+    # Serialise directly with the fast encoder; the results are plain JSON types already
+    return FastJSONResponse(shape_results(response_data, requested_fields, top_n))
 
-    # Initialize an empty dictionary to store response data
-    response_data = {}
+
+async def run_upload_pipeline(job_description, files, on_parsed=None, on_result=None, fields=None, tenant=None):
+    """
+    Run the full resume pipeline: process the job description, parse and store the uploaded files,
+    then extract key aspects and score every resume.
+
+    Args:
+        job_description (str): A job description to extract context for resume matching.
+        files (list[UploadFile]): The uploaded files, which may include ZIP archives.
+        on_parsed (callable, optional): Called with the number of resumes once parsing is done.
+        on_result (callable, optional): Called as `on_result(filename, data)` as soon as each resume is scored.
+        fields (tuple, optional): Fields to keep per resume; the others are released as soon as they
+            are persisted. Defaults to every field.
+        tenant (str, optional): Tenant the model calls are fair-shared by. Defaults to a share for
+            this request or job alone.
+
+    Returns:
+        dict: A dictionary containing extracted content, file paths, key features and scores for each resume.
+    """
+    # Model calls are fair-shared per tenant, or per request or job when the tenant is unknown
+    tenant = tenant[:64] if tenant else None
+    flow_key = tenant or job_id_var.get() or request_id_var.get()
 
     # Get conversation context for job description using OpenAI model
-    conversation_jd = get_conversation_openai(TEMPLATES["job_description"])
-    # Extract the key features from the job description
-    jd_response = conversation_jd({"job_description_text": job_description})
-    processed_jd = jd_response
+    conversation_jd = get_conversation_openai(TEMPLATES["job_description"], prompt_name="job_description")
+    # Extract the key features from the job description without blocking the event loop
+    with llm_flow(flow_key, 1, tenant):
+        processed_jd = await run_cancellable(call_model(conversation_jd, {"job_description_text": job_description}))
     logger.info("Processing the Job Description...\n")
 
     # Create a unique directory for each upload session
@@ -78,103 +289,339 @@ async def upload_files(job_description: str, files: list[UploadFile] = File(...)
     # Create the unique directory for the session
     os.makedirs(extract_path, exist_ok=True)
 
-    # Iterate over each file uploaded
-    for file in files:
-        try:
-            # Fallback to file extension if MIME type is not reliable
-            file_extension = file.filename.split(".")[-1].lower()
-
-            # Generate a unique file name using UUID
-            id = str(uuid.uuid4())
-            file_name = file.filename
-            unique_filename = f"{id}_{file_name}"
-            file_path = os.path.join(extract_path, unique_filename)
-
-            # Check if the file is a ZIP archive
-            if file.content_type == "application/zip" or file_extension == "zip":
-                # Dictionary will be returned of Zip files data
-                zip_response_data = await process_zip_file(file, extract_path) 
-                # Adding the Zip files data to the response data
-                response_data.update(zip_response_data) 
-
-            # Process non-ZIP files
-            else:
-                # Save individual file to extracted_files directory
-                file_content = await file.read()
-                
-                with open(file_path, "wb") as f:
-                    f.write(file_content)
-
-                logger.info(f"Reading file: {file_name}")
-                # Process based on file type
-                if file_extension == "pdf":
-                    resume_content = utils.read_pdf(file_path)
-                    response_data[file_name] = {"content": resume_content}
-                
-                elif file_extension == "txt":
-                    resume_content = utils.read_txt(file_path)
-                    response_data[file_name] = {"content": resume_content}
-                
-                elif file_extension == "docx":
-                    resume_content = utils.read_docx(file_path)
-                    response_data[file_name] = {"content": resume_content}
-                
-                elif file_extension == "doc":
-                    resume_content = utils.read_doc(file_path)
-                    response_data[file_name] = {"content": resume_content}
-                
-                else:
-                    logger.warning(f"Unsupported file type: {file_extension}")
-
-                # Add file path to the response data
-                response_data[file_name]["file_path"] = f"{id}_{file_name}"
-
-                # Upload the processed resume file to S3
-                upload_resume_file(filename = f"{id}_{file_name}", directory_path=extract_path)
-                logger.info(f"Uploaded {file_name} to S3 Bucket")
-            
-                # SQL query to insert data into the database.
-                insert_resume_data(id, file_name, resume_content) 
-            
-                # Clean up the extracted file
-                cleanup_file(file_path)
-
-        except Exception as e:
-            logger.exception(f"Error processing file: {str(e)}")
-             
-    # Process the resumes asynchronously
-    response_data = await process_resumes_async(response_data, processed_jd)
-
-    # Update the database with key features and scores for each resume
-    for key, value in response_data.items():
-        resume_key_aspect = value["key_feature"]
-        score = value["score"]
-        unique_id = re.match(r'^[a-f0-9\-]+', value["file_path"]).group()
-        resume_name = key
-
-        update_resume_data(unique_id, resume_key_aspect, score, resume_name)
-
-    # Clean up the unique directory after processing
-    shutil.rmtree(extract_path)
+    try:
+        # Extract the content of every resume and store it; parsing blocks, so it runs in the executor.
+        # The thread is awaited even on cancellation, so the directory is not removed under it.
+        # If the request is cancelled meanwhile, the resumes parsed so far come back and are
+        # marked skipped below, as no model call of a cancelled request starts
+        response_data = await run_in_executor(process_uploaded_files, files, extract_path)
+        if not response_data:
+            # Nothing to report as skipped
+            check_cancelled()
+        if on_parsed is not None:
+            on_parsed(len(response_data))
+
+        async def handle_result(filename, data):
+            # Update the database with key features and score as soon as the resume is scored;
+            # journaling waits for an fsync, so it runs in the executor
+            unique_id = re.match(r'^[a-f0-9\-]+', data["file_path"]).group()
+            await run_in_executor(store_resume_scores, unique_id, data["key_feature"], data["score"], filename)
+            # Keep only the requested fields now that the scores are persisted
+            project_result(data, fields)
+            if on_result is not None:
+                on_result(filename, data)
+
+        # Process the resumes asynchronously
+        keep_content = fields is None or "content" in fields
+        response_data = await process_resumes_async(response_data, processed_jd, on_result=handle_result,
+                                                     keep_content=keep_content, flow_key=flow_key, tenant=tenant)
+        # Skipped resumes were never passed to `handle_result`
+        for data in response_data.values():
+            if data.get("status") == SKIPPED:
+                project_result(data, fields)
+
+    finally:
+        # Clean up the unique directory after processing
+        shutil.rmtree(extract_path, ignore_errors=True)
 
     return response_data
 
 
+async def copy_upload_file(file):
+    """
+    Copy an uploaded file into a spooled temporary file that outlives the request.
+
+    Args:
+        file (UploadFile): The uploaded file.
+
+    Returns:
+        UploadFile: A copy backed by a temporary file (kept in memory while small).
+    """
+    spooled = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MAX_MEMORY)
+    await run_in_executor(shutil.copyfileobj, file.file, spooled)
+    spooled.seek(0)
+    return UploadFile(file=spooled, filename=file.filename, headers=file.headers)
+
+
+async def run_job(job, files, tenant=None):
+    """
+    Run the resume pipeline for a background job, publishing progress on the job.
+
+    Args:
+        job (Job): The job to run.
+        files (list[UploadFile]): Copies of the uploaded files.
+        tenant (str, optional): Tenant the model calls are fair-shared by.
+    """
+    try:
+        # The job was accepted already, so it waits for a slot as long as needed
+        async with upload_admission.admit(bounded_wait=False):
+            job.set_running()
+            with log_context(job_id=job.job_id):
+                await run_upload_pipeline(job.job_description, files, on_parsed=job.set_total,
+                                          on_result=job.add_result, tenant=tenant)
+        job.set_completed()
+    except Exception as e:
+        logger.exception(f"Job {job.job_id} failed: {str(e)}")
+        job.set_failed(str(e))
+    finally:
+        for file in files:
+            await file.close()
+        background_jobs.pop(job.job_id, None)
+
+
+@app.post("/jobs/upload-files/", status_code=202)
+async def create_upload_job(job_description: str, files: list[UploadFile] = File(...),
+                            x_tenant_id: str | None = Header(default=None)):
+    """
+    Start processing uploaded resumes in the background and return a job id immediately.
+
+    Args:
+        job_description (str): A job description to extract context for resume matching.
+        files (list[UploadFile]): A list of files to be processed, which may include ZIP archives.
+        x_tenant_id (str, optional): Tenant the model calls are fair-shared by.
+
+    Returns:
+        dict: The job id and the URLs to poll its status or stream its results.
+    """
+    check_upload_limits(files)
+    upload_admission.check_capacity()
+
+    # The request's files are closed once the response is sent, so keep our own copies
+    file_copies = [await copy_upload_file(file) for file in files]
+
+    job = job_store.create(job_description)
+    task = asyncio.create_task(run_job(job, file_copies, tenant=x_tenant_id))
+    # Keep a reference to the task so it is not garbage collected while running
+    background_jobs[job.job_id] = task
+    logger.info(f"Created job {job.job_id} with {len(files)} uploaded files")
+
+    return {
+        "job_id": job.job_id,
+        "status_url": f"/jobs/{job.job_id}",
+        "events_url": f"/jobs/{job.job_id}/events",
+    }
+
+
+@app.post("/jobs/rescore/", status_code=202)
+async def create_rescore_job(job_description: str, created_from: datetime = None, created_to: datetime = None,
+                             batch_id: str = None, limit: int = None,
+                             x_tenant_id: str | None = Header(default=None)):
+    """
+    Re-score stored resumes against a new or edited job description in the background.
+
+    Only the scoring prompt runs, against the key aspects stored when the resumes were uploaded,
+    and the new scores are written back to the database.
+
+    Args:
+        job_description (str): The job description to score against.
+        created_from (datetime, optional): Only resumes stored at or after this time.
+        created_to (datetime, optional): Only resumes stored before this time.
+        batch_id (str, optional): Only resumes stored by this upload, given its X-Request-ID or job id.
+        limit (int, optional): Maximum number of resumes, most recent first.
+        x_tenant_id (str, optional): Tenant the model calls are fair-shared by.
+
+    Returns:
+        dict: The job id and the URLs to poll its status or stream its results.
+    """
+    job = job_store.create(job_description)
+    task = asyncio.create_task(run_rescore_job(job, created_from, created_to, batch_id, limit, tenant=x_tenant_id))
+    # Keep a reference to the task so it is not garbage collected while running
+    background_jobs[job.job_id] = task
+    task.add_done_callback(lambda _: background_jobs.pop(job.job_id, None))
+    logger.info(f"Created re-scoring job {job.job_id}")
+
+    return {
+        "job_id": job.job_id,
+        "status_url": f"/jobs/{job.job_id}",
+        "events_url": f"/jobs/{job.job_id}/events",
+    }
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, fields: str = None, top_n: int = Query(None, ge=1)):
+    """
+    Return the status of a job along with the results of the resumes scored so far.
+
+    Args:
+        job_id (str): The id returned when the job was created.
+        fields (str, optional): Comma separated fields to return per resume, e.g. "score,file_path".
+        top_n (int, optional): Return only the N highest scored resumes, best first.
+
+    Returns:
+        dict: The job status and the partial results, keyed by resume name.
+    """
+    try:
+        requested_fields = parse_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    results = shape_results(job.results, requested_fields, top_n)
+    return FastJSONResponse({**job.summary(), "results": results})
+
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, format: str = "sse"):
+    """
+    Stream the progress of a job, pushing each resume's score as soon as it is ready.
+
+    Args:
+        job_id (str): The id returned when the job was created.
+        format (str): "sse" for server-sent events or "ndjson" for newline-delimited JSON.
+
+    Returns:
+        StreamingResponse: The event stream; it ends when the job is finished.
+    """
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if format not in ("sse", "ndjson"):
+        raise HTTPException(status_code=400, detail=f"Unsupported event format: {format}")
+
+    async def event_stream():
+        async for event, data in job.subscribe():
+            if format == "sse":
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+            else:
+                yield json.dumps({"event": event, "data": data}) + "\n"
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    # Disable proxy buffering so events reach the client as they are produced
+    return StreamingResponse(event_stream(), media_type=media_type,
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+def save_upload_for_queue(file, extract_path):
+    """
+    Save an uploaded file for the task queue, expanding ZIP archives into their resumes.
+    Blocking; run it in the executor.
+
+    Args:
+        file (UploadFile): The uploaded file.
+        extract_path (str): The directory to save the files in.
+
+    Returns:
+        list[dict]: One entry per resume with its unique id, original name and unique file name.
+    """
+    file_extension = file.filename.split(".")[-1].lower()
+    if file.content_type == "application/zip" or file_extension == "zip":
+        original_names, unique_names = extract_zip_file(file, extract_path)
+    else:
+        unique_name = f"{uuid.uuid4()}_{file.filename}"
+        file.file.seek(0)
+        with open(os.path.join(extract_path, unique_name), "wb") as f:
+            shutil.copyfileobj(file.file, f)
+        original_names, unique_names = [file.filename], [unique_name]
+
+    return [
+        {
+            "unique_id": re.match(r'^[a-f0-9\-]+', unique_name).group(),
+            "resume_name": original_name,
+            "file_path": unique_name,
+        }
+        for original_name, unique_name in zip(original_names, unique_names)
+    ]
+
+
+@app.post("/queue/upload-files/", status_code=202)
+async def enqueue_upload_files(job_description: str, files: list[UploadFile] = File(...)):
+    """
+    Hand uploaded resumes over to the worker queue instead of processing them in this process.
+
+    The files are uploaded to S3, where any worker can fetch them, and a job task is queued.
+    Workers (`python -m task_queue.worker`) then run the job description, parse, extraction and
+    scoring stages as separate tasks.
+
+    Args:
+        job_description (str): A job description to extract context for resume matching.
+        files (list[UploadFile]): A list of files to be processed, which may include ZIP archives.
+
+    Returns:
+        dict: The job id and the URL to poll its progress.
+    """
+    check_upload_limits(files)
+
+    job_id = str(uuid.uuid4())
+    extract_path = f"extracted_files_{job_id}"
+    os.makedirs(extract_path, exist_ok=True)
+
+    try:
+        resumes = []
+        for file in files:
+            resumes.extend(await run_in_executor(save_upload_for_queue, file, extract_path))
+
+        # Upload every resume to S3 concurrently so workers on any node can read it
+        uploaded = await asyncio.gather(*[
+            run_in_executor(upload_resume_file, filename=resume["file_path"], directory_path=extract_path)
+            for resume in resumes
+        ])
+    finally:
+        shutil.rmtree(extract_path, ignore_errors=True)
+
+    if not all(uploaded):
+        raise HTTPException(status_code=502, detail="Could not upload all files to S3")
+
+    await run_in_executor(shared_broker().enqueue, PREPARE_JOB,
+                          {"job_description": job_description, "files": resumes},
+                          job_id=job_id, dedupe_key=f"{PREPARE_JOB}:{job_id}")
+    logger.info(f"Queued job {job_id} with {len(resumes)} resumes")
+
+    return {"job_id": job_id, "status_url": f"/queue/jobs/{job_id}", "total": len(resumes)}
+
+
+@app.get("/queue/jobs/{job_id}")
+async def get_queue_job(job_id: str):
+    """
+    Return the progress of a queued job: task counts per stage and the scores recorded so far.
+
+    Args:
+        job_id (str): The id returned when the job was queued.
+
+    Returns:
+        dict: Task counts per stage and status, and the per-resume results.
+    """
+    progress = await run_in_executor(shared_broker().job_progress, job_id)
+    if not progress["counts"]:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"job_id": job_id, **progress}
+
+
 # Define the endpoint for downloading a file by its name
-@app.post("/download-resume/{file_path}")
-async def download_file(file_path: str):
+@app.api_route("/download-resume/{file_path}", methods=["GET", "POST"])
+async def download_file(file_path: str, mode: str = "data_url", range: str | None = Header(default=None)):
     """
     Asynchronous endpoint to download a file by its name.
+
+    Three modes are supported:
+    - "data_url" (default): JSON response with a base64 encoded PDF data URL.
+    - "stream": the file is streamed to the client through the disk cache, honouring HTTP Range requests.
+    - "redirect": the client is redirected to a short-lived presigned S3 URL.
+
+    Resumes uploaded moments ago may not be in S3 yet; while their upload is journaled in the
+    write-behind outbox they are served from its spool directory instead.
     
     :param file_path: Path of the file to download
-    :return: JSON response with base64 encoded PDF URL
+    :param mode: One of "data_url", "stream" or "redirect"
+    :param range: Optional HTTP Range header, used by the "stream" mode
+    :return: JSON response with base64 encoded PDF URL, a streaming response or a redirect
     """
+    if mode == "stream":
+        return await stream_file(file_path, range)
+    if mode == "redirect":
+        return await redirect_to_file(file_path)
+    if mode != "data_url":
+        raise HTTPException(status_code=400, detail=f"Unsupported download mode: {mode}")
+
     try:
-        # Download file from S3 asynchronously using run_in_executor
-        file_path = await run_in_executor(download_from_s3, file_path)
+        # Resumes whose upload is still journaled are served from the spool; the others come
+        # through the local disk cache, so hot resumes never reach S3
+        local_path = await spooled_copy(file_path) or await run_in_executor(resume_cache.get, file_path)
+        if local_path is None:
+            raise FileNotFoundError(file_path)
         
         # Read the PDF file as binary using run_in_executor to avoid blocking
-        pdf_binary = await run_in_executor(lambda: open(file_path, "rb").read())
+        pdf_binary = await run_in_executor(lambda: open(local_path, "rb").read())
  
         # Encode the binary content to Base64
         pdf_base64 = base64.b64encode(pdf_binary).decode("utf-8")
@@ -191,6 +638,214 @@ async def download_file(file_path: str):
     except Exception as e:
         logger.exception(f"Error downloading file: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        # Clean up the downloaded file
-        cleanup_file(file_path)
+
+
+@app.get("/download-cache/stats")
+async def download_cache_stats():
+    """
+    Report hit ratio and size of the local resume download cache.
+
+    :return: JSON response with the cache counters
+    """
+    return JSONResponse(content=resume_cache.stats())
+
+
+def require_vector_index():
+    """Reject similarity requests when the vector index is turned off."""
+    if not VECTOR_INDEX_ENABLED:
+        raise HTTPException(status_code=503, detail="Vector index is disabled")
+
+
+@app.get("/similar/resumes/{unique_id}")
+async def similar_resumes(unique_id: str, k: int = Query(10, ge=1, le=1000)):
+    """
+    Find the stored candidates most similar to a stored resume ("more candidates like this one").
+
+    Args:
+        unique_id (str): Id of the resume to compare against.
+        k (int): Number of results.
+
+    Returns:
+        dict: The most similar resumes with their cosine similarity, most similar first.
+    """
+    require_vector_index()
+    try:
+        matches = await run_in_executor(similar_to_resume, unique_id, k)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Resume is not in the vector index")
+    return {"unique_id": unique_id, "results": matches}
+
+
+@app.post("/similar/job-description/")
+async def similar_to_job_description(job_description: str, k: int = Query(10, ge=1, le=1000)):
+    """
+    Find the stored candidates closest to a job description, without any model call per resume.
+
+    Args:
+        job_description (str): The job description to compare against.
+        k (int): Number of results.
+
+    Returns:
+        dict: The most similar resumes with their cosine similarity, most similar first.
+    """
+    require_vector_index()
+    matches = await run_in_executor(similar_to_text, job_description, k)
+    return {"results": matches}
+
+
+@app.delete("/vector-index/resumes/{unique_id}")
+async def remove_from_vector_index(unique_id: str):
+    """
+    Remove a resume from the similarity search results.
+
+    Args:
+        unique_id (str): Id of the resume to remove.
+
+    Returns:
+        dict: Whether the resume was indexed.
+    """
+    require_vector_index()
+    removed = await run_in_executor(remove_resumes, [unique_id])
+    if not removed:
+        raise HTTPException(status_code=404, detail="Resume is not in the vector index")
+    return {"unique_id": unique_id, "removed": True}
+
+
+@app.get("/vector-index/stats")
+async def vector_index_stats():
+    """
+    Report the size of the vector index.
+
+    :return: JSON response with the number of indexed resumes and the share of deleted rows
+    """
+    require_vector_index()
+    index = await run_in_executor(shared_vector_index)
+    return JSONResponse(content={
+        "resumes": len(index),
+        "rows": index.count,
+        "deleted_ratio": round(index.deleted_ratio(), 4),
+        "partitions": index.partitions,
+        "model": index.model_name,
+        "dim": index.dim,
+    })
+
+
+
+async def spooled_copy(file_path):
+    """
+    Return the local copy of a resume that was uploaded recently and is not in S3 yet.
+
+    :param file_path: Path of the file to download
+    :return: Path of the spooled file, or None when write-behind is off or the file is in S3
+    """
+    if outbox is None:
+        return None
+    return await run_in_executor(outbox.spooled_path, file_path)
+
+
+def serve_local_file(local_path, file_path):
+    """
+    Serve a local copy of a resume; FileResponse handles Range requests itself.
+
+    :param local_path: Path of the local copy
+    :param file_path: Name of the file, used for the Content-Type and the download name
+    :return: FileResponse with the file
+    """
+    return FileResponse(
+        local_path,
+        media_type=guess_content_type(file_path),
+        content_disposition_type="inline",
+        filename=os.path.basename(file_path),
+    )
+
+
+def guess_content_type(file_path, fallback="application/octet-stream"):
+    """
+    Guess the Content-Type of a resume from its file name.
+
+    :param file_path: Name of the file
+    :param fallback: Content-Type used when the extension is unknown
+    :return: Content-Type string
+    """
+    content_type, _ = mimetypes.guess_type(file_path)
+    return content_type or fallback
+
+
+async def stream_file(file_path: str, byte_range: str | None = None):
+    """
+    Stream a file to the client, with support for byte ranges.
+
+    Resumes not uploaded yet are served from the spool, the others through the local disk cache,
+    which a miss fills, so a resume opened again is served from disk. When the cache cannot fetch
+    the file, it is streamed from S3 straight to the client, which also reports missing files.
+
+    :param file_path: Path of the file to download
+    :param byte_range: Optional HTTP Range header value forwarded to S3
+    :return: FileResponse or StreamingResponse with the file body (206 for partial content)
+    """
+    local_path = await spooled_copy(file_path) or await run_in_executor(resume_cache.get, file_path)
+    if local_path is not None:
+        return serve_local_file(local_path, file_path)
+
+    try:
+        # Open the S3 object; only the headers are fetched at this point
+        s3_object = await run_in_executor(get_s3_object, file_path, byte_range=byte_range)
+    except ClientError as e:
+        error_code = e.response.get("Error", {}).get("Code")
+        if error_code in ("NoSuchKey", "404"):
+            logger.warning(f"File not found in S3: {file_path}")
+            raise HTTPException(status_code=404, detail="File not found")
+        if error_code == "InvalidRange":
+            raise HTTPException(status_code=416, detail="Requested range not satisfiable")
+        logger.exception(f"Error streaming file: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    body = s3_object["Body"]
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Length": str(s3_object["ContentLength"]),
+        "Content-Disposition": content_disposition(file_path),
+    }
+    if s3_object.get("ETag"):
+        headers["ETag"] = s3_object["ETag"]
+
+    # S3 reports the served slice when a Range was requested
+    status_code = 200
+    if s3_object.get("ContentRange"):
+        headers["Content-Range"] = s3_object["ContentRange"]
+        status_code = 206
+
+    logger.info(f"Streaming {file_path} from S3", extra=PER_FILE)
+    return StreamingResponse(
+        body.iter_chunks(chunk_size=DOWNLOAD_CHUNK_SIZE),
+        status_code=status_code,
+        media_type=guess_content_type(file_path, s3_object.get("ContentType") or "application/octet-stream"),
+        headers=headers,
+        # Release the S3 connection once the response has been sent
+        background=BackgroundTask(body.close),
+    )
+
+
+async def redirect_to_file(file_path: str):
+    """
+    Redirect the client to a presigned S3 URL so the download bypasses the API server.
+
+    :param file_path: Path of the file to download
+    :return: RedirectResponse pointing at the presigned URL, or the file itself while it is not in S3 yet
+    """
+    # A presigned URL would point at an object that does not exist yet
+    spooled_path = await spooled_copy(file_path)
+    if spooled_path is not None:
+        return serve_local_file(spooled_path, file_path)
+
+    presigned_url = await run_in_executor(
+        generate_presigned_download_url,
+        file_path,
+        expires_in=PRESIGNED_URL_EXPIRY,
+        content_type=guess_content_type(file_path),
+    )
+    if presigned_url is None:
+        raise HTTPException(status_code=500, detail="Could not generate download URL")
+
+    # 303 makes clients follow up with a GET, which is what the presigned URL expects
+    return RedirectResponse(presigned_url, status_code=303)
@@ -0,0 +1,224 @@
+from contextlib import contextmanager
+from bisect import bisect_left
+import threading
+import time
+import os
+
+# Latency buckets in seconds, from fast local parsing up to slow LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+# Values of the `file_type` label; any other extension is counted as OTHER_FILE_TYPE
+FILE_TYPES = frozenset({"pdf", "docx", "doc", "txt", "zip"})
+OTHER_FILE_TYPE = "other"
+
+
+def _format_labels(label_names, label_values, extra=None):
+    pairs = list(zip(label_names, label_values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base class for labelled metrics. Every update takes one short lock, so it is safe to leave on."""
+
+    metric_type = None
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        with self._lock:
+            items = list(self._values.items())
+        for label_values, value in items:
+            lines.append(f"{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    """A value that only goes up, e.g. requests or bytes processed."""
+
+    metric_type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """A value that goes up and down, e.g. in-flight calls. May be computed at scrape time."""
+
+    metric_type = "gauge"
+
+    def __init__(self, name, documentation, label_names=(), collect=None):
+        super().__init__(name, documentation, label_names)
+        # Optional callable returning {label_values_tuple: value}, evaluated on every scrape
+        self._collect = collect
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self):
+        if self._collect is not None:
+            try:
+                values = self._collect()
+            except Exception:
+                values = {}
+            with self._lock:
+                self._values = dict(values)
+        return super().render()
+
+
+class Histogram(_Metric):
+    """Distribution of observed values, e.g. latencies, in cumulative buckets."""
+
+    metric_type = "histogram"
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts plus one overflow slot, sum and count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+        for label_values, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.label_names, label_values, ("le", _format_value(float(bound))))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds every metric and renders them in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# Pipeline stages: parse, s3_upload, s3_download, s3_open, db_connect, db_insert, db_update, llm_<prompt>
+STAGE_LATENCY = REGISTRY.register(Histogram(
+    "resume_stage_latency_seconds", "Latency of each pipeline stage.", ["stage", "file_type", "outcome"]))
+STAGE_IN_FLIGHT = REGISTRY.register(Gauge(
+    "resume_stage_in_flight", "Calls currently running in each pipeline stage.", ["stage"]))
+BYTES_PROCESSED = REGISTRY.register(Counter(
+    "resume_bytes_processed_total", "Bytes read or transferred by each pipeline stage.", ["stage", "file_type"]))
+LLM_REQUESTS = REGISTRY.register(Counter(
+    "llm_requests_total", "LLM requests by model, prompt and outcome.", ["model", "prompt", "outcome"]))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "llm_tokens_total", "LLM tokens used by model, prompt and kind (prompt/completion).", ["model", "prompt", "kind"]))
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "http_requests_total", "HTTP requests by method, route and status code.", ["method", "route", "status"]))
+HTTP_LATENCY = REGISTRY.register(Histogram(
+    "http_request_latency_seconds", "HTTP request latency by method and route.", ["method", "route"]))
+
+
+def register_queue_depth(name, documentation, collect, label_names=()):
+    """
+    Register a gauge computed at scrape time, e.g. the depth of a queue owned by another module.
+
+    Args:
+        name (str): Metric name.
+        documentation (str): Help text.
+        collect (callable): Returns {label_values_tuple: value}.
+        label_names (tuple): Label names of the gauge.
+    """
+    return REGISTRY.register(Gauge(name, documentation, label_names, collect=collect))
+
+
+def file_extension_of(filename):
+    """Return the lower-case extension of a file name, or "unknown" if it has none."""
+    extension = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    return extension or "unknown"
+
+
+def file_type_of(filename):
+    """
+    Return the `file_type` label of a file name: its extension if it is one of FILE_TYPES, else
+    "other". File names come from clients, so the raw extension would let them create any number
+    of series.
+    """
+    extension = file_extension_of(filename)
+    return extension if extension in FILE_TYPES else OTHER_FILE_TYPE
+
+
+@contextmanager
+def stage_timer(stage, file_type=""):
+    """
+    Time a block of work as one call of a pipeline stage.
+
+    The block may set `timer["outcome"] = "error"` for failures reported through a return value
+    rather than an exception.
+
+    Args:
+        stage (str): Name of the stage.
+        file_type (str, optional): File type label, e.g. "pdf".
+    """
+    STAGE_IN_FLIGHT.inc(stage=stage)
+    started = time.perf_counter()
+    timer = {"outcome": None}
+    try:
+        yield timer
+    except BaseException:
+        timer["outcome"] = "error"
+        raise
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - started, stage=stage, file_type=file_type,
+                              outcome=timer["outcome"] or "ok")
+        STAGE_IN_FLIGHT.dec(stage=stage)
@@ -2,10 +2,37 @@ from templates.templates import TEMPLATES
 from model_calling.openai_call import get_conversation_openai
 import asyncio
 from files_reading import utils
-from Logging_folder.logger import logger
+from Logging_folder.logger import logger, PER_FILE, log_context
+from model_calling.scheduler import llm_scheduler, llm_flow
+from request_deadlines.cancellation import (current_token, check_cancelled, RequestCancelled, RESUMES_SKIPPED)
+import contextvars
+import functools
 
-conversation_resume = get_conversation_openai(TEMPLATES["resume"])
-conversation_score = get_conversation_openai(TEMPLATES["score"])
+# Status of each resume in the results
+SCORED = "scored"
+SKIPPED = "skipped"  # Not scored because the request was cancelled or ran out of time
+
+
+@functools.lru_cache(maxsize=None)
+def get_conversation(prompt_name):
+    """
+    Build the model callable for one of the TEMPLATES on first use and reuse it afterwards.
+
+    Args:
+        prompt_name (str): Key of the template in TEMPLATES.
+
+    Returns:
+        function: The callable returned by `get_conversation_openai`.
+    """
+    return get_conversation_openai(TEMPLATES[prompt_name], prompt_name=prompt_name)
+
+def conversation_resume(inputs):
+    """Extract the key aspects of a resume; `inputs` holds the "resume_text"."""
+    return get_conversation("resume")(inputs)
+
+def conversation_score(inputs):
+    """Score key aspects against a job description; `inputs` holds "resume_text" and "job_description"."""
+    return get_conversation("score")(inputs)
 
 async def run_in_executor(func, *args, **kwargs):
     """
@@ -23,7 +50,46 @@ async def run_in_executor(func, *args, **kwargs):
         The result of the function once it completes.
     """
     loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, func, *args, **kwargs)
+    # Run inside a copy of the caller's context so log correlation ids follow the call
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(None, functools.partial(context.run, func, *args, **kwargs))
+
+async def call_model(conversation, inputs, follow_up=False):
+    """
+    Run a model call in the executor once the fair-share scheduler gives it a slot.
+
+    Calls are scheduled with the flow of the current context (see `llm_flow`), so a large batch
+    from one tenant cannot hold every slot while another tenant's small upload waits.
+
+    A call of a cancelled request is not started. A running call cannot be interrupted, as it
+    runs in a thread; when the awaiting task is cancelled, the call keeps its slot until the
+    thread returns, which the request's deadline bounds, so the concurrency limit still holds.
+
+    Args:
+        conversation (callable): The synchronous model callable, e.g. `conversation_score`.
+        inputs (dict): The prompt inputs.
+        follow_up (bool): The call continues a resume whose earlier calls are done; see
+            `FairShareScheduler.slot`.
+
+    Returns:
+        The model output.
+    """
+    check_cancelled()
+    async with llm_scheduler.slot(follow_up=follow_up):
+        check_cancelled()
+        call = asyncio.ensure_future(run_in_executor(conversation, inputs))
+        try:
+            return await asyncio.shield(call)
+        except asyncio.CancelledError:
+            await asyncio.wait({call})
+            if not call.cancelled():
+                # Retrieve the outcome of the abandoned call so it is not reported as unhandled
+                call.exception()
+            raise
+        except Exception:
+            # A call cut short by the request's deadline is a cancellation, not a model error
+            check_cancelled()
+            raise
 
 async def async_key_aspect_extractor(filename, data):
     """
@@ -42,10 +108,11 @@ async def async_key_aspect_extractor(filename, data):
                contains the extracted key aspects, otherwise, it returns None in case of an error.
     """
     try:
-        logger.info(f"Extracting key aspects for: {filename} - START")
-        # Assuming conversation_resume is synchronous
-        result = await run_in_executor(conversation_resume, {"resume_text": data["content"]})
+        logger.info(f"Extracting key aspects for: {filename} - START", extra=PER_FILE)
+        result = await call_model(conversation_resume, {"resume_text": data["content"]})
         return filename, result
+    except RequestCancelled:
+        raise
     except Exception as e:
         logger.exception(f"Error in key aspect extraction for {filename}: {e}")
         return filename, None
@@ -68,18 +135,51 @@ async def async_resume_scorer(filename, key_aspect, job_description):
         be `None`.
     """
     try:
-        logger.info(f"Scoring resume: {filename} - START")
-        # Assuming conversation_score is synchronous
-        result = await run_in_executor(conversation_score, {
+        logger.info(f"Scoring resume: {filename} - START", extra=PER_FILE)
+        result = await call_model(conversation_score, {
             "resume_text": key_aspect,
             "job_description": job_description
-        })
+        }, follow_up=True)
         return filename, result
+    except RequestCancelled:
+        raise
     except Exception as e:
         logger.exception(f"Error in scoring for {filename}: {e}")
         return filename, None
 
-async def process_resumes_async(response_data, job_description):
+async def process_single_resume(filename, data, job_description, keep_content=True):
+    """
+    Extract the key aspects of one resume and score it against the job description.
+
+    Args:
+        filename (str): The name of the resume file being processed.
+        data (dict): The resume data, including its content under the "content" key.
+        job_description (str): The job description used to calculate the resume score.
+        keep_content (bool): Keep the content in `data` after extraction; when False it is
+            released as soon as it is no longer needed.
+
+    Returns:
+        tuple: The filename and `data` updated with the 'key_feature', 'score' and 'status' fields,
+        or with only the 'skipped' status if the request was cancelled first.
+    """
+    with log_context(file_name=filename):
+        try:
+            _, key_aspect = await async_key_aspect_extractor(filename, data)
+            if not keep_content:
+                # The content was stored when the file was parsed
+                data.pop("content", None)
+            _, score = await async_resume_scorer(filename, key_aspect or "", job_description)
+        except RequestCancelled:
+            data['status'] = SKIPPED
+            return filename, data
+
+    data['key_feature'] = utils.clean_text(key_aspect or "")
+    data['score'] = utils.extract_first_two_digit_number(score or "")
+    data['status'] = SCORED
+    return filename, data
+
+async def process_resumes_async(response_data, job_description, on_result=None, keep_content=True,
+                                flow_key=None, tenant=None):
     """
     Asynchronously process resumes to extract key aspects and calculate scores.
 
@@ -87,40 +187,67 @@ async def process_resumes_async(response_data, job_description):
     1. **Key Aspect Extraction**: It extracts key features from each resume's content.
     2. **Scoring**: It calculates a score for each resume based on the extracted key aspects and the provided job description.
 
-    Both operations are performed concurrently using asynchronous tasks to improve efficiency.
+    Each resume runs through both steps in its own task, so a resume is scored as soon as its own key
+    aspects are ready instead of waiting for the extraction of the whole batch.
+
+    When the request is cancelled (see `request_deadlines.cancellation`), the resumes that are not
+    done yet are abandoned: their queued model calls are dropped and they are marked 'skipped'
+    instead of being scored.
 
     Args:
         response_data (dict): A dictionary where keys are filenames and values contain resume data (including the content).
         job_description (str): The job description used to calculate the resume score.
+        on_result (callable, optional): Called as `on_result(filename, data)` as soon as each resume is scored;
+            skipped resumes are not reported. May be a coroutine function, which is awaited.
+        keep_content (bool): Keep each resume's content in the results; when False it is
+            dropped once its key aspects are extracted.
+        flow_key (str, optional): Key the model calls of this batch are fair-share scheduled
+            under, e.g. the tenant id. Defaults to a flow of its own for this batch.
+        tenant (str, optional): Tenant label for the scheduler metrics.
 
     Returns:
         dict: The updated `response_data` dictionary with additional fields:
             - 'key_feature': The extracted key aspects of each resume.
             - 'score': The calculated score for each resume based on the job description.
+            - 'status': 'scored', or 'skipped' if the request was cancelled before it was scored.
     """
-    # Create async tasks for key aspect extraction
-    key_aspect_tasks = [
-        asyncio.create_task(async_key_aspect_extractor(filename, data)) 
-        for filename, data in response_data.items()
-    ]
-    
-    # Wait for all key aspect extraction tasks to complete
-    key_aspects = await asyncio.gather(*key_aspect_tasks, return_exceptions=True)
-    key_aspects_dict = {filename: result for filename, result in key_aspects if result is not None}
-    
-    # Create async tasks for scoring
-    scoring_tasks = [
-        asyncio.create_task(async_resume_scorer(filename, key_aspects_dict.get(filename, ""), job_description)) 
-        for filename in response_data.keys()
-    ]
-    
-    # Wait for all scoring tasks to complete concurrently
-    scores = await asyncio.gather(*scoring_tasks, return_exceptions=True)
-    scores_dict = {filename: result for filename, result in scores if result is not None}
-    
-    # Update response_data with results
-    for filename in response_data.keys():
-        response_data[filename]['key_feature'] = utils.clean_text(key_aspects_dict.get(filename, ""))
-        response_data[filename]['score'] = utils.extract_first_two_digit_number(scores_dict.get(filename, ""))
-    
-    return response_data
\ No newline at end of file
+    # Create one task per resume covering extraction and scoring; the tasks copy the context,
+    # so every model call of the batch is scheduled in the same flow
+    with llm_flow(flow_key or f"batch-{id(response_data)}", len(response_data), tenant):
+        tasks = {
+            asyncio.create_task(process_single_resume(filename, data, job_description, keep_content)): filename
+            for filename, data in response_data.items()
+        }
+
+    token = current_token.get()
+    cancelled = asyncio.ensure_future(token.wait()) if token is not None else None
+    pending = set(tasks)
+    try:
+        # Report each resume as soon as it is done, until every resume is done or the request is cancelled
+        while pending and not (cancelled is not None and cancelled.done()):
+            done, pending = await asyncio.wait(pending | ({cancelled} if cancelled else set()),
+                                               return_when=asyncio.FIRST_COMPLETED)
+            pending.discard(cancelled)
+            for task in done - {cancelled}:
+                filename, data = task.result()
+                if on_result is not None and data.get("status") != SKIPPED:
+                    try:
+                        result = on_result(filename, data)
+                        if asyncio.iscoroutine(result):
+                            await result
+                    except Exception as e:
+                        logger.exception(f"Error handling result for {filename}: {e}")
+    finally:
+        if cancelled is not None:
+            cancelled.cancel()
+        # Give the model capacity back to live requests
+        for task in pending:
+            task.cancel()
+            response_data[tasks[task]]["status"] = SKIPPED
+
+    skipped = sum(1 for data in response_data.values() if data.get("status") == SKIPPED)
+    if skipped:
+        RESUMES_SKIPPED.inc(skipped, reason=token.reason if token is not None else "unknown")
+        logger.warning(f"Skipped {skipped} of {len(response_data)} resumes: request cancelled")
+
+    return response_data
@@ -1,15 +1,27 @@
-from langchain_core.prompts import PromptTemplate
-import openai
-from dotenv import load_dotenv
-import os
+from functools import lru_cache
+from config.settings import get_settings
+from metrics.prometheus import stage_timer, LLM_REQUESTS, LLM_TOKENS
+from request_deadlines.cancellation import current_token
 
-# Load API Key
-load_dotenv()
-API_KEY = os.getenv("OPENAI_API_KEY")
 
-openai.api_key = API_KEY
+@lru_cache(maxsize=None)
+def load_openai():
+    """
+    Import and configure the OpenAI SDK on first use.
 
-def get_conversation_openai(template, model="gpt-4o-mini", temperature=0.1, max_tokens=None):
+    The SDK and langchain make up most of the import time of the app, so they are only loaded
+    once a model is actually called.
+
+    Returns:
+        tuple: The `openai` module and langchain's `PromptTemplate` class.
+    """
+    import openai
+    from langchain_core.prompts import PromptTemplate
+
+    openai.api_key = get_settings().openai_api_key
+    return openai, PromptTemplate
+
+def get_conversation_openai(template, model="gpt-4o-mini", temperature=0.1, max_tokens=None, prompt_name="custom"):
 
     """
     Creates a function to interact with the OpenAI model using a dynamic template.
@@ -19,6 +31,7 @@ def get_conversation_openai(template, model="gpt-4o-mini", temperature=0.1, max_
         model (str, optional): The OpenAI model to use. Defaults to "gpt-4o-mini".
         temperature (float, optional): Controls the randomness of the response. Defaults to 0.1.
         max_tokens (int, optional): Maximum tokens for the response. Defaults to None.
+        prompt_name (str, optional): Name of the prompt used to label metrics. Defaults to "custom".
 
     Returns:
         function: A callable that formats the prompt and generates a response from OpenAI.
@@ -35,15 +48,36 @@ def get_conversation_openai(template, model="gpt-4o-mini", temperature=0.1, max_
         Returns:
             str: The content of the response generated by the OpenAI model.
         """
+        openai, PromptTemplate = load_openai()
         # Generate the prompt by formatting the template with the provided inputs
         prompt = PromptTemplate.from_template(template).format(**inputs)
+
+        # Don't start a call for a cancelled request, and don't let one outlive the request's deadline
+        token = current_token.get()
+        request_timeout = None
+        if token is not None:
+            token.raise_if_cancelled()
+            request_timeout = token.remaining()
+
         # Call the OpenAI Chat API to generate a response
-        response = openai.ChatCompletion.create(
-            model=model,
-            messages=[{"role": "system", "content": prompt}],
-            temperature=temperature,
-            max_tokens=max_tokens
-        )
+        try:
+            with stage_timer(f"llm_{prompt_name}"):
+                response = openai.ChatCompletion.create(
+                    model=model,
+                    messages=[{"role": "system", "content": prompt}],
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    request_timeout=request_timeout
+                )
+        except Exception:
+            LLM_REQUESTS.inc(model=model, prompt=prompt_name, outcome="error")
+            raise
+        LLM_REQUESTS.inc(model=model, prompt=prompt_name, outcome="ok")
+
+        # Record token usage reported by the API
+        usage = response.get("usage") or {}
+        LLM_TOKENS.inc(usage.get("prompt_tokens", 0), model=model, prompt=prompt_name, kind="prompt")
+        LLM_TOKENS.inc(usage.get("completion_tokens", 0), model=model, prompt=prompt_name, kind="completion")
         # Extract and return the content of the response
         return response["choices"][0]["message"]["content"]
     
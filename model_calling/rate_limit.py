@@ -0,0 +1,39 @@
+import asyncio
+import time
+
+
+class AsyncTokenBucket:
+    """
+    Token bucket limiting how many model calls start per second.
+
+    Tokens are added at `rate` per second up to `capacity`; each call takes one, waiting until
+    one is available. Waiters are served in arrival order.
+
+    Args:
+        rate (float): Calls allowed per second on average.
+        capacity (int, optional): Calls allowed in a burst. Defaults to one second's worth.
+    """
+
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        """Wait until a call may start."""
+        # Holding the lock while sleeping keeps waiters in order
+        async with self._lock:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
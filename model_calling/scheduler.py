@@ -0,0 +1,197 @@
+from contextlib import asynccontextmanager, contextmanager
+from metrics.prometheus import REGISTRY, Histogram, Counter, register_queue_depth
+from config.settings import get_settings
+import contextvars
+import itertools
+import asyncio
+import heapq
+import time
+
+# Scheduler settings
+settings = get_settings()
+LLM_MAX_CONCURRENCY = settings.llm_max_concurrency  # Model calls in flight at the same time, across all requests
+LLM_SMALL_BATCH_SIZE = settings.llm_small_batch_size  # Batches up to this many resumes count as interactive
+LLM_INTERACTIVE_WEIGHT = settings.llm_interactive_weight  # Share of an interactive flow relative to a bulk one
+LLM_METRIC_TENANTS = settings.llm_metric_tenants  # Tenants with metric series of their own; the rest count as "other"
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+LLM_QUEUE_WAIT = REGISTRY.register(Histogram(
+    "llm_queue_wait_seconds", "Time model calls wait for the fair-share scheduler, by tenant and priority.",
+    ["tenant", "priority"]))
+LLM_SCHEDULED = REGISTRY.register(Counter(
+    "llm_scheduled_calls_total", "Model calls dispatched by the fair-share scheduler, by tenant and priority.",
+    ["tenant", "priority"]))
+
+# Tenant labels of calls without a tenant, and of tenants not in LLM_METRIC_TENANTS
+DEFAULT_TENANT = "default"
+OTHER_TENANT = "other"
+
+# Flow of the model calls made in the current context; see `llm_flow`
+current_flow = contextvars.ContextVar("llm_flow", default=None)
+
+
+class Flow:
+    """
+    A stream of model calls that is scheduled as one unit.
+
+    Args:
+        key (str): Flows with the same key share one fair share, e.g. the tenant id.
+        tenant (str): Tenant label for metrics; see `tenant_label`.
+        priority (str): INTERACTIVE or BULK.
+    """
+
+    def __init__(self, key, tenant, priority):
+        self.key = key
+        self.tenant = tenant
+        self.priority = priority
+
+    @property
+    def weight(self):
+        return LLM_INTERACTIVE_WEIGHT if self.priority == INTERACTIVE else 1
+
+
+def tenant_label(tenant):
+    """
+    Return the metric label of a tenant.
+
+    Tenant ids come from a client header, so only the tenants listed in LLM_METRIC_TENANTS get
+    series of their own; every other tenant is counted under "other".
+    """
+    if not tenant:
+        return DEFAULT_TENANT
+    return tenant if tenant in LLM_METRIC_TENANTS else OTHER_TENANT
+
+
+@contextmanager
+def llm_flow(key, batch_size, tenant=None):
+    """
+    Schedule the model calls made inside the block as one flow.
+
+    Args:
+        key (str): Scheduling key; the tenant id when known, otherwise the request or job id.
+        batch_size (int): Number of resumes in the batch; small batches get interactive priority.
+        tenant (str, optional): Tenant of the calls, labelled in metrics by `tenant_label`.
+    """
+    priority = INTERACTIVE if batch_size <= LLM_SMALL_BATCH_SIZE else BULK
+    token = current_flow.set(Flow(key, tenant_label(tenant), priority))
+    try:
+        yield
+    finally:
+        current_flow.reset(token)
+
+
+class FairShareScheduler:
+    """
+    Weighted fair queuing of model calls across flows (tenants or requests).
+
+    At most `max_concurrency` calls run at once. When calls have to wait, the next one is chosen
+    by start-time fair queuing: each call gets a virtual finish tag of
+    `max(virtual time, previous finish tag of its flow) + 1 / weight`, and the smallest tag runs
+    first. A flow with many queued calls therefore only gets its share, while a new flow is
+    served almost immediately, and interactive flows get a larger share than bulk ones. When only
+    one flow is active it uses the whole capacity.
+
+    Must be used from a single event loop.
+
+    Args:
+        max_concurrency (int): Model calls in flight at the same time.
+    """
+
+    def __init__(self, max_concurrency=LLM_MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self.active = 0
+        self.virtual_time = 0.0
+        self._queue = []
+        self._sequence = itertools.count()
+        # Per flow key: [last finish tag, calls queued or running]
+        self._flows = {}
+
+    async def _acquire(self, flow, follow_up=False):
+        state = self._flows.setdefault(flow.key, [0.0, 0])
+        if follow_up:
+            # Goes ahead of the flow's own queued calls, but the flow is still charged for it
+            start = self.virtual_time
+            state[0] = max(self.virtual_time, state[0]) + 1.0 / flow.weight
+        else:
+            start = max(self.virtual_time, state[0])
+            state[0] = start + 1.0 / flow.weight
+        finish = start + 1.0 / flow.weight
+        state[1] += 1
+
+        if self.active < self.max_concurrency and not self._queue:
+            self.virtual_time = max(self.virtual_time, start)
+            self.active += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, (finish, next(self._sequence), start, future, flow.key))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was granted just before the cancellation; hand it on
+                self._release(flow.key)
+            raise
+
+    def _forget(self, key):
+        # A flow with no calls left is dropped; when it comes back it starts from the virtual time
+        state = self._flows[key]
+        state[1] -= 1
+        if state[1] == 0:
+            del self._flows[key]
+
+    def _release(self, key):
+        self.active -= 1
+        self._forget(key)
+        while self._queue and self.active < self.max_concurrency:
+            _, _, start, future, queued_key = heapq.heappop(self._queue)
+            if future.cancelled():
+                self._forget(queued_key)
+                continue
+            self.virtual_time = max(self.virtual_time, start)
+            self.active += 1
+            future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, flow=None, follow_up=False):
+        """
+        Wait for this call's turn, then hold a slot for the duration of the block.
+
+        Args:
+            flow (Flow, optional): The flow of the call. Defaults to the flow of the current
+                context, or a flow of its own when there is none.
+            follow_up (bool): The call continues work the flow already started, e.g. scoring a
+                resume whose key aspects are extracted. It runs before the flow's other queued
+                calls, so started resumes finish first and a cancelled request leaves fewer
+                half-processed ones.
+        """
+        flow = flow or current_flow.get() or Flow(f"call-{next(self._sequence)}", DEFAULT_TENANT, INTERACTIVE)
+        queued_at = time.perf_counter()
+        await self._acquire(flow, follow_up)
+        LLM_QUEUE_WAIT.observe(time.perf_counter() - queued_at, tenant=flow.tenant, priority=flow.priority)
+        LLM_SCHEDULED.inc(tenant=flow.tenant, priority=flow.priority)
+        try:
+            yield
+        finally:
+            self._release(flow.key)
+
+    def stats(self):
+        """Return the number of running and waiting calls, for monitoring."""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self.active,
+            "queued": sum(1 for entry in self._queue if not entry[3].cancelled()),
+            "flows": len(self._flows),
+        }
+
+
+# Shared scheduler for the model calls of this process
+llm_scheduler = FairShareScheduler()
+
+register_queue_depth(
+    "llm_scheduler_calls", "Model calls running and waiting in the fair-share scheduler.",
+    lambda: {("active",): llm_scheduler.active, ("queued",): llm_scheduler.stats()["queued"]},
+    label_names=["state"],
+)
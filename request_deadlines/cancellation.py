@@ -0,0 +1,175 @@
+from contextlib import asynccontextmanager
+from metrics.prometheus import REGISTRY, Counter
+from Logging_folder.logger import logger
+from config.settings import get_settings
+import contextvars
+import asyncio
+import time
+
+# Deadline settings
+settings = get_settings()
+REQUEST_DEADLINE_SECONDS = settings.request_deadline_seconds  # Longest a request may run; 0 means no deadline
+
+# Reasons a request is cancelled
+DEADLINE_EXCEEDED = "deadline_exceeded"
+CLIENT_DISCONNECTED = "client_disconnected"
+
+REQUESTS_CANCELLED = REGISTRY.register(Counter(
+    "requests_cancelled_total", "Requests whose remaining work was cancelled, by reason.", ["reason"]))
+RESUMES_SKIPPED = REGISTRY.register(Counter(
+    "resumes_skipped_total", "Resumes left unscored because their request was cancelled, by reason.", ["reason"]))
+
+# Token of the request the current code runs for; copied into tasks and executor threads
+current_token = contextvars.ContextVar("cancellation_token", default=None)
+
+
+class RequestCancelled(Exception):
+    """Raised when work is abandoned because its request was cancelled."""
+
+    def __init__(self, reason):
+        super().__init__(f"Request cancelled: {reason}")
+        self.reason = reason
+
+
+class CancellationToken:
+    """
+    Cancellation state of one request, shared by every stage working for it.
+
+    The token is cancelled when its deadline passes or when `cancel` is called, e.g. because the
+    client disconnected. Async code can wait for it; code in executor threads polls it with
+    `raise_if_cancelled`, which also notices a passed deadline on its own.
+
+    Must be created inside the event loop.
+
+    Args:
+        timeout (float, optional): Seconds until the deadline. None means no deadline.
+    """
+
+    def __init__(self, timeout=None):
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.reason = None
+        self._event = asyncio.Event()
+        self._timer = asyncio.get_running_loop().call_later(timeout, self.cancel, DEADLINE_EXCEEDED) \
+            if timeout else None
+
+    @property
+    def cancelled(self):
+        return self.reason is not None
+
+    def cancel(self, reason):
+        """Cancel the request; only the first reason is kept. Must be called in the event loop."""
+        if self.reason is not None:
+            return
+        self.reason = reason
+        self._event.set()
+        self.close()
+        REQUESTS_CANCELLED.inc(reason=reason)
+        logger.warning(f"Request cancelled: {reason}")
+
+    def remaining(self):
+        """Return the seconds left until the deadline, or None without a deadline."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def raise_if_cancelled(self):
+        """
+        Raise if the request was cancelled or its deadline has passed. Safe to call from any thread.
+
+        Raises:
+            RequestCancelled: If the remaining work should be abandoned.
+        """
+        if self.reason is not None:
+            raise RequestCancelled(self.reason)
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise RequestCancelled(DEADLINE_EXCEEDED)
+
+    async def wait(self):
+        """Wait until the request is cancelled."""
+        await self._event.wait()
+
+    def close(self):
+        """Stop the deadline timer once the request is finished."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+
+def check_cancelled():
+    """Raise `RequestCancelled` if the request the current code runs for was cancelled."""
+    token = current_token.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+async def run_cancellable(awaitable):
+    """
+    Await something, abandoning it as soon as the current request is cancelled.
+
+    Args:
+        awaitable: The coroutine or future to await.
+
+    Returns:
+        The result of `awaitable`.
+
+    Raises:
+        RequestCancelled: If the request was cancelled first; `awaitable` is cancelled too.
+    """
+    token = current_token.get()
+    if token is None:
+        return await awaitable
+    token.raise_if_cancelled()
+
+    task = asyncio.ensure_future(awaitable)
+    cancelled = asyncio.ensure_future(token.wait())
+    try:
+        await asyncio.wait({task, cancelled}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        cancelled.cancel()
+    if task.done():
+        return task.result()
+    task.cancel()
+    raise RequestCancelled(token.reason)
+
+
+async def watch_disconnect(request, token):
+    """
+    Cancel the token when the client of `request` goes away.
+
+    The request body is read before the endpoint runs, so the next ASGI message is the
+    disconnect. It is awaited directly: `request.is_disconnected()` does not see it behind the
+    `@app.middleware("http")` middlewares.
+    """
+    while not token.cancelled:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            token.cancel(CLIENT_DISCONNECTED)
+            return
+
+
+@asynccontextmanager
+async def request_deadline(request, timeout=None):
+    """
+    Give a request a deadline and a cancellation token that fires on client disconnect.
+
+    Everything started inside the block, including tasks and executor calls, sees the token
+    through `current_token`.
+
+    Args:
+        request (Request): The incoming request, watched for disconnects.
+        timeout (float, optional): Seconds the client is willing to wait; capped at
+            REQUEST_DEADLINE_SECONDS.
+
+    Yields:
+        CancellationToken: The token of the request.
+    """
+    limits = [limit for limit in (timeout, REQUEST_DEADLINE_SECONDS) if limit]
+    token = CancellationToken(min(limits) if limits else None)
+    reset = current_token.set(token)
+    watcher = asyncio.create_task(watch_disconnect(request, token))
+    try:
+        yield token
+    finally:
+        watcher.cancel()
+        token.close()
+        current_token.reset(reset)
@@ -0,0 +1,121 @@
+from templates.templates import TEMPLATES
+from model_calling.openai_call import get_conversation_openai
+from model_calling.async_api_call import run_in_executor, call_model, conversation_score
+from model_calling.scheduler import llm_flow
+from model_calling.rate_limit import AsyncTokenBucket
+from Postgres_connect.query_selection import select_key_aspects
+from Postgres_connect.query_insertion import update_resume_scores_batch
+from files_reading.utils import extract_first_two_digit_number
+from Logging_folder.logger import logger, PER_FILE, log_context
+from config.settings import get_settings
+import asyncio
+
+# Re-scoring settings
+settings = get_settings()
+RESCORE_CONCURRENCY = settings.rescore_concurrency  # Score calls in flight at the same time
+RESCORE_RATE_LIMIT = settings.rescore_rate_limit  # Score calls started per second
+RESCORE_WRITE_BATCH_SIZE = settings.rescore_write_batch_size  # Scores written per database transaction
+
+
+async def rescore_resumes(job_description, resumes, on_result=None, concurrency=RESCORE_CONCURRENCY,
+                          rate_limit=RESCORE_RATE_LIMIT, write_batch_size=RESCORE_WRITE_BATCH_SIZE,
+                          flow_key=None, tenant=None):
+    """
+    Score stored key aspects against a job description and write the new scores back.
+
+    Only the score prompt runs for each resume; the key aspects extracted when the resume was
+    uploaded are reused, so re-ranking past applicants costs one model call per resume.
+
+    Args:
+        job_description (str): The new or edited job description.
+        resumes (list[tuple]): Tuples of (unique_id, resume_name, resume_key_aspect).
+        on_result (callable, optional): Called as `on_result(unique_id, data)` as each resume is scored.
+        concurrency (int): Score calls in flight at the same time.
+        rate_limit (float): Score calls started per second.
+        write_batch_size (int): Scores written per database transaction.
+        flow_key (str, optional): Key the model calls are fair-share scheduled under, e.g. the tenant id.
+        tenant (str, optional): Tenant label for the scheduler metrics.
+
+    Returns:
+        dict: Number of resumes scored and failed.
+    """
+    # Extract the key features of the job description once for the whole pool
+    conversation_jd = get_conversation_openai(TEMPLATES["job_description"], prompt_name="job_description")
+    flow_key = flow_key or f"rescore-{id(resumes)}"
+    with llm_flow(flow_key, 1, tenant):
+        processed_jd = await call_model(conversation_jd, {"job_description_text": job_description})
+
+    semaphore = asyncio.Semaphore(concurrency)
+    bucket = AsyncTokenBucket(rate_limit)
+
+    async def score_one(unique_id, resume_name, key_aspect):
+        async with semaphore:
+            await bucket.acquire()
+            with log_context(file_name=resume_name):
+                try:
+                    logger.info(f"Re-scoring resume: {resume_name} - START", extra=PER_FILE)
+                    score = await call_model(conversation_score, {
+                        "resume_text": key_aspect,
+                        "job_description": processed_jd
+                    })
+                except Exception as e:
+                    logger.exception(f"Error re-scoring {resume_name}: {e}")
+                    return unique_id, resume_name, None
+        return unique_id, resume_name, extract_first_two_digit_number(score or "")
+
+    # The score calls share one flow with the other model calls of the tenant
+    with llm_flow(flow_key, len(resumes), tenant):
+        tasks = [asyncio.create_task(score_one(*resume)) for resume in resumes]
+    pending_writes = []
+    counts = {"scored": 0, "failed": 0}
+    try:
+        for task in asyncio.as_completed(tasks):
+            unique_id, resume_name, score = await task
+            if score is None:
+                counts["failed"] += 1
+            else:
+                counts["scored"] += 1
+                pending_writes.append((score, unique_id))
+
+            if on_result is not None:
+                on_result(unique_id, {"resume_name": resume_name, "score": score})
+
+            # Write the scores back in bulk rather than one transaction per resume
+            if len(pending_writes) >= write_batch_size:
+                await run_in_executor(update_resume_scores_batch, pending_writes)
+                pending_writes = []
+
+        if pending_writes:
+            await run_in_executor(update_resume_scores_batch, pending_writes)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    logger.info(f"Re-scored {counts['scored']} resumes ({counts['failed']} failed)")
+    return counts
+
+
+async def run_rescore_job(job, created_from=None, created_to=None, batch_id=None, limit=None, tenant=None):
+    """
+    Select stored resumes and re-score them for a background job, publishing progress on the job.
+
+    Args:
+        job (Job): The job to run; its job description is used for scoring.
+        created_from (datetime, optional): Only resumes stored at or after this time.
+        created_to (datetime, optional): Only resumes stored before this time.
+        batch_id (str, optional): Only resumes stored by this upload request or job.
+        limit (int, optional): Maximum number of resumes.
+        tenant (str, optional): Tenant the model calls are fair-shared by; defaults to the job alone.
+    """
+    try:
+        job.set_running()
+        with log_context(job_id=job.job_id):
+            resumes = await run_in_executor(select_key_aspects, created_from, created_to, batch_id, limit)
+            job.set_total(len(resumes))
+            tenant = tenant[:64] if tenant else None
+            await rescore_resumes(job.job_description, resumes, on_result=job.add_result,
+                                  flow_key=tenant or job.job_id, tenant=tenant)
+        job.set_completed()
+    except Exception as e:
+        logger.exception(f"Re-scoring job {job.job_id} failed: {str(e)}")
+        job.set_failed(str(e))
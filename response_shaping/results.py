@@ -0,0 +1,110 @@
+from starlette.middleware.gzip import GZipMiddleware
+import re
+
+# Fields of each resume in an upload response
+RESULT_FIELDS = ("file_path", "score", "key_feature", "content", "status")
+# Fields kept whatever the projection, so a skipped resume is never mistaken for a scored one
+ALWAYS_KEPT = ("status",)
+
+try:
+    # orjson serialises large result dicts several times faster than the standard library
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+except ImportError:
+    from fastapi.responses import JSONResponse as FastJSONResponse
+
+
+def parse_fields(fields):
+    """
+    Parse a comma separated field projection such as "score,file_path".
+
+    Args:
+        fields (str or None): The requested fields; None or empty means every field.
+
+    Returns:
+        tuple or None: The requested fields, or None for every field.
+
+    Raises:
+        ValueError: If an unknown field is requested.
+    """
+    if not fields:
+        return None
+    requested = tuple(field.strip() for field in fields.split(",") if field.strip())
+    unknown = [field for field in requested if field not in RESULT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(RESULT_FIELDS)}")
+    return requested
+
+
+def project_result(data, fields):
+    """Drop the fields of a resume result that were not requested, in place."""
+    if fields is not None:
+        for key in list(data):
+            if key not in fields and key not in ALWAYS_KEPT:
+                del data[key]
+    return data
+
+
+def fields_to_keep(fields, top_n=None):
+    """
+    Return the fields to keep while results are collected, before `shape_results` runs.
+
+    Ranking needs the score, so it is kept until then even when the projection leaves it out.
+
+    Args:
+        fields (tuple or None): The requested fields; None means every field.
+        top_n (int, optional): The requested top-N ranking.
+
+    Returns:
+        tuple or None: The fields to keep, or None for every field.
+    """
+    if fields is None or top_n is None or "score" in fields:
+        return fields
+    return fields + ("score",)
+
+
+def shape_results(results, fields=None, top_n=None):
+    """
+    Apply a field projection and an optional top-N ranking to per-resume results.
+
+    Args:
+        results (dict): Results keyed by resume name.
+        fields (tuple, optional): Fields to keep; None keeps every field.
+        top_n (int, optional): Keep only the N highest scored resumes, best first.
+
+    Returns:
+        dict: The shaped results, keyed by resume name.
+    """
+    items = results.items()
+    if top_n is not None:
+        # Scores are stored as strings; missing or unparsable scores rank last
+        def score_of(item):
+            score = str(item[1].get("score") or "")
+            return int(score) if score.isdigit() else -1
+        items = sorted(items, key=score_of, reverse=True)[:top_n]
+    return {name: project_result(dict(data), fields) for name, data in items}
+
+
+class SelectiveGZipMiddleware(GZipMiddleware):
+    """
+    GZip middleware that leaves some paths uncompressed.
+
+    Event streams must not be buffered by the compressor, and resume downloads are served
+    with byte ranges, so both are passed through untouched.
+
+    Args:
+        app: The ASGI application.
+        excluded_paths (str): Regular expression matched against the request path.
+        minimum_size (int): Responses smaller than this are not compressed.
+        compresslevel (int): GZip compression level, 1 (fastest) to 9 (smallest).
+    """
+
+    def __init__(self, app, excluded_paths, minimum_size=1024, compresslevel=5):
+        super().__init__(app, minimum_size=minimum_size, compresslevel=compresslevel)
+        self.excluded_paths = re.compile(excluded_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and self.excluded_paths.search(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
@@ -0,0 +1,361 @@
+from config.settings import get_settings
+from Logging_folder.logger import logger
+from functools import lru_cache
+import threading
+import sqlite3
+import json
+import time
+import uuid
+
+# Broker settings
+settings = get_settings()
+TASK_BROKER = settings.task_broker  # "sqlite" (single node, tests) or "postgres" (multi node)
+TASK_BROKER_SQLITE_PATH = settings.task_broker_sqlite_path
+TASK_MAX_ATTEMPTS = settings.task_max_attempts
+
+# Task statuses
+READY = "ready"
+DONE = "done"
+DEAD = "dead"
+
+
+class Task:
+    """A task reserved from a queue. `receipt` identifies this particular reservation."""
+
+    def __init__(self, task_id, queue, job_id, payload, attempts, receipt):
+        self.task_id = task_id
+        self.queue = queue
+        self.job_id = job_id
+        self.payload = payload
+        self.attempts = attempts
+        self.receipt = receipt
+
+    def __repr__(self):
+        return f"Task({self.task_id}, queue={self.queue!r}, attempts={self.attempts})"
+
+
+class Broker:
+    """
+    Interface every task broker implements.
+
+    Delivery is at-least-once: a reserved task becomes visible again once its visibility timeout
+    expires unless it is acknowledged first, so a crashed worker's tasks are picked up by another
+    worker. Handlers must therefore be idempotent. A task reserved `max_attempts` times without
+    being acknowledged is moved to the dead status.
+    """
+
+    def enqueue(self, queue, payload, job_id=None, delay=0, dedupe_key=None):
+        """
+        Add a task to a queue.
+
+        Args:
+            queue (str): Name of the queue.
+            payload (dict): JSON-serialisable task data.
+            job_id (str, optional): Job the task belongs to, used for progress reporting.
+            delay (float): Seconds before the task becomes visible.
+            dedupe_key (str, optional): A task with the same key is only enqueued once.
+        """
+        raise NotImplementedError
+
+    def reserve(self, queue, visibility_timeout):
+        """Reserve the next visible task of a queue for `visibility_timeout` seconds, or return None."""
+        raise NotImplementedError
+
+    def ack(self, task, result=None):
+        """Mark a reserved task as done, optionally recording a JSON-serialisable result."""
+        raise NotImplementedError
+
+    def nack(self, task, delay=0, error=None):
+        """Release a reserved task so it is retried after `delay` seconds."""
+        raise NotImplementedError
+
+    def job_progress(self, job_id):
+        """Return per-queue task counts by status and the recorded results for a job."""
+        raise NotImplementedError
+
+    def queue_depths(self):
+        """Return the number of ready tasks per queue."""
+        raise NotImplementedError
+
+    def purge_done(self, older_than):
+        """Delete finished tasks older than `older_than` seconds."""
+        raise NotImplementedError
+
+
+class SQLiteBroker(Broker):
+    """
+    File-backed broker using SQLite. Works across processes on one machine and in tests;
+    use `PostgresBroker` to spread workers over several nodes.
+    """
+
+    def __init__(self, path=TASK_BROKER_SQLITE_PATH, max_attempts=TASK_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                queue TEXT NOT NULL,
+                job_id TEXT,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'ready',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                visible_at REAL NOT NULL,
+                receipt TEXT,
+                dedupe_key TEXT UNIQUE,
+                result TEXT,
+                last_error TEXT,
+                updated_at REAL NOT NULL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS tasks_ready ON tasks (queue, status, visible_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS tasks_job ON tasks (job_id)")
+
+    def _connection(self):
+        # One connection per thread; SQLite connections must not be shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, queue, payload, job_id=None, delay=0, dedupe_key=None):
+        now = time.time()
+        self._connection().execute(
+            "INSERT OR IGNORE INTO tasks (queue, job_id, payload, visible_at, dedupe_key, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (queue, job_id, json.dumps(payload), now + delay, dedupe_key, now)
+        )
+
+    def reserve(self, queue, visibility_timeout):
+        conn = self._connection()
+        now = time.time()
+        # BEGIN IMMEDIATE takes the write lock up front so two workers never reserve the same task
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            while True:
+                row = conn.execute(
+                    "SELECT id, job_id, payload, attempts FROM tasks "
+                    "WHERE queue = ? AND status = 'ready' AND visible_at <= ? ORDER BY id LIMIT 1",
+                    (queue, now)
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                task_id, job_id, payload, attempts = row
+                if attempts >= self.max_attempts:
+                    logger.error(f"Task {task_id} on {queue} exceeded {self.max_attempts} attempts, moving to dead")
+                    conn.execute("UPDATE tasks SET status = 'dead', updated_at = ? WHERE id = ?", (now, task_id))
+                    continue
+                receipt = str(uuid.uuid4())
+                conn.execute(
+                    "UPDATE tasks SET attempts = attempts + 1, visible_at = ?, receipt = ?, updated_at = ? WHERE id = ?",
+                    (now + visibility_timeout, receipt, now, task_id)
+                )
+                conn.execute("COMMIT")
+                return Task(task_id, queue, job_id, json.loads(payload), attempts + 1, receipt)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def ack(self, task, result=None):
+        cursor = self._connection().execute(
+            "UPDATE tasks SET status = 'done', result = ?, updated_at = ? WHERE id = ? AND receipt = ?",
+            (json.dumps(result) if result is not None else None, time.time(), task.task_id, task.receipt)
+        )
+        if cursor.rowcount == 0:
+            logger.warning(f"Ack for {task} ignored: its reservation expired and it was handed to another worker")
+
+    def nack(self, task, delay=0, error=None):
+        now = time.time()
+        self._connection().execute(
+            "UPDATE tasks SET visible_at = ?, last_error = ?, updated_at = ? WHERE id = ? AND receipt = ?",
+            (now + delay, error, now, task.task_id, task.receipt)
+        )
+
+    def job_progress(self, job_id):
+        conn = self._connection()
+        counts = {}
+        for queue, status, count in conn.execute(
+                "SELECT queue, status, COUNT(*) FROM tasks WHERE job_id = ? GROUP BY queue, status", (job_id,)):
+            counts.setdefault(queue, {})[status] = count
+        results = [
+            json.loads(result) for (result,) in conn.execute(
+                "SELECT result FROM tasks WHERE job_id = ? AND status = 'done' AND result IS NOT NULL ORDER BY id",
+                (job_id,))
+        ]
+        return {"counts": counts, "results": results}
+
+    def queue_depths(self):
+        return dict(self._connection().execute(
+            "SELECT queue, COUNT(*) FROM tasks WHERE status = 'ready' GROUP BY queue"
+        ).fetchall())
+
+    def purge_done(self, older_than):
+        self._connection().execute(
+            "DELETE FROM tasks WHERE status = 'done' AND updated_at < ?", (time.time() - older_than,)
+        )
+
+
+class PostgresBroker(Broker):
+    """
+    Broker backed by the PostgreSQL database the API already uses, so workers on any node can
+    share one queue. Reservations use `FOR UPDATE SKIP LOCKED`, letting many workers poll
+    concurrently without blocking each other.
+    """
+
+    def __init__(self, max_attempts=TASK_MAX_ATTEMPTS):
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        conn = self._connection()
+        with conn.cursor() as cur:
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS task_queue (
+                    id BIGSERIAL PRIMARY KEY,
+                    queue TEXT NOT NULL,
+                    job_id TEXT,
+                    payload JSONB NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'ready',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    visible_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+                    receipt UUID,
+                    dedupe_key TEXT UNIQUE,
+                    result JSONB,
+                    last_error TEXT,
+                    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+                )
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS task_queue_ready ON task_queue (queue, status, visible_at)")
+            cur.execute("CREATE INDEX IF NOT EXISTS task_queue_job ON task_queue (job_id)")
+        conn.commit()
+
+    def _connection(self):
+        # Workers keep one connection per thread instead of reconnecting for every task
+        conn = getattr(self._local, "conn", None)
+        if conn is None or conn.closed:
+            import psycopg2
+            from Postgres_connect.pgadmin_connect import hostname, username, password, database, port_id
+            conn = psycopg2.connect(host=hostname, user=username, password=password, dbname=database, port=port_id)
+            self._local.conn = conn
+        return conn
+
+    def _execute(self, query, params=(), fetch=None):
+        conn = self._connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute(query, params)
+                rows = cur.fetchall() if fetch else None
+            conn.commit()
+            return rows
+        except Exception:
+            self._rollback(conn)
+            raise
+
+    def _rollback(self, conn):
+        """Roll back a failed statement, discarding the connection if it was dropped so the next call reconnects."""
+        try:
+            conn.rollback()
+            if not conn.closed:
+                return
+        except Exception as e:
+            logger.warning(f"Discarding broken task broker connection: {e}")
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self._local.conn = None
+
+    def enqueue(self, queue, payload, job_id=None, delay=0, dedupe_key=None):
+        self._execute(
+            "INSERT INTO task_queue (queue, job_id, payload, visible_at, dedupe_key) "
+            "VALUES (%s, %s, %s, now() + make_interval(secs => %s), %s) ON CONFLICT (dedupe_key) DO NOTHING",
+            (queue, job_id, json.dumps(payload), delay, dedupe_key)
+        )
+
+    def reserve(self, queue, visibility_timeout):
+        # Tasks that already used up their attempts are moved aside first
+        self._execute(
+            "UPDATE task_queue SET status = 'dead', updated_at = now() "
+            "WHERE queue = %s AND status = 'ready' AND visible_at <= now() AND attempts >= %s",
+            (queue, self.max_attempts)
+        )
+        rows = self._execute("""
+            UPDATE task_queue SET attempts = attempts + 1, receipt = %s,
+                   visible_at = now() + make_interval(secs => %s), updated_at = now()
+            WHERE id = (
+                SELECT id FROM task_queue
+                WHERE queue = %s AND status = 'ready' AND visible_at <= now()
+                ORDER BY id LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id, job_id, payload, attempts, receipt
+        """, (str(uuid.uuid4()), visibility_timeout, queue), fetch=True)
+        if not rows:
+            return None
+        task_id, job_id, payload, attempts, receipt = rows[0]
+        return Task(task_id, queue, job_id, payload, attempts, str(receipt))
+
+    def ack(self, task, result=None):
+        rows = self._execute(
+            "UPDATE task_queue SET status = 'done', result = %s, updated_at = now() "
+            "WHERE id = %s AND receipt = %s RETURNING id",
+            (json.dumps(result) if result is not None else None, task.task_id, task.receipt), fetch=True
+        )
+        if not rows:
+            logger.warning(f"Ack for {task} ignored: its reservation expired and it was handed to another worker")
+
+    def nack(self, task, delay=0, error=None):
+        self._execute(
+            "UPDATE task_queue SET visible_at = now() + make_interval(secs => %s), last_error = %s, "
+            "updated_at = now() WHERE id = %s AND receipt = %s",
+            (delay, error, task.task_id, task.receipt)
+        )
+
+    def job_progress(self, job_id):
+        counts = {}
+        for queue, status, count in self._execute(
+                "SELECT queue, status, COUNT(*) FROM task_queue WHERE job_id = %s GROUP BY queue, status",
+                (job_id,), fetch=True):
+            counts.setdefault(queue, {})[status] = count
+        results = [
+            result for (result,) in self._execute(
+                "SELECT result FROM task_queue WHERE job_id = %s AND status = 'done' AND result IS NOT NULL "
+                "ORDER BY id", (job_id,), fetch=True)
+        ]
+        return {"counts": counts, "results": results}
+
+    def queue_depths(self):
+        return dict(self._execute(
+            "SELECT queue, COUNT(*) FROM task_queue WHERE status = 'ready' GROUP BY queue", fetch=True
+        ))
+
+    def purge_done(self, older_than):
+        self._execute(
+            "DELETE FROM task_queue WHERE status = 'done' AND updated_at < now() - make_interval(secs => %s)",
+            (older_than,)
+        )
+
+
+def get_broker(kind=TASK_BROKER):
+    """
+    Create the broker selected by the TASK_BROKER environment variable.
+
+    Args:
+        kind (str): "sqlite" or "postgres".
+
+    Returns:
+        Broker: The broker instance.
+    """
+    if kind == "sqlite":
+        return SQLiteBroker()
+    if kind == "postgres":
+        return PostgresBroker()
+    raise ValueError(f"Unknown task broker: {kind}")
+
+
+@lru_cache(maxsize=1)
+def shared_broker():
+    """Return the broker shared by the API process, created on first use."""
+    return get_broker()
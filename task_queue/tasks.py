@@ -0,0 +1,105 @@
+from templates.templates import TEMPLATES
+from model_calling.openai_call import get_conversation_openai
+from model_calling.async_api_call import conversation_resume, conversation_score
+from aws_s3_connect.connect import download_from_s3
+from Postgres_connect.query_insertion import insert_resume_data_batch, update_resume_data_batch
+from files_reading.utils import read_resume_file, cleanup_file, clean_text, extract_first_two_digit_number
+from Logging_folder.logger import logger, PER_FILE
+from config.settings import get_settings
+
+# Directory where workers download resumes while parsing them
+WORKER_TMP_DIR = get_settings().worker_tmp_dir
+
+# Queue names, one per pipeline stage
+PREPARE_JOB = "prepare_job"
+PARSE = "parse"
+EXTRACT = "extract"
+SCORE = "score"
+
+
+def handle_prepare_job(broker, task):
+    """
+    Extract the key features of the job description once, then fan out one parse task per resume.
+
+    Payload: {"job_description": str, "files": [{"unique_id", "resume_name", "file_path"}]}
+    """
+    conversation_jd = get_conversation_openai(TEMPLATES["job_description"], prompt_name="job_description")
+    processed_jd = conversation_jd({"job_description_text": task.payload["job_description"]})
+
+    for file in task.payload["files"]:
+        broker.enqueue(PARSE, {**file, "job_description": processed_jd},
+                       job_id=task.job_id, dedupe_key=f"{PARSE}:{file['unique_id']}")
+    logger.info(f"Job {task.job_id}: queued {len(task.payload['files'])} resumes for parsing")
+
+
+def handle_parse(broker, task):
+    """
+    Download a resume from S3, extract its text and store it in the database.
+
+    Payload: {"unique_id", "resume_name", "file_path", "job_description"}
+    """
+    payload = task.payload
+    local_path = download_from_s3(payload["file_path"], local_dir=WORKER_TMP_DIR)
+    if local_path is None:
+        raise RuntimeError(f"Could not download {payload['file_path']} from S3")
+
+    try:
+        logger.info(f"Reading file: {payload['resume_name']}", extra=PER_FILE)
+        resume_content = read_resume_file(local_path)
+    finally:
+        cleanup_file(local_path)
+
+    if resume_content is None:
+        return {"resume_name": payload["resume_name"], "file_path": payload["file_path"], "status": "unsupported"}
+
+    insert_resume_data_batch([(payload["unique_id"], payload["resume_name"], resume_content, task.job_id)])
+    broker.enqueue(EXTRACT, {**payload, "content": resume_content},
+                   job_id=task.job_id, dedupe_key=f"{EXTRACT}:{payload['unique_id']}")
+
+
+def handle_extract(broker, task):
+    """
+    Extract the key aspects of a parsed resume.
+
+    Payload: {"unique_id", "resume_name", "file_path", "job_description", "content"}
+    """
+    payload = dict(task.payload)
+    logger.info(f"Extracting key aspects for: {payload['resume_name']} - START", extra=PER_FILE)
+    key_aspect = conversation_resume({"resume_text": payload.pop("content")})
+
+    broker.enqueue(SCORE, {**payload, "key_aspect": key_aspect},
+                   job_id=task.job_id, dedupe_key=f"{SCORE}:{payload['unique_id']}")
+
+
+def handle_score(broker, task):
+    """
+    Score a resume's key aspects against the job description and store the result.
+
+    Payload: {"unique_id", "resume_name", "file_path", "job_description", "key_aspect"}
+    """
+    payload = task.payload
+    logger.info(f"Scoring resume: {payload['resume_name']} - START", extra=PER_FILE)
+    score = conversation_score({
+        "resume_text": payload["key_aspect"],
+        "job_description": payload["job_description"]
+    })
+
+    key_feature = clean_text(payload["key_aspect"] or "")
+    score = extract_first_two_digit_number(score or "")
+    update_resume_data_batch([(key_feature, score, payload["unique_id"])])
+
+    return {
+        "resume_name": payload["resume_name"],
+        "file_path": payload["file_path"],
+        "key_feature": key_feature,
+        "score": score,
+    }
+
+
+# Handler for each queue; a handler's return value is recorded as the task result
+HANDLERS = {
+    PREPARE_JOB: handle_prepare_job,
+    PARSE: handle_parse,
+    EXTRACT: handle_extract,
+    SCORE: handle_score,
+}
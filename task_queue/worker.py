@@ -0,0 +1,153 @@
+from task_queue.broker import get_broker
+from task_queue.tasks import HANDLERS
+from Logging_folder.logger import logger, log_context
+from config.settings import get_settings
+import threading
+import argparse
+import signal
+
+# Worker settings
+settings = get_settings()
+WORKER_CONCURRENCY = settings.worker_concurrency
+WORKER_VISIBILITY_TIMEOUT = settings.worker_visibility_timeout
+WORKER_POLL_INTERVAL = settings.worker_poll_interval
+WORKER_DONE_RETENTION = settings.worker_done_retention
+
+# Retries of broker calls that fail, e.g. "database is locked" or a dropped connection
+BROKER_SETTLE_ATTEMPTS = 5  # Tries to ack or nack a task before leaving it to its visibility timeout
+BROKER_MAX_BACKOFF = 30  # Longest wait in seconds between broker retries
+
+
+def settle(operation, task, stop_event, *args, **kwargs):
+    """
+    Acknowledge or release a task, retrying with backoff while the broker fails.
+
+    If the broker keeps failing, the task is left as it is: it becomes visible again after its
+    visibility timeout and another worker runs it again.
+
+    Args:
+        operation (callable): `broker.ack` or `broker.nack`.
+        task (Task): The reserved task.
+        stop_event (threading.Event): Set when the worker is stopping; ends the retries early.
+        *args, **kwargs: Further arguments of `operation`.
+    """
+    for attempt in range(1, BROKER_SETTLE_ATTEMPTS + 1):
+        try:
+            operation(task, *args, **kwargs)
+            return
+        except Exception as e:
+            logger.warning(f"{operation.__name__} of {task} failed (attempt {attempt}): {e}")
+        if attempt == BROKER_SETTLE_ATTEMPTS or stop_event.wait(min(2 ** attempt, BROKER_MAX_BACKOFF)):
+            break
+    logger.error(f"Gave up on {operation.__name__} of {task}; it is retried after its visibility timeout")
+
+
+def process_task(broker, task, stop_event):
+    """
+    Run the handler for a reserved task and acknowledge it, or release it for a retry on failure.
+
+    Args:
+        broker (Broker): The broker the task was reserved from.
+        task (Task): The reserved task.
+        stop_event (threading.Event): Set when the worker is stopping.
+    """
+    try:
+        with log_context(job_id=task.job_id, file_name=task.payload.get("resume_name")):
+            result = HANDLERS[task.queue](broker, task)
+    except Exception as e:
+        # Exponential backoff capped at five minutes
+        delay = min(2 ** task.attempts, 300)
+        logger.exception(f"{task} failed, retrying in {delay}s: {e}")
+        settle(broker.nack, task, stop_event, delay=delay, error=str(e))
+        return
+    settle(broker.ack, task, stop_event, result)
+
+
+def worker_loop(broker, queues, stop_event, visibility_timeout, poll_interval):
+    """
+    Reserve and process tasks until `stop_event` is set. Later pipeline stages are polled first
+    so resumes already in flight finish before new ones are started.
+
+    Broker errors are logged and retried with backoff, so the thread outlives a locked or
+    unreachable broker.
+    """
+    failures = 0
+    while not stop_event.is_set():
+        task = None
+        try:
+            for queue in queues:
+                task = broker.reserve(queue, visibility_timeout)
+                if task is not None:
+                    break
+        except Exception as e:
+            failures += 1
+            delay = min(2 ** failures, BROKER_MAX_BACKOFF)
+            logger.exception(f"Could not reserve a task, retrying in {delay}s: {e}")
+            stop_event.wait(delay)
+            continue
+        failures = 0
+
+        if task is None:
+            stop_event.wait(poll_interval)
+            continue
+        process_task(broker, task, stop_event)
+
+
+def run_worker(queues, concurrency=WORKER_CONCURRENCY, visibility_timeout=WORKER_VISIBILITY_TIMEOUT,
+               poll_interval=WORKER_POLL_INTERVAL, broker=None):
+    """
+    Start `concurrency` worker threads consuming `queues` and block until SIGINT/SIGTERM.
+
+    Running more worker processes, on this or other nodes, adds capacity linearly; they only
+    share the broker. On shutdown, threads finish their current task; anything reserved but not
+    acknowledged becomes visible again after the visibility timeout.
+
+    Args:
+        queues (list[str]): Queues to consume, in priority order.
+        concurrency (int): Number of worker threads.
+        visibility_timeout (int): Seconds a reserved task stays hidden from other workers.
+        poll_interval (float): Seconds to sleep when all queues are empty.
+        broker (Broker, optional): Broker to use; defaults to the one configured by TASK_BROKER.
+    """
+    broker = broker or get_broker()
+    stop_event = threading.Event()
+
+    def request_stop(signum, frame):
+        logger.info(f"Worker received signal {signum}, finishing current tasks")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, request_stop)
+    signal.signal(signal.SIGTERM, request_stop)
+
+    threads = [
+        threading.Thread(target=worker_loop, name=f"worker-{index}",
+                         args=(broker, queues, stop_event, visibility_timeout, poll_interval))
+        for index in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    logger.info(f"Worker started with {concurrency} threads on queues {queues}")
+
+    # Periodically drop finished tasks so the queue table does not grow without bound
+    while not stop_event.wait(60):
+        try:
+            broker.purge_done(WORKER_DONE_RETENTION)
+        except Exception as e:
+            logger.exception(f"Error purging finished tasks: {e}")
+
+    for thread in threads:
+        thread.join()
+    logger.info("Worker stopped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Consume resume pipeline tasks from the task queue.")
+    parser.add_argument("--queues", default="score,extract,parse,prepare_job",
+                        help="Comma separated queues to consume, highest priority first.")
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY,
+                        help="Number of worker threads.")
+    parser.add_argument("--visibility-timeout", type=int, default=WORKER_VISIBILITY_TIMEOUT,
+                        help="Seconds a reserved task stays hidden before another worker may retry it.")
+    args = parser.parse_args()
+
+    run_worker(args.queues.split(","), concurrency=args.concurrency, visibility_timeout=args.visibility_timeout)
@@ -0,0 +1,52 @@
+from Postgres_connect.query_selection import iter_key_aspects
+from vector_index.search import shared_vector_index, index_resumes, compact_vector_index
+from Logging_folder.logger import logger
+import argparse
+import time
+
+
+def sync_vector_index(batch_size=1000, reindex=False, partitions=None):
+    """
+    Add the stored resumes that are missing from the vector index, e.g. resumes stored before
+    the index existed, by the queue workers or with write-behind disabled.
+
+    Args:
+        batch_size (int): Resumes read from the database and embedded per batch.
+        reindex (bool): Embed every resume again, e.g. after the key aspects were regenerated.
+        partitions (int, optional): Partition the index afterwards into this many partitions so
+            queries scan only part of it; 0 picks the square root of the number of resumes.
+            Partitioning compacts the index; otherwise it is compacted if enough rows are deleted.
+
+    Returns:
+        int: Number of resumes indexed.
+    """
+    index = shared_vector_index()
+    started = time.perf_counter()
+    seen = indexed = 0
+    for rows in iter_key_aspects(batch_size):
+        seen += len(rows)
+        if not reindex:
+            rows = [row for row in rows if row[0] not in index]
+        indexed += index_resumes(rows)
+        logger.info(f"Vector index sync: {seen} resumes read, {indexed} indexed")
+
+    logger.info(f"Vector index sync done in {time.perf_counter() - started:.1f}s: {indexed} resumes indexed, "
+                f"{len(index)} in the index")
+
+    if partitions is not None:
+        started = time.perf_counter()
+        index.partition(partitions or None)
+        logger.info(f"Vector index split into {index.partitions} partitions in {time.perf_counter() - started:.1f}s")
+    elif compact_vector_index():
+        logger.info(f"Vector index compacted to {index.count} rows")
+    return indexed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add stored resumes that are missing from the vector index.")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Resumes embedded per batch.")
+    parser.add_argument("--reindex", action="store_true", help="Embed every stored resume again.")
+    parser.add_argument("--partitions", type=int, default=None,
+                        help="Partition the index afterwards for fast approximate queries; 0 picks a size.")
+    args = parser.parse_args()
+    sync_vector_index(args.batch_size, args.reindex, args.partitions)
@@ -0,0 +1,618 @@
+from contextlib import contextmanager
+import numpy as np
+import threading
+import sqlite3
+import glob
+import time
+import os
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+# Rows scored per matrix product while searching, bounding the temporary memory of a query
+SEARCH_CHUNK_ROWS = 65536
+# Rows added to the matrix file whenever it is full
+MIN_GROWTH_ROWS = 1024
+# Rows assigned to partitions per matrix product while partitioning
+ASSIGN_CHUNK_ROWS = 16384
+# Rows sampled per partition to train the partition centroids
+TRAINING_ROWS_PER_PARTITION = 50
+# Partition of rows added before the index was partitioned; they are scanned by every query
+UNASSIGNED = -1
+# Lock files in the index directory, shared by every process that opens the index
+WRITE_LOCK_FILE = "write.lock"  # Held while the ids, the matrix size or the generation change
+COMPACTION_LOCK_FILE = "compaction.lock"  # Held for a whole compaction or partitioning
+# Seconds between attempts to take a lock file where the OS has no blocking lock (Windows)
+LOCK_RETRY_INTERVAL = 0.05
+
+
+def _lock_file(f, blocking):
+    """
+    Take an exclusive lock on an open lock file, with flock on POSIX and msvcrt on Windows.
+
+    Returns:
+        bool: False if `blocking` is False and another holder has the lock.
+    """
+    if fcntl is not None:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+        return True
+    # msvcrt only waits about ten seconds for a lock, so poll instead
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            if not blocking:
+                return False
+            time.sleep(LOCK_RETRY_INTERVAL)
+
+
+def _unlock_file(f):
+    if fcntl is None:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    # flock is released when the file is closed
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _nearest_centroids(vectors, centroids):
+    """Return the index of the most similar centroid for every vector."""
+    nearest = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), ASSIGN_CHUNK_ROWS):
+        chunk = np.asarray(vectors[start:start + ASSIGN_CHUNK_ROWS], dtype=np.float32)
+        nearest[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return nearest
+
+
+def train_centroids(sample, partitions, iterations=10, seed=0):
+    """
+    Cluster unit-length vectors with spherical k-means.
+
+    Args:
+        sample (numpy.ndarray): Training vectors, shape (n, dim).
+        partitions (int): Number of clusters.
+        iterations (int): Refinement rounds.
+        seed (int): Seed of the initial centroid choice.
+
+    Returns:
+        numpy.ndarray: Unit-length centroids, shape (partitions, dim).
+    """
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), partitions, replace=False)].copy()
+    for _ in range(iterations):
+        nearest = _nearest_centroids(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, nearest, sample)
+        # A centroid that lost all of its vectors keeps its place
+        filled = np.bincount(nearest, minlength=partitions) > 0
+        centroids[filled] = _normalize(sums[filled])
+    return centroids.astype(np.float32)
+
+
+class VectorIndex:
+    """
+    Persistent nearest-neighbour index of unit-length float32 embeddings.
+
+    The embeddings live in a memory-mapped float32 matrix file, one row per resume, so a pool of
+    500k resumes with 384-dimensional embeddings takes about 730 MB on disk and is paged in by
+    the operating system rather than loaded up front. The resume id of every row and a deleted
+    flag are kept in a small SQLite database next to it.
+
+    Inserts append rows; re-inserting an id tombstones its previous row. Deletes only set the
+    tombstone, and `compact` rewrites the matrix without deleted rows into a new generation of
+    the file, switched over in one SQLite transaction so a crash never leaves ids and vectors
+    out of step.
+
+    An unpartitioned index answers a query exactly with one matrix-vector product over the live
+    rows, which reads the whole matrix: around 100 ms for 500k rows on a single core. Once
+    `partition` has clustered the rows (inverted file index), a query only scores the rows of the
+    `nprobe` partitions whose centroids are closest to it, a few percent of the matrix, and
+    returns in milliseconds at the cost of occasionally missing a neighbour in another partition.
+    New rows are assigned to their nearest partition as they are inserted.
+
+    Several processes (uvicorn workers, the queue workers, the build CLI) may open the same index.
+    Writers hold a lock file and first catch up with the writes of the other processes from
+    SQLite, where every write bumps a version; readers catch up before each query. Searches run
+    concurrently on a snapshot of the rows and are not held up by a running compaction, which
+    copies the matrix without the lock and only takes it to switch over.
+
+    Args:
+        directory (str): Directory holding the index files; created if missing.
+        dim (int): Dimension of the embeddings.
+        model_name (str): Name of the embedding model; an index built by another model is refused.
+
+    Raises:
+        ValueError: If the index in `directory` was built with another model or dimension.
+    """
+
+    def __init__(self, directory, dim, model_name):
+        self.directory = directory
+        self.dim = dim
+        self.model_name = model_name
+        self._lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(directory, "ids.sqlite3"), check_same_thread=False,
+                                     isolation_level=None)
+        with self._file_lock(WRITE_LOCK_FILE):
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=FULL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    row INTEGER PRIMARY KEY,
+                    unique_id TEXT NOT NULL,
+                    resume_name TEXT,
+                    deleted INTEGER NOT NULL DEFAULT 0,
+                    partition INTEGER NOT NULL DEFAULT -1,
+                    changed INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            # Indexes created before writes were versioned lack the column
+            columns = [column[1] for column in self._conn.execute("PRAGMA table_info(entries)")]
+            if "changed" not in columns:
+                self._conn.execute("ALTER TABLE entries ADD COLUMN changed INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS centroids (partition INTEGER PRIMARY KEY, vector BLOB)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_unique_id ON entries (unique_id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS entries_changed ON entries (changed)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+            meta = dict(self._conn.execute("SELECT key, value FROM meta").fetchall())
+            if not meta:
+                self._set_meta({"model_name": model_name, "dim": str(dim), "generation": "0", "version": "0"})
+            elif meta["model_name"] != model_name or int(meta["dim"]) != dim:
+                raise ValueError(f"Vector index in {directory} was built with {meta['model_name']} "
+                                 f"({meta['dim']} dimensions); rebuild it for {model_name}")
+            self._load()
+            self._remove_old_generations()
+
+    @contextmanager
+    def _file_lock(self, name, blocking=True):
+        """
+        Hold an exclusive lock on a lock file of the index, shared by all threads and processes.
+        Each call opens the file anew, so two threads of one process exclude each other too.
+
+        Yields:
+            bool: False if `blocking` is False and the lock is taken.
+        """
+        with open(os.path.join(self.directory, name), "a+") as f:
+            if not _lock_file(f, blocking):
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                _unlock_file(f)
+
+    def _set_meta(self, values):
+        self._conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", list(values.items()))
+
+    def _read_meta(self):
+        return dict(self._conn.execute("SELECT key, value FROM meta").fetchall())
+
+    def _vectors_path(self, generation):
+        return os.path.join(self.directory, f"vectors-{generation}.f32")
+
+    def _remove_old_generations(self, newer=False):
+        """
+        Delete the matrix files of earlier generations. A process still mapping one keeps reading
+        it until it catches up, as the file only goes away once it is unmapped.
+
+        Args:
+            newer (bool): Also delete newer files, left by a compaction that crashed before
+                switching over. Only safe while holding the compaction lock.
+        """
+        for path in glob.glob(os.path.join(self.directory, "vectors-*.f32")):
+            generation = int(os.path.basename(path)[len("vectors-"):-len(".f32")])
+            if generation < self.generation or (newer and generation > self.generation):
+                try:
+                    os.remove(path)
+                except PermissionError:
+                    # Windows refuses while the file is mapped; a later compaction removes it
+                    pass
+
+    def _load(self):
+        meta = self._read_meta()
+        self.generation = int(meta["generation"])
+        self.version = int(meta.get("version", 0))
+        rows = self._conn.execute(
+            "SELECT row, unique_id, resume_name, deleted, partition FROM entries ORDER BY row"
+        ).fetchall()
+        self.count = rows[-1][0] + 1 if rows else 0
+        self._ids = [None] * self.count
+        self._names = [None] * self.count
+        self._row_of = {}
+        self._alive = np.zeros(max(self.count, MIN_GROWTH_ROWS), dtype=bool)
+        self._partition_of = np.full(len(self._alive), UNASSIGNED, dtype=np.int32)
+        for row, unique_id, resume_name, deleted, partition in rows:
+            self._ids[row] = unique_id
+            self._names[row] = resume_name
+            self._partition_of[row] = partition
+            if not deleted:
+                self._alive[row] = True
+                self._row_of[unique_id] = row
+        self._load_centroids()
+
+        # Appending creates the file of a new index without truncating an existing one
+        open(self._vectors_path(self.generation), "ab").close()
+        self._vectors = None
+        self._capacity = 0
+        self._ensure_capacity(self.count)
+
+    def _load_centroids(self):
+        centroids = self._conn.execute("SELECT vector FROM centroids ORDER BY partition").fetchall()
+        self._centroids = (np.vstack([np.frombuffer(vector, dtype=np.float32) for vector, in centroids])
+                           if centroids else None)
+
+    def _refresh(self):
+        """
+        Catch up with the writes other processes committed since this one last read the index.
+        Call it holding the write lock and `_lock`.
+        """
+        meta = self._read_meta()
+        if int(meta["generation"]) != self.generation:
+            # Compacted elsewhere: every row moved
+            self._load()
+            return
+        version = int(meta.get("version", 0))
+        if version == self.version:
+            return
+
+        rows = self._conn.execute(
+            "SELECT row, unique_id, resume_name, deleted, partition FROM entries WHERE changed > ? ORDER BY row",
+            (self.version,)
+        ).fetchall()
+        if rows and rows[-1][0] >= self.count:
+            count = rows[-1][0] + 1
+            # The other process grew the file already
+            self._ensure_capacity(count)
+            self._ids.extend([None] * (count - self.count))
+            self._names.extend([None] * (count - self.count))
+            self.count = count
+        # In row order, a re-inserted id is tombstoned before its new row is seen
+        for row, unique_id, resume_name, deleted, partition in rows:
+            self._ids[row] = unique_id
+            self._names[row] = resume_name
+            self._partition_of[row] = partition
+            self._alive[row] = not deleted
+            if not deleted:
+                self._row_of[unique_id] = row
+            elif self._row_of.get(unique_id) == row:
+                del self._row_of[unique_id]
+        if int(meta.get("centroids_version", 0)) > self.version:
+            self._load_centroids()
+        self.version = version
+
+    def _sync(self):
+        """Catch up with the writes of other processes, if there are any."""
+        with self._lock:
+            meta = self._read_meta()
+            current = (int(meta["generation"]) == self.generation and
+                       int(meta.get("version", 0)) == self.version)
+        if not current:
+            with self._file_lock(WRITE_LOCK_FILE), self._lock:
+                self._refresh()
+
+    def _ensure_capacity(self, rows):
+        if self._vectors is not None and rows <= self._capacity:
+            return
+        path = self._vectors_path(self.generation)
+        # Another process may have grown the file already
+        self._capacity = os.path.getsize(path) // (4 * self.dim)
+        capacity = max(self._capacity, MIN_GROWTH_ROWS)
+        while capacity < rows:
+            capacity *= 2
+        if capacity > self._capacity:
+            # Searches holding the previous mapping keep reading the rows it covers
+            with open(path, "r+b") as f:
+                f.truncate(capacity * self.dim * 4)
+            self._capacity = capacity
+        self._vectors = np.memmap(path, dtype=np.float32, mode="r+", shape=(self._capacity, self.dim))
+        if len(self._alive) < self._capacity:
+            alive = np.zeros(self._capacity, dtype=bool)
+            alive[:len(self._alive)] = self._alive
+            self._alive = alive
+            partition_of = np.full(self._capacity, UNASSIGNED, dtype=np.int32)
+            partition_of[:len(self._partition_of)] = self._partition_of
+            self._partition_of = partition_of
+
+    def __len__(self):
+        self._sync()
+        return len(self._row_of)
+
+    def __contains__(self, unique_id):
+        self._sync()
+        return unique_id in self._row_of
+
+    def upsert(self, unique_ids, resume_names, vectors):
+        """
+        Add embeddings, replacing the previous embedding of any id that is already indexed.
+
+        Args:
+            unique_ids (list[str]): Resume ids.
+            resume_names (list[str]): Original resume file names, returned with search results.
+            vectors (numpy.ndarray): Unit-length embeddings, shape (len(unique_ids), dim).
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(unique_ids), self.dim)
+        # An id repeated within the batch keeps its last embedding
+        last = {unique_id: position for position, unique_id in enumerate(unique_ids)}
+        if len(last) < len(unique_ids):
+            positions = sorted(last.values())
+            unique_ids = [unique_ids[p] for p in positions]
+            resume_names = [resume_names[p] for p in positions]
+            vectors = vectors[positions]
+        if not len(unique_ids):
+            return
+        with self._file_lock(WRITE_LOCK_FILE), self._lock:
+            # Rows appended by other processes move the end of the matrix
+            self._refresh()
+            start = self.count
+            self._ensure_capacity(start + len(unique_ids))
+            # Vectors are on disk before their ids are committed, so a crash never exposes a missing row
+            self._vectors[start:start + len(unique_ids)] = vectors
+            self._vectors.flush()
+
+            if self._centroids is not None:
+                partitions = _nearest_centroids(vectors, self._centroids)
+            else:
+                partitions = np.full(len(unique_ids), UNASSIGNED, dtype=np.int32)
+
+            replaced = [self._row_of[unique_id] for unique_id in unique_ids if unique_id in self._row_of]
+            rows = list(range(start, start + len(unique_ids)))
+            version = self.version + 1
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.executemany("UPDATE entries SET deleted = 1, changed = ? WHERE row = ?",
+                                       [(version, row) for row in replaced])
+                self._conn.executemany(
+                    "INSERT INTO entries (row, unique_id, resume_name, partition, changed) VALUES (?, ?, ?, ?, ?)",
+                    [(row, unique_id, resume_name, partition, version) for row, unique_id, resume_name, partition
+                     in zip(rows, unique_ids, resume_names, partitions.tolist())]
+                )
+                self._set_meta({"version": str(version)})
+
+            self._alive[replaced] = False
+            self._partition_of[start:start + len(unique_ids)] = partitions
+            for row, unique_id, resume_name in zip(rows, unique_ids, resume_names):
+                self._ids.append(unique_id)
+                self._names.append(resume_name)
+                self._row_of[unique_id] = row
+                self._alive[row] = True
+            self.count = start + len(unique_ids)
+            self.version = version
+
+    def delete(self, unique_ids):
+        """
+        Remove ids from the index. Unknown ids are ignored.
+
+        Returns:
+            int: Number of ids removed.
+        """
+        with self._file_lock(WRITE_LOCK_FILE), self._lock:
+            self._refresh()
+            rows = [self._row_of.pop(unique_id) for unique_id in unique_ids if unique_id in self._row_of]
+            if rows:
+                version = self.version + 1
+                with self._conn:
+                    self._conn.execute("BEGIN")
+                    self._conn.executemany("UPDATE entries SET deleted = 1, changed = ? WHERE row = ?",
+                                           [(version, row) for row in rows])
+                    self._set_meta({"version": str(version)})
+                self._alive[rows] = False
+                self.version = version
+            return len(rows)
+
+    def deleted_ratio(self):
+        """Return the share of rows in the matrix that are tombstones."""
+        self._sync()
+        return 1 - len(self._row_of) / self.count if self.count else 0.0
+
+    def compact(self):
+        """
+        Rewrite the matrix without deleted rows, as a new generation of the file.
+
+        The rows of each partition are written next to each other, so a partitioned query reads
+        a few contiguous runs of the file instead of rows scattered across it.
+
+        Blocking, for about as long as it takes to copy the matrix, but searches and writes carry
+        on meanwhile: rows below the end of the matrix never change within a generation, so the
+        live rows are copied without holding the locks. Rows deleted during the copy are dropped
+        and rows added during it appended when switching over, under the locks.
+
+        Returns:
+            bool: False if another thread or process is compacting or partitioning the index.
+        """
+        with self._file_lock(COMPACTION_LOCK_FILE, blocking=False) as acquired:
+            if not acquired:
+                return False
+            self._compact()
+            return True
+
+    def _compact(self):
+        # Snapshot of the live rows to copy; call it holding the compaction lock
+        with self._file_lock(WRITE_LOCK_FILE), self._lock:
+            self._refresh()
+            self._remove_old_generations(newer=True)
+            generation, count, vectors = self.generation, self.count, self._vectors
+            live_rows = np.flatnonzero(self._alive[:count])
+            live_rows = live_rows[np.argsort(self._partition_of[live_rows], kind="stable")]
+
+        path = self._vectors_path(generation + 1)
+        capacity = max(len(live_rows), MIN_GROWTH_ROWS)
+        compacted = np.memmap(path, dtype=np.float32, mode="w+", shape=(capacity, self.dim))
+        for start in range(0, len(live_rows), SEARCH_CHUNK_ROWS):
+            chunk = live_rows[start:start + SEARCH_CHUNK_ROWS]
+            compacted[start:start + len(chunk)] = vectors[chunk]
+        compacted.flush()
+        del compacted
+
+        with self._file_lock(WRITE_LOCK_FILE), self._lock:
+            self._refresh()
+            # Rows deleted during the copy leave a gap; rows added during it go after the copied ones
+            still_alive = self._alive[live_rows]
+            added_rows = count + np.flatnonzero(self._alive[count:self.count])
+            if len(added_rows):
+                total = len(live_rows) + len(added_rows)
+                if total > capacity:
+                    with open(path, "r+b") as f:
+                        f.truncate(total * self.dim * 4)
+                    capacity = total
+                compacted = np.memmap(path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+                compacted[len(live_rows):total] = self._vectors[added_rows]
+                compacted.flush()
+                del compacted
+
+            old_rows = np.concatenate((live_rows[still_alive], added_rows))
+            new_rows = np.concatenate((np.flatnonzero(still_alive), len(live_rows) + np.arange(len(added_rows))))
+            version = self.version + 1
+            entries = [(new_row, self._ids[row], self._names[row], int(self._partition_of[row]), version)
+                       for new_row, row in zip(new_rows.tolist(), old_rows.tolist())]
+            with self._conn:
+                self._conn.execute("BEGIN")
+                self._conn.execute("DELETE FROM entries")
+                self._conn.executemany(
+                    "INSERT INTO entries (row, unique_id, resume_name, partition, changed) VALUES (?, ?, ?, ?, ?)",
+                    entries
+                )
+                self._set_meta({"generation": str(generation + 1), "version": str(version)})
+
+            self._load()
+            self._remove_old_generations()
+
+    @property
+    def partitions(self):
+        """Number of partitions, or 0 when the index is not partitioned."""
+        return 0 if self._centroids is None else len(self._centroids)
+
+    def partition(self, partitions=None, seed=0):
+        """
+        Cluster the rows into partitions so queries only scan the partitions closest to them.
+
+        Runs again from scratch when called on a partitioned index, e.g. after the pool grew a lot,
+        and compacts the index afterwards. Like `compact`, it trains and assigns the rows without
+        holding the locks, waiting for a running compaction first.
+
+        Args:
+            partitions (int, optional): Number of partitions. Defaults to the square root of the
+                number of indexed resumes.
+            seed (int): Seed of the training sample.
+        """
+        with self._file_lock(COMPACTION_LOCK_FILE):
+            with self._file_lock(WRITE_LOCK_FILE), self._lock:
+                self._refresh()
+                count, vectors = self.count, self._vectors
+                live_rows = np.flatnonzero(self._alive[:count])
+            partitions = partitions or int(np.sqrt(len(live_rows)))
+            if partitions < 2 or len(live_rows) < partitions:
+                raise ValueError(f"Cannot split {len(live_rows)} resumes into {partitions} partitions")
+
+            # Train on a sample, then assign every row to its nearest centroid
+            rng = np.random.default_rng(seed)
+            sample_size = min(len(live_rows), partitions * TRAINING_ROWS_PER_PARTITION)
+            sample_rows = np.sort(rng.choice(live_rows, sample_size, replace=False))
+            centroids = train_centroids(np.asarray(vectors[sample_rows]), partitions, seed=seed)
+            assigned = _nearest_centroids(vectors[:count], centroids)
+
+            with self._file_lock(WRITE_LOCK_FILE), self._lock:
+                self._refresh()
+                # Rows added while assigning are assigned like any new row
+                assigned = np.concatenate((assigned, _nearest_centroids(self._vectors[count:self.count], centroids)))
+                version = self.version + 1
+                with self._conn:
+                    self._conn.execute("BEGIN")
+                    self._conn.execute("DELETE FROM centroids")
+                    self._conn.executemany("INSERT INTO centroids (partition, vector) VALUES (?, ?)",
+                                           [(i, centroid.tobytes()) for i, centroid in enumerate(centroids)])
+                    self._conn.executemany(
+                        "UPDATE entries SET partition = ?, changed = ? WHERE row = ?",
+                        [(partition, version, row) for row, partition in enumerate(assigned.tolist())]
+                    )
+                    self._set_meta({"version": str(version), "centroids_version": str(version)})
+
+                self._centroids = centroids
+                self._partition_of[:self.count] = assigned
+                self.version = version
+
+            # Group the rows of each partition together on disk
+            self._compact()
+
+    def vector_of(self, unique_id):
+        """Return the stored embedding of an id, or None if it is not indexed."""
+        self._sync()
+        with self._lock:
+            row = self._row_of.get(unique_id)
+            return None if row is None else np.array(self._vectors[row])
+
+    def search(self, vector, k=10, exclude=(), nprobe=None):
+        """
+        Find the indexed resumes most similar to an embedding.
+
+        Args:
+            vector (numpy.ndarray): Unit-length query embedding.
+            k (int): Number of results.
+            exclude (iterable[str]): Ids to leave out, e.g. the resume the query was taken from.
+            nprobe (int, optional): Partitions scanned when the index is partitioned. None scans
+                every row, which is exact.
+
+        Returns:
+            list[tuple]: Tuples of (unique_id, resume_name, cosine similarity), most similar first.
+        """
+        query = np.asarray(vector, dtype=np.float32).reshape(self.dim)
+        self._sync()
+        # Snapshot of the rows; rows added while searching are simply not considered
+        with self._lock:
+            count, vectors, ids, names = self.count, self._vectors, self._ids, self._names
+            centroids, partition_of = self._centroids, self._partition_of[:count].copy()
+            alive = self._alive[:count].copy()
+            for unique_id in exclude:
+                if unique_id in self._row_of:
+                    alive[self._row_of[unique_id]] = False
+
+        if nprobe is not None and centroids is not None and nprobe < len(centroids):
+            # Only the rows of the closest partitions, plus any rows added before partitioning
+            probed = np.zeros(len(centroids) + 1, dtype=bool)
+            probed[np.argpartition(-(centroids @ query), nprobe - 1)[:nprobe]] = True
+            probed[UNASSIGNED] = True
+            rows = np.flatnonzero(probed[partition_of])
+            # Compaction stores each partition contiguously, so score runs of consecutive rows
+            # with slices; gathering the rows one by one is several times slower
+            breaks = np.flatnonzero(np.diff(rows) != 1) + 1
+            run_starts = rows[np.concatenate(([0], breaks))] if len(rows) else rows
+            run_ends = rows[np.concatenate((breaks - 1, [len(rows) - 1]))] + 1 if len(rows) else rows
+            scores = np.concatenate([vectors[start:end] @ query for start, end in zip(run_starts, run_ends)]
+                                    or [np.empty(0, dtype=np.float32)])
+            keep = alive[rows]
+            candidates, scores = rows[keep], scores[keep]
+        else:
+            candidates = np.flatnonzero(alive)
+            scores = np.empty(count, dtype=np.float32)
+            for start in range(0, count, SEARCH_CHUNK_ROWS):
+                end = min(start + SEARCH_CHUNK_ROWS, count)
+                np.dot(vectors[start:end], query, out=scores[start:end])
+            scores = scores[candidates]
+
+        k = min(k, len(candidates))
+        if k <= 0:
+            return []
+        # Partial selection of the k best, then a sort of those k only
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(ids[candidates[i]], names[candidates[i]], float(scores[i])) for i in top]
+
+    def close(self):
+        """Flush the matrix and close the id database."""
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+            self._conn.close()
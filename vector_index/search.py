@@ -0,0 +1,172 @@
+from Logging_folder.logger import logger
+from metrics.prometheus import stage_timer
+from config.settings import get_settings
+from functools import lru_cache
+import threading
+
+# Vector index settings
+settings = get_settings()
+VECTOR_INDEX_ENABLED = settings.vector_index_enabled
+VECTOR_INDEX_DIR = settings.vector_index_dir
+VECTOR_INDEX_COMPACT_RATIO = settings.vector_index_compact_ratio  # Share of deleted rows that triggers a compaction
+VECTOR_INDEX_NPROBE = settings.vector_index_nprobe  # Partitions scanned per query once the index is partitioned
+EMBEDDING_MODEL = settings.embedding_model
+EMBEDDING_BATCH_SIZE = settings.embedding_batch_size
+
+
+@lru_cache(maxsize=1)
+def load_embedding_model():
+    """
+    Load the sentence embedding model on first use; it runs on the CPU.
+
+    Returns:
+        SentenceTransformer: The embedding model.
+    """
+    # sentence-transformers pulls in torch, so it is only imported when embeddings are needed
+    from sentence_transformers import SentenceTransformer
+    logger.info(f"Loading embedding model {EMBEDDING_MODEL}")
+    return SentenceTransformer(EMBEDDING_MODEL, device="cpu")
+
+
+def embed_texts(texts):
+    """
+    Embed texts as unit-length float32 vectors, so a dot product is their cosine similarity.
+
+    Args:
+        texts (list[str]): The texts to embed.
+
+    Returns:
+        numpy.ndarray: One embedding per text, shape (len(texts), dim).
+    """
+    with stage_timer("embed"):
+        return load_embedding_model().encode(
+            list(texts), batch_size=EMBEDDING_BATCH_SIZE, normalize_embeddings=True, convert_to_numpy=True
+        ).astype("float32")
+
+
+@lru_cache(maxsize=1)
+def shared_vector_index():
+    """Return the vector index of this process, opened on first use."""
+    from vector_index.index import VectorIndex
+    model = load_embedding_model()
+    return VectorIndex(VECTOR_INDEX_DIR, dim=model.get_sentence_embedding_dimension(), model_name=EMBEDDING_MODEL)
+
+
+def index_resumes(resumes):
+    """
+    Embed resumes and add them to the index, replacing earlier embeddings of the same resumes.
+
+    Args:
+        resumes (list[tuple]): Tuples of (unique_id, resume_name, text); the text is normally
+            the key aspects of the resume. Resumes without text are skipped.
+
+    Returns:
+        int: Number of resumes indexed.
+    """
+    resumes = [resume for resume in resumes if resume[2]]
+    if not resumes:
+        return 0
+    unique_ids, resume_names, texts = zip(*resumes)
+    vectors = embed_texts(texts)
+    shared_vector_index().upsert(list(unique_ids), list(resume_names), vectors)
+    return len(resumes)
+
+
+def remove_resumes(unique_ids):
+    """
+    Remove resumes from the index, starting a background compaction once enough rows are deleted.
+
+    Args:
+        unique_ids (list[str]): Ids of the resumes to remove.
+
+    Returns:
+        int: Number of resumes removed.
+    """
+    index = shared_vector_index()
+    removed = index.delete(unique_ids)
+    if removed and index.deleted_ratio() > VECTOR_INDEX_COMPACT_RATIO:
+        start_compaction()
+    return removed
+
+
+def compact_vector_index(min_deleted_ratio=VECTOR_INDEX_COMPACT_RATIO):
+    """
+    Compact the index if more than `min_deleted_ratio` of its rows are deleted. Blocking for as long
+    as the matrix takes to copy, while searches and inserts carry on.
+
+    Returns:
+        bool: Whether the index was compacted; False too if another process is compacting it.
+    """
+    index = shared_vector_index()
+    deleted_ratio = index.deleted_ratio()
+    if deleted_ratio <= min_deleted_ratio:
+        return False
+    logger.info(f"Compacting vector index with {deleted_ratio:.0%} deleted rows")
+    return index.compact()
+
+
+# Background compaction started by `start_compaction`
+_compaction_thread = None
+
+
+def _run_compaction():
+    try:
+        compact_vector_index()
+    except Exception as e:
+        logger.exception(f"Vector index compaction failed: {e}")
+
+
+def start_compaction():
+    """Compact the index on a background thread, unless this process is compacting it already."""
+    global _compaction_thread
+    if _compaction_thread is not None and _compaction_thread.is_alive():
+        return
+    _compaction_thread = threading.Thread(target=_run_compaction, name="vector-index-compaction", daemon=True)
+    _compaction_thread.start()
+
+
+def similar_to_resume(unique_id, k=10):
+    """
+    Find the stored resumes most similar to a stored resume.
+
+    Args:
+        unique_id (str): Id of the resume to compare against.
+        k (int): Number of results.
+
+    Returns:
+        list[dict]: The most similar resumes, most similar first.
+
+    Raises:
+        KeyError: If the resume is not indexed.
+    """
+    index = shared_vector_index()
+    vector = index.vector_of(unique_id)
+    if vector is None:
+        raise KeyError(unique_id)
+    with stage_timer("vector_search"):
+        matches = index.search(vector, k, exclude=(unique_id,), nprobe=VECTOR_INDEX_NPROBE)
+    return _format_matches(matches)
+
+
+def similar_to_text(text, k=10):
+    """
+    Find the stored resumes most similar to a text, e.g. a job description.
+
+    Args:
+        text (str): The text to compare against.
+        k (int): Number of results.
+
+    Returns:
+        list[dict]: The most similar resumes, most similar first.
+    """
+    vector = embed_texts([text])[0]
+    with stage_timer("vector_search"):
+        matches = shared_vector_index().search(vector, k, nprobe=VECTOR_INDEX_NPROBE)
+    return _format_matches(matches)
+
+
+def _format_matches(matches):
+    return [
+        {"unique_id": unique_id, "resume_name": resume_name, "similarity": round(similarity, 4)}
+        for unique_id, resume_name, similarity in matches
+    ]
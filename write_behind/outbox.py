@@ -0,0 +1,433 @@
+from config.settings import get_settings
+from aws_s3_connect.connect import upload_to_s3, upload_resume_file
+from Postgres_connect.query_insertion import (insert_resume_data, update_resume_data,
+                                              insert_resume_data_batch, update_resume_data_batch)
+from Logging_folder.logger import logger, PER_FILE, job_id_var, request_id_var
+from vector_index.search import VECTOR_INDEX_ENABLED, index_resumes
+from contextlib import contextmanager
+import threading
+import sqlite3
+import shutil
+import json
+import time
+import os
+
+# Write-behind settings
+settings = get_settings()
+WRITE_BEHIND_ENABLED = settings.write_behind_enabled
+OUTBOX_DB_PATH = settings.outbox_db_path
+OUTBOX_SPOOL_DIR = settings.outbox_spool_dir
+OUTBOX_BATCH_SIZE = settings.outbox_batch_size
+OUTBOX_MAX_ATTEMPTS = settings.outbox_max_attempts
+OUTBOX_POLL_INTERVAL = settings.outbox_poll_interval
+OUTBOX_CLAIM_TIMEOUT = settings.outbox_claim_timeout  # Seconds before rows claimed by a crashed flusher are retried
+
+# Kinds of pending writes, in the order they are applied within a batch
+S3_UPLOAD = "s3_upload"
+DB_INSERT = "db_insert"
+DB_UPDATE = "db_update"
+VECTOR_UPSERT = "vector_upsert"
+
+
+class WriteBehindOutbox:
+    """
+    Durable journal of pending S3 uploads, database writes and vector index inserts.
+
+    Writes are recorded in a local SQLite database (and, for uploads, the file is moved into a
+    spool directory) before the request returns. A background thread drains the journal in
+    batches, retrying failed writes with exponential backoff. Because a row is only deleted once
+    its write succeeded, nothing is lost if the process crashes; pending rows are picked up again
+    on the next start.
+
+    Writes that share a key (the resume's unique id) are applied in the order they were recorded,
+    so a score update is never applied before the insert of the same resume.
+
+    Several processes (e.g. uvicorn workers) may share the journal: each flusher claims its rows
+    before applying them, and the claim expires after `claim_timeout` in case the process dies.
+
+    Every commit waits for an fsync, so enqueues block: call them from the executor, and group the
+    writes of one resume with `batch()`.
+    """
+
+    def __init__(self, db_path=OUTBOX_DB_PATH, spool_dir=OUTBOX_SPOOL_DIR, batch_size=OUTBOX_BATCH_SIZE,
+                 max_attempts=OUTBOX_MAX_ATTEMPTS, poll_interval=OUTBOX_POLL_INTERVAL,
+                 claim_timeout=OUTBOX_CLAIM_TIMEOUT):
+        self.db_path = db_path
+        self.spool_dir = spool_dir
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.claim_timeout = claim_timeout
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        # Writes collected by `batch()` in the current thread
+        self._batch = threading.local()
+
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        # WAL keeps enqueues cheap; FULL sync makes every committed row survive a crash
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                created_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS outbox_status_id ON outbox (status, id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS outbox_status_due ON outbox (status, next_attempt_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS outbox_key ON outbox (key)")
+
+    def _enqueue(self, kind, key, payload):
+        """Record a pending write, or collect it when inside `batch()`, and wake the flusher."""
+        entry = (kind, key, json.dumps(payload), time.time())
+        collected = getattr(self._batch, "entries", None)
+        if collected is not None:
+            collected.append(entry)
+            return
+        self._insert([entry])
+
+    def _insert(self, entries):
+        """Record pending writes in a single transaction."""
+        if not entries:
+            return
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO outbox (kind, key, payload, created_at) VALUES (?, ?, ?, ?)", entries
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        self._wakeup.set()
+
+    @contextmanager
+    def batch(self):
+        """
+        Record every write enqueued by this thread inside the block in one commit, i.e. one fsync.
+
+        Nothing is recorded if the block raises.
+        """
+        if getattr(self._batch, "entries", None) is not None:
+            # Already collecting for an enclosing batch
+            yield
+            return
+        self._batch.entries = []
+        try:
+            yield
+            entries = self._batch.entries
+        finally:
+            self._batch.entries = None
+        self._insert(entries)
+
+    def enqueue_s3_upload(self, filename, directory_path):
+        """
+        Move a file into the spool directory and record a pending S3 upload for it.
+
+        Args:
+            filename (str): Name of the file; it is also the S3 object name.
+            directory_path (str): Directory currently containing the file.
+        """
+        spool_path = os.path.join(self.spool_dir, filename)
+        shutil.move(os.path.join(directory_path, filename), spool_path)
+        self._enqueue(S3_UPLOAD, filename, {"spool_path": spool_path})
+
+    def enqueue_db_insert(self, unique_id, resume_name, resume_content, batch_id=None):
+        """Record a pending insert of a newly parsed resume."""
+        self._enqueue(DB_INSERT, unique_id, {
+            "unique_id": unique_id,
+            "resume_name": resume_name,
+            "resume_content": resume_content,
+            "batch_id": batch_id,
+        })
+
+    def enqueue_db_update(self, unique_id, resume_key_aspect, score, resume_name):
+        """Record a pending update of a resume's key aspects and score."""
+        self._enqueue(DB_UPDATE, unique_id, {
+            "unique_id": unique_id,
+            "resume_key_aspect": resume_key_aspect,
+            "score": score,
+            "resume_name": resume_name,
+        })
+
+    def enqueue_vector_upsert(self, unique_id, resume_name, text):
+        """Journal the embedding of a resume's key aspects into the vector index."""
+        self._enqueue(VECTOR_UPSERT, unique_id, {
+            "unique_id": unique_id,
+            "resume_name": resume_name,
+            "text": text,
+        })
+
+    def spooled_path(self, filename):
+        """
+        Return the spooled copy of a file whose S3 upload has not been applied yet.
+
+        Args:
+            filename (str): Name of the file, which is also its S3 object name.
+
+        Returns:
+            str or None: Path of the spooled file, or None if the file is (or should be) in S3 already.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM outbox WHERE key = ? AND kind = ? ORDER BY id DESC LIMIT 1",
+                (filename, S3_UPLOAD)
+            ).fetchone()
+        if row is None:
+            return None
+        spool_path = json.loads(row[0])["spool_path"]
+        # The flusher removes the file right after uploading it, just before deleting the row
+        return spool_path if os.path.exists(spool_path) else None
+
+    def pending_count(self):
+        """Return the number of writes that have not been applied yet."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM outbox WHERE status IN ('pending', 'claimed')"
+            ).fetchone()[0]
+
+    def flush_once(self):
+        """
+        Claim and apply one batch of due writes.
+
+        Returns:
+            int: Number of writes applied successfully.
+        """
+        ready = self._claim()
+        claimed_ids = [(row[0],) for rows in ready.values() for row in rows]
+        if not claimed_ids:
+            return 0
+
+        blocked_keys = set()
+        applied = 0
+        applied += self._apply(ready[S3_UPLOAD], self._upload_batch, blocked_keys)
+        applied += self._apply(ready[DB_INSERT], self._insert_batch, blocked_keys)
+        # Skip updates whose insert failed in this very batch
+        updates = [row for row in ready[DB_UPDATE] if row[1] not in blocked_keys]
+        applied += self._apply(updates, self._update_batch, blocked_keys)
+        # Embeddings are computed here, off the request path, one model batch per outbox batch
+        applied += self._apply(ready[VECTOR_UPSERT], self._index_batch, blocked_keys)
+
+        # Hand back claimed rows that were skipped, so they are not held until the claim expires
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE outbox SET status = 'pending', next_attempt_at = 0 WHERE id = ? AND status = 'claimed'",
+                claimed_ids
+            )
+        return applied
+
+    def _claim(self):
+        """
+        Claim the due writes of one batch, so flushers of other processes skip them.
+
+        A claim lasts `claim_timeout` seconds; claims left by a crashed process are taken over then.
+
+        Returns:
+            dict: The claimed rows per kind, as (id, key, payload, attempts) tuples.
+        """
+        now = time.time()
+        ready = {S3_UPLOAD: [], DB_INSERT: [], DB_UPDATE: [], VECTOR_UPSERT: []}
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Keys with writes in progress elsewhere wait, so their writes stay in order
+                blocked_keys = {key for (key,) in self._conn.execute(
+                    "SELECT DISTINCT key FROM outbox WHERE status = 'claimed' AND next_attempt_at > ?", (now,)
+                )}
+                # Rows backing off hold back the later rows of their key, but do not take up the batch
+                waiting = dict(self._conn.execute(
+                    "SELECT key, MIN(id) FROM outbox WHERE status = 'pending' AND next_attempt_at > ? GROUP BY key",
+                    (now,)
+                ).fetchall())
+                rows = self._conn.execute(
+                    "SELECT id, kind, key, payload, attempts FROM outbox "
+                    "WHERE (status = 'pending' AND next_attempt_at <= ?) "
+                    "OR (status = 'claimed' AND next_attempt_at <= ?) ORDER BY id LIMIT ?",
+                    (now, now, self.batch_size)
+                ).fetchall()
+
+                claimed_ids = []
+                for row_id, kind, key, payload, attempts in rows:
+                    if key in blocked_keys or row_id > waiting.get(key, row_id):
+                        continue
+                    ready[kind].append((row_id, key, json.loads(payload), attempts))
+                    claimed_ids.append((now + self.claim_timeout, row_id))
+
+                # The claim expiry is kept in next_attempt_at
+                self._conn.executemany(
+                    "UPDATE outbox SET status = 'claimed', next_attempt_at = ? WHERE id = ?", claimed_ids
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return ready
+
+    def _apply(self, rows, handler, blocked_keys):
+        """Run a batch handler, falling back to one row at a time to isolate bad rows."""
+        if not rows:
+            return 0
+        try:
+            handler([payload for _, _, payload, _ in rows])
+            self._mark_done(rows)
+            return len(rows)
+        except Exception as e:
+            if len(rows) == 1:
+                self._mark_failed(rows[0], e)
+                blocked_keys.add(rows[0][1])
+                return 0
+            logger.warning(f"Outbox batch of {len(rows)} failed, retrying rows one by one: {e}")
+
+        applied = 0
+        for row in rows:
+            applied += self._apply([row], handler, blocked_keys)
+        return applied
+
+    def _mark_done(self, rows):
+        with self._lock:
+            self._conn.executemany("DELETE FROM outbox WHERE id = ?", [(row[0],) for row in rows])
+
+    def _mark_failed(self, row, error):
+        row_id, key, payload, attempts = row
+        attempts += 1
+        if attempts >= self.max_attempts:
+            logger.error(f"Giving up on outbox write {row_id} for {key} after {attempts} attempts: {error}")
+            status, next_attempt_at = "dead", 0
+        else:
+            # Exponential backoff capped at five minutes
+            logger.warning(f"Outbox write {row_id} for {key} failed (attempt {attempts}): {error}")
+            status, next_attempt_at = "pending", time.time() + min(2 ** attempts, 300)
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                (status, attempts, next_attempt_at, str(error), row_id)
+            )
+
+    def _upload_batch(self, payloads):
+        for payload in payloads:
+            if not upload_to_s3(payload["spool_path"]):
+                raise RuntimeError(f"Upload of {payload['spool_path']} to S3 failed")
+        # Spooled files are only removed once their upload is confirmed
+        for payload in payloads:
+            if os.path.exists(payload["spool_path"]):
+                os.remove(payload["spool_path"])
+
+    def _insert_batch(self, payloads):
+        insert_resume_data_batch([
+            # Entries journaled before batch ids were recorded have none
+            (p["unique_id"], p["resume_name"], p["resume_content"], p.get("batch_id")) for p in payloads
+        ])
+
+    def _update_batch(self, payloads):
+        update_resume_data_batch([
+            (p["resume_key_aspect"], p["score"], p["unique_id"]) for p in payloads
+        ])
+
+    def _index_batch(self, payloads):
+        index_resumes([(p["unique_id"], p["resume_name"], p["text"]) for p in payloads])
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                applied = self.flush_once()
+            except Exception as e:
+                logger.exception(f"Outbox flusher error: {e}")
+                applied = 0
+            # Keep draining while there is work, otherwise sleep until woken or the poll interval passes
+            if applied == 0:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def start(self):
+        """Start the background flusher thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="write-behind-flusher", daemon=True)
+        self._thread.start()
+        logger.info(f"Write-behind flusher started with {self.pending_count()} pending writes")
+
+    def stop(self, timeout=30):
+        """Stop the flusher after one last attempt to drain due writes."""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        try:
+            while self.flush_once():
+                pass
+        except Exception as e:
+            logger.exception(f"Final outbox flush failed: {e}")
+        logger.info(f"Write-behind flusher stopped with {self.pending_count()} pending writes")
+
+
+# Shared outbox used by the API
+outbox = WriteBehindOutbox() if WRITE_BEHIND_ENABLED else None
+
+
+def store_resume(unique_id, resume_name, resume_content, filename, directory_path):
+    """
+    Persist a parsed resume: upload the file to S3 and insert its content into the database.
+
+    With write-behind enabled both writes are journaled in one commit and applied in the background,
+    otherwise they are performed immediately. Blocking either way; run it in the executor.
+
+    Args:
+        unique_id (str): The unique identifier for the resume.
+        resume_name (str): The original name of the resume file.
+        resume_content (str): The text content of the resume.
+        filename (str): Name of the file on disk and in S3.
+        directory_path (str): Directory containing the file.
+    """
+    # Tag the resume with the job or request that stored it, so it can be selected for re-scoring
+    batch_id = job_id_var.get() or request_id_var.get()
+
+    if outbox is not None:
+        with outbox.batch():
+            outbox.enqueue_db_insert(unique_id, resume_name, resume_content, batch_id)
+            outbox.enqueue_s3_upload(filename, directory_path)
+        return
+
+    # Upload the processed resume file to S3
+    upload_resume_file(filename=filename, directory_path=directory_path)
+    logger.info(f"Uploaded {filename} to S3 Bucket", extra=PER_FILE)
+
+    # SQL query to insert data into the database.
+    insert_resume_data(unique_id, resume_name, resume_content, batch_id)
+
+
+def store_resume_scores(unique_id, resume_key_aspect, score, resume_name):
+    """
+    Persist the key aspects and score of a resume, in the background when write-behind is enabled,
+    and add the key aspects to the vector index used for similarity search. Blocking; run it in the executor.
+
+    Embedding loads the model and takes a while, so it only happens in the outbox flusher. Without
+    write-behind the resume is left out of the index until `python -m vector_index.build` adds it.
+
+    Args:
+        unique_id (str): The unique identifier for the resume.
+        resume_key_aspect (str): The key aspect of the resume.
+        score (str): The score of the resume.
+        resume_name (str): The original name of the resume file.
+    """
+    if outbox is not None:
+        with outbox.batch():
+            outbox.enqueue_db_update(unique_id, resume_key_aspect, score, resume_name)
+            if VECTOR_INDEX_ENABLED:
+                outbox.enqueue_vector_upsert(unique_id, resume_name, resume_key_aspect)
+        return
+
+    update_resume_data(unique_id, resume_key_aspect, score, resume_name)